@@ -11,342 +11,137 @@ j-smith@eecs.berkeley.edu
 
 import os
 import sys
-import time
-import serial
 from PyQt4 import QtGui
-from PyQt4.QtCore import QThread, QObject, pyqtSignal, pyqtSlot
-import numpy as np
-from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt4.QtCore import QThread, QObject, QTimer, pyqtSignal, pyqtSlot
 import mainwindow
+from memstore import savebinary
+from memjournal import newjournal
+from memcore import WriteRead, WriteOnly, ReadOnly, checkwriteread, checkwriteonly, checkreadonly, writeresults, serialport
+from memcore import voltagesource, writevoltage, readvoltage
+from memsupply import makesupply
 
 __author__ = "Jeremy Smith"
-__version__ = "1.4"
+__version__ = "1.5"
 
 # Define constants
-# Serial port address
-serialport = '/dev/cu.usbmodem1421'
-# Maximum allowable pulse width [ms]
-maxpulsewidth = 250
-# True if paused to change voltage
-paused = False
 # Save path
 save_path = os.path.dirname(__file__)
 if save_path == '':
     save_path = '.'
+# Result blocks of the current run kept in memory (older ones are read back from the run journal)
+resultcache = 64
 
 
-class MemTest(QObject):
-    """Class for running memory test sequence on Arduino"""
-    # Signals for output messages to command window
-    message = pyqtSignal(str)
-    errormesg = pyqtSignal(str)
-    # Constants for Arduino ADC
-    v_ratio = 5.0/1023
-    time_step = 0.5
-
-    def __init__(self, serialport, program, wordline=0, bitline=0, pattern=0, rtime=100, ftime=200, loop=1, gtime=100, baud=115200):
-        QObject.__init__(self)
-        _progdict = {'camread': 1, 'form': 2, 'writezero': 3, 'writeone': 4, 'stdread': 5}
-        try:
-            self._prognum = _progdict[program]    # Program number
-        except KeyError:
-            self.errormesg.emit("Program not specified (camread, form, writezero, writeone, stdread) for MemTest\n")
-            return
+def plotresult(plotcanvas, data):
+    """Adds one result to plotcanvas (if there is one) as time [ms] against voltage"""
+    if plotcanvas is not None and len(data) > 0:
+        plotcanvas.display_plot(data.T[0]/1000, data.T[1])
+    return
 
-        self._serialport = serialport             # Serial port
-        self._program = program                   # Program name
-        self._wordline = wordline                 # Word line number
-        self._bitline = bitline                   # Bit line number
-        self._pattern = pattern                   # Data pattern to match
-        self._rtime = rtime                       # Read/write pulse time
-        self._ftime = ftime                       # Forming/precharge pulse time
-        self._loop = loop                         # Number of loops
-        self._gtime = gtime                       # Ground time
-        self._baud = baud                         # Arduino serial port bit rate
-        self._connected = False                   # True when Arduino is connected
-        self._datastring = ""                     # String for storing Arduino output
-        # Header list
-        self._headlist = []
-        self._headlist.append("Program: {:d} {:s}".format(self._prognum, program))
-        self._headlist.append("Address: WL {:d}   BL {:d}".format(wordline, bitline))
-        self._headlist.append("Data Pattern: {:03b}".format(pattern))
-        self._headlist.append("Read/write time: {:d} ms".format(rtime))
-        self._headlist.append("Form/precharge time: {:d} ms".format(ftime))
-        self._headlist.append("Number of read/write pulses: {:d}".format(loop))
-        self._headlist.append("Ground time: {:d} ms".format(gtime))
-
-    def display(self):
-        """Displays settings for MemTest object"""
-        self.message.emit('\n'.join(self._headlist))
-        self.message.emit('\n')
-        return
 
-    def runprogram(self):
-        """Connects to Arduino and runs program"""
-        self.display()
-        try:
-            ser = serial.Serial(self._serialport, self._baud)   # Open the serial port that your Arduino is connected to
-        except (OSError, serial.SerialException):
-            self.errormesg.emit("\nPlease Connect Arduino via USB\n")
-            time.sleep(1.0)
-            return
-
-        self.message.emit("Waiting to Connect...")
-        while not self._connected:             # Loop until the Arduino tells us it is ready
-            serin = ser.read()
-            if serin == 'A':
-                self.message.emit("Connected to Arduino\n\n")
-                self._connected = True
-
-        time.sleep(0.5)
-        ser.write(str(self._prognum))          # Write the program command to the Arduino
-        ser.write(chr(self._wordline))         # buffer 0
-        ser.write(chr(self._bitline))          # buffer 1
-        ser.write(chr(self._pattern))          # buffer 2
-        ser.write(chr(self._rtime))            # buffer 3
-        ser.write(chr(self._ftime))            # buffer 4
-        ser.write(chr(self._loop))             # buffer 5
-        ser.write(chr(self._gtime))            # buffer 6
-
-        while self._connected:                 # Wait until the Arduino tells us it is finished
-            serin = ser.read()
-            if serin == 'A':
-                continue
-            if serin == 'Z':
-                self._connected = False
-                continue
-            self.message.emit(serin)           # Sends tring to message window
-            self._datastring += serin          # Stores the Arduino output as a string
-
-        ser.close()                            # Close the port
-        self.message.emit("Disconnected successfully\n")
-        return
+def storeresult(journal, plotcanvas, data, header):
+    """Appends a result to the run journal and plots it"""
+    journal.append(header, data)
+    plotresult(plotcanvas, data)
+    return
 
-    def output(self):
-        """Converts string from serial bus to a list and returns it along with header"""
-        voltage_data = []
-        if len(self._datastring) is not 0:
-            for i in [x.strip().split(',') for x in self._datastring.strip().split('\n')[3:]]:
-                if len(i) is not 2:
-                    continue
-                voltage_data.append([float(i[0])*self.time_step, float(i[1])*self.v_ratio])
-            return voltage_data, self._headlist
-        else:
-            return
 
-    def reset(self):
-        """Resets status and empties stored data"""
-        self._connected = False
-        self._datastring = ""
+def replot(plotcanvas, journal):
+    """Clears plotcanvas and plots every result in journal (None for no run)"""
+    plotcanvas.clear_plot()
+    if journal is None:
         return
+    for header, data in journal:
+        plotresult(plotcanvas, data)
+    return
 
 
-class RunWriteRead(QThread):
-    """Thread class for running Write CAM Read functionality"""
+class RunProgram(QThread):
+    """Base thread class for running a memtest program (memcore.Program)"""
     # Signals for output messages to command window
     message = pyqtSignal(str)
     errormesg = pyqtSignal(str)
-    # Signal to activate next button when changing voltages manually
+    # Signal to activate continue button when changing voltages manually
     changevoltage = pyqtSignal()
     # Signal to return data and data header
-    result = pyqtSignal(list, list)
+    result = pyqtSignal(object, list)
+    # Signal with each timing span record (only when memcore.metricsenabled)
+    timing = pyqtSignal(object)
 
-    def __init__(self, wline, arraysize, pattern, writePW, prePW, gndPW, loop):
+    def __init__(self, supply=None):
         QThread.__init__(self)
-        self.wline = wline                      # Word line
-        self.arraysize = arraysize              # Memory array size (1,2,3)
-        self.pattern = pattern                  # Pattern written into array
-        self.writePW = int(writePW)             # Write pulse width
-        self.prePW = int(prePW)                 # Precharge pulse width
-        self.gndPW = int(gndPW)                 # Ground pulse width
-        self.loop = int(loop)                   # Loop number
+        self.supply = supply                    # Voltage source (memsupply.VoltageSource)
 
     def __del__(self):
         self.wait()
 
+    def program(self):
+        """Returns the memcore.Program to run (subclasses override it; None runs nothing)"""
+        return None
+
     def run(self):
-        self.message.emit("Running...")
-        self.message.emit("\n================================")
-        self.message.emit("Memory Test Program")
-        self.message.emit(__author__)
-        self.message.emit("Version {:s}".format(__version__))
-        self.message.emit("Email: j-smith@eecs.berkeley.edu")
-        self.message.emit("================================\n")
-
-        # List of write objects
-        writelist = []
-        # Use global paused variable to wait for user input
-        global paused
-
-        # Creates list of write objects for each CRS device
-        for i, c in enumerate(self.pattern):
-            if c == '0':
-                write = MemTest(serialport, 'writezero', wordline=i//self.arraysize, bitline=i%self.arraysize, rtime=self.writePW, loop=self.loop, gtime=self.gndPW)
-                write.message.connect(self.message.emit)
-                write.errormesg.connect(self.errormesg.emit)
-                writelist.append(write)
-            elif c == '1':
-                write = MemTest(serialport, 'writeone', wordline=i//self.arraysize, bitline=i%self.arraysize, rtime=self.writePW, loop=self.loop, gtime=self.gndPW)
-                write.message.connect(self.message.emit)
-                write.errormesg.connect(self.errormesg.emit)
-                writelist.append(write)
-            else:
-                self.errormesg.emit("Write pattern error - use 0 or 1")
-
-        # Runs writes and then does CAM read
-        for a in range(2**self.arraysize):
-            applypattern = MemTest(serialport, 'camread', wordline=self.wline, pattern=a, ftime=self.prePW)
-            applypattern.message.connect(self.message.emit)
-            applypattern.errormesg.connect(self.errormesg.emit)
-
-            self.message.emit("\nSet WRITE voltage. Press Continue...\n")
-            self.changevoltage.emit()
-            paused = True
-            while paused:
-                self.sleep(1)
-
-            for write in writelist:
-                write.runprogram()
-
-            self.message.emit("\nSet READ voltage. Press Continue...\n")
-            self.changevoltage.emit()
-            paused = True
-            while paused:
-                self.sleep(1)
-
-            applypattern.runprogram()
-            # Attempts to output data if it exists
-            try:
-                data, header = applypattern.output()
-                self.result.emit(data, header)
-            except TypeError:
-                self.errormesg.emit("No data to output")
-
-        self.message.emit("\n========================")
-        self.message.emit("MEMORY TEST COMPLETE")
-        self.message.emit("========================\n")
+        program = self.program()
+        if program is None:
+            self.errormesg.emit("No program to run")
+            return
+        program.message.connect(self.message.emit)
+        program.errormesg.connect(self.errormesg.emit)
+        program.changevoltage.connect(self.changevoltage.emit)
+        program.result.connect(self.result.emit)
+        program.timing.connect(self.timing.emit)
+        if self.supply is not None:
+            program.supply = self.supply
+        try:
+            program.run()
+        finally:
+            if program.metrics.enabled:
+                for line in program.metrics.summary():
+                    self.message.emit(line)
+                self.message.emit("Timing metrics saved as: {:s}".format(program.metrics.save(save_path)))
         return
 
 
-class RunWriteOnly(QThread):
-    """Thread class for running Write Only functionality"""
-    # Signals for output messages to command window
-    message = pyqtSignal(str)
-    errormesg = pyqtSignal(str)
-    # Signal to activate next button when changing voltages manually
-    changevoltage = pyqtSignal()
-
-    def __init__(self, arraysize, pattern, writePW, gndPW, loop):
-        QThread.__init__(self)
-        self.arraysize = arraysize              # Memory array size (1,2,3)
+class RunWriteRead(RunProgram):
+    """Thread class for running Write CAM Read functionality"""
+    def __init__(self, wline, arraysize, pattern, writePW, prePW, gndPW, loop, supply=None):
+        RunProgram.__init__(self, supply)
+        self.wline = wline                      # Word line
+        self.arraysize = arraysize              # Memory array size (n for n x n, or 'RxC')
         self.pattern = pattern                  # Pattern written into array
         self.writePW = int(writePW)             # Write pulse width
+        self.prePW = int(prePW)                 # Precharge pulse width
         self.gndPW = int(gndPW)                 # Ground pulse width
         self.loop = int(loop)                   # Loop number
 
-    def __del__(self):
-        self.wait()
+    def program(self):
+        return WriteRead(self.wline, self.arraysize, self.pattern, self.writePW, self.prePW, self.gndPW, self.loop, serialport)
 
-    def run(self):
-        self.message.emit("Running...")
-        self.message.emit("\n================================")
-        self.message.emit("Memory Test Program (Write Only)")
-        self.message.emit(__author__)
-        self.message.emit("Version {:s}".format(__version__))
-        self.message.emit("Email: j-smith@eecs.berkeley.edu")
-        self.message.emit("================================\n")
-
-        # List of write objects
-        writelist = []
-        global paused
-
-        # Creates list of write objects for each CRS device
-        for i, c in enumerate(self.pattern):
-            if c == '0':
-                write = MemTest(serialport, 'writezero', wordline=i//self.arraysize, bitline=i%self.arraysize, rtime=self.writePW, loop=self.loop, gtime=self.gndPW)
-                write.message.connect(self.message.emit)
-                write.errormesg.connect(self.errormesg.emit)
-                writelist.append(write)
-            elif c == '1':
-                write = MemTest(serialport, 'writeone', wordline=i//self.arraysize, bitline=i%self.arraysize, rtime=self.writePW, loop=self.loop, gtime=self.gndPW)
-                write.message.connect(self.message.emit)
-                write.errormesg.connect(self.errormesg.emit)
-                writelist.append(write)
-            else:
-                self.errormesg.emit("Write pattern error - use 0 or 1")
 
-            self.message.emit("\nSet WRITE voltage. Press Continue...\n")
-            self.changevoltage.emit()
-            paused = True
-            while paused:
-                self.sleep(1)
-
-            for write in writelist:
-                write.runprogram()
+class RunWriteOnly(RunProgram):
+    """Thread class for running Write Only functionality"""
+    def __init__(self, arraysize, pattern, writePW, gndPW, loop, supply=None):
+        RunProgram.__init__(self, supply)
+        self.arraysize = arraysize              # Memory array size (n for n x n, or 'RxC')
+        self.pattern = pattern                  # Pattern written into array
+        self.writePW = int(writePW)             # Write pulse width
+        self.gndPW = int(gndPW)                 # Ground pulse width
+        self.loop = int(loop)                   # Loop number
 
-        self.message.emit("\n========================")
-        self.message.emit("MEMORY TEST COMPLETE")
-        self.message.emit("========================\n")
-        return
+    def program(self):
+        return WriteOnly(self.arraysize, self.pattern, self.writePW, self.gndPW, self.loop, serialport)
 
 
-class RunReadOnly(QThread):
+class RunReadOnly(RunProgram):
     """Thread class for running Read Only functionality"""
-    # Signals for output messages to command window
-    message = pyqtSignal(str)
-    errormesg = pyqtSignal(str)
-    # Signal to activate next button when changing voltages manually
-    changevoltage = pyqtSignal()
-    # Signal to return data and data header
-    result = pyqtSignal(list, list)
-
-    def __init__(self, wline, arraysize, prePW, gndPW):
-        QThread.__init__(self)
+    def __init__(self, wline, arraysize, prePW, gndPW, supply=None):
+        RunProgram.__init__(self, supply)
         self.wline = wline                      # Word line
-        self.arraysize = arraysize              # Memory array size (1,2,3)
+        self.arraysize = arraysize              # Memory array size (n for n x n, or 'RxC')
         self.prePW = int(prePW)                 # Precharge pulse width
         self.gndPW = int(gndPW)                 # Ground pulse width
 
-    def __del__(self):
-        self.wait()
-
-    def run(self):
-        self.message.emit("Running...")
-        self.message.emit("\n================================")
-        self.message.emit("Memory Test Program")
-        self.message.emit(__author__)
-        self.message.emit("Version {:s}".format(__version__))
-        self.message.emit("Email: j-smith@eecs.berkeley.edu")
-        self.message.emit("================================\n")
-
-        # Use global paused variable to wait for user input
-        global paused
-
-        # Runs CAM reads
-        for a in range(2**self.arraysize):
-            applypattern = MemTest(serialport, 'camread', wordline=self.wline, pattern=a, ftime=self.prePW)
-            applypattern.message.connect(self.message.emit)
-            applypattern.errormesg.connect(self.errormesg.emit)
-
-            self.message.emit("\nSet READ voltage and rewrite pattern. Press Continue...\n")
-            self.changevoltage.emit()
-            paused = True
-            while paused:
-                self.sleep(1)
-
-            applypattern.runprogram()
-            # Attempts to output data if it exists
-            try:
-                data, header = applypattern.output()
-                self.result.emit(data, header)
-            except TypeError:
-                self.errormesg.emit("No data to output")
-
-        self.message.emit("\n========================")
-        self.message.emit("MEMORY TEST COMPLETE")
-        self.message.emit("========================\n")
-        return
+    def program(self):
+        return ReadOnly(self.wline, self.arraysize, self.prePW, self.gndPW, serialport)
 
 
 class SaveFile(QThread):
@@ -354,60 +149,23 @@ class SaveFile(QThread):
     message = pyqtSignal(str)
     errormesg = pyqtSignal(str)
 
-    def __init__(self, runresult, filename, pathname):
+    def __init__(self, runresult, filename, pathname, binary=False):
         QThread.__init__(self)
         self.runresult = runresult
         self.filename = filename
         self.pathname = pathname
+        self.binary = binary                    # Also save .npy samples with .json headers
 
     def __del__(self):
         self.wait()
 
     def run(self):
         self.message.emit("Saving...")
-        # Create a results folder if it does not exist
-        if "results" not in os.listdir(self.pathname):
-            os.mkdir(os.path.join(self.pathname, "results"))
-        # Opens out file and writes header followed by data
-        with open(os.path.join(self.pathname, "results", self.filename), 'w') as outfile:
-            for block in self.runresult:
-                for line in block:
-                    if type(line).__module__ == np.__name__:
-                        outfile.write("{:.1f}\t{:.5f}\n".format(line[0], line[1]))
-                    else:
-                        outfile.write("{:s}\n".format(line))
-                outfile.write('\n')
+        writeresults(self.runresult, self.filename, self.pathname)
         self.message.emit("Saved as: {:s}".format(self.filename))
-        return
-
-
-class PlotResults(QThread):
-    """Thread class to plot results in results window"""
-    message = pyqtSignal(str)
-    errormesg = pyqtSignal(str)
-
-    def __init__(self, runresult, plotcanvas):
-        QThread.__init__(self)
-        self.runresult = runresult
-        self.plotcanvas = plotcanvas
-        self.data = []
-        for block in self.runresult:
-            if len(block) == 7:
-                continue
-            else:
-                self.data.append(block)
-        self.data = np.array(self.data)
-
-    def __del__(self):
-        self.wait()
-
-    def run(self):
-        self.message.emit("Plotting...")
-        self.plotcanvas.clear_plot()
-        for block in self.data:
-            if len(block) == 0:
-                continue
-            self.plotcanvas.display_plot(block.T[0]/1000, block.T[1])
+        if self.binary:
+            npyname = savebinary(self.runresult, os.path.splitext(self.filename)[0], self.pathname)
+            self.message.emit("Saved as: {:s}".format(os.path.basename(npyname)))
         return
 
 
@@ -430,22 +188,9 @@ class InitWriteRead(QThread):
         self.wait()
 
     def run(self):
-        if len(self.pattern) != self.arraysize**2:
-            self.errormesg.emit("Array size and write pattern do not match")
-            return
-        try:
-            checkbin = int(self.pattern, 2)
-        except ValueError:
-            self.errormesg.emit("Pattern must be a binary number")
-            return
-        if self.writePW > maxpulsewidth:
-            self.errormesg.emit("Write pulse must be less than {:d} ms".format(maxpulsewidth))
-            return
-        if self.prePW > maxpulsewidth:
-            self.errormesg.emit("Precharge pulse must be less than {:d} ms".format(maxpulsewidth))
-            return
-        if self.gndPW > maxpulsewidth:
-            self.errormesg.emit("Ground pulse must be less than {:d} ms".format(maxpulsewidth))
+        error = checkwriteread(self.wline, self.arraysize, self.pattern, self.writePW, self.prePW, self.gndPW)
+        if error is not None:
+            self.errormesg.emit(error)
             return
         self.message.emit("Variables set.")
         return
@@ -468,19 +213,9 @@ class InitWriteOnly(QThread):
         self.wait()
 
     def run(self):
-        if len(self.pattern) != self.arraysize**2:
-            self.errormesg.emit("Array size and write pattern do not match")
-            return
-        try:
-            checkbin = int(self.pattern, 2)
-        except ValueError:
-            self.errormesg.emit("Pattern must be a binary number")
-            return
-        if self.writePW > maxpulsewidth:
-            self.errormesg.emit("Write pulse must be less than {:d} ms".format(maxpulsewidth))
-            return
-        if self.gndPW > maxpulsewidth:
-            self.errormesg.emit("Ground pulse must be less than {:d} ms".format(maxpulsewidth))
+        error = checkwriteonly(self.arraysize, self.pattern, self.writePW, self.gndPW)
+        if error is not None:
+            self.errormesg.emit(error)
             return
         self.message.emit("Variables set.")
         return
@@ -502,35 +237,79 @@ class InitReadOnly(QThread):
         self.wait()
 
     def run(self):
-        if self.prePW > maxpulsewidth:
-            self.errormesg.emit("Precharge pulse must be less than {:d} ms".format(maxpulsewidth))
-            return
-        if self.gndPW > maxpulsewidth:
-            self.errormesg.emit("Ground pulse must be less than {:d} ms".format(maxpulsewidth))
+        error = checkreadonly(self.wline, self.arraysize, self.prePW, self.gndPW)
+        if error is not None:
+            self.errormesg.emit(error)
             return
         self.message.emit("Variables set.")
         return
 
 
-class MpltCanvas(FigureCanvas):
-    """FigureCanvasAgg for Matplotlib figure"""
-    def __init__(self, parent=None, width=4, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        FigureCanvas.__init__(self, fig)
-        self.axes = fig.add_subplot(111)
-        self.setParent(parent)
-
-        self.display_plot(0, 0)
+class LogConsole(QObject):
+    """Class for a rate limited log shared by the command window text browsers
 
-        FigureCanvas.setSizePolicy(self, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Expanding)
-        FigureCanvas.updateGeometry(self)
-
-    def display_plot(self, x, y):
-        self.axes.plot(x, y)
-        self.draw()
+    Messages are buffered and written to one document (shown by every
+    browser) at most once per interval [ms], with runs of the same colour
+    inserted together. Scrollback is capped at maxblocks lines, evicting the
+    oldest, so memory stays bounded over long sessions.
+    """
+    def __init__(self, browsers, interval=50, maxblocks=5000, maxpending=200000):
+        QObject.__init__(self)
+        self._browsers = browsers
+        self._document = browsers[0].document()
+        self._document.setMaximumBlockCount(maxblocks)
+        for browser in browsers[1:]:
+            browser.setDocument(self._document)
+        self._maxpending = maxpending           # Maximum buffered characters between flushes
+        self._pending = []                      # Buffered [colour, [text, ...]] runs
+        self._pendingsize = 0
+        self._empty = self._document.isEmpty()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(interval)
+
+    def write(self, text, colour='black', newline=True):
+        """Buffers text, starting a new line if newline is True"""
+        text = str(text)
+        if newline and not self._empty:
+            text = '\n' + text
+        self._empty = False
+        if self._pending and self._pending[-1][0] == colour:
+            self._pending[-1][1].append(text)
+        else:
+            self._pending.append([colour, [text]])
+        self._pendingsize += len(text)
+        # Drops the oldest buffered text if the GUI cannot keep up (whole messages, then the start of the oldest one)
+        while self._pendingsize > self._maxpending:
+            parts = self._pending[0][1]
+            excess = self._pendingsize - self._maxpending
+            if len(parts[0]) <= excess:
+                self._pendingsize -= len(parts.pop(0))
+                if not parts:
+                    self._pending.pop(0)
+            else:
+                parts[0] = parts[0][excess:]
+                self._pendingsize -= excess
+        return
 
-    def clear_plot(self):
-        self.axes.cla()
+    @pyqtSlot()
+    def flush(self):
+        """Writes buffered text to the document and scrolls the browsers to the bottom"""
+        if not self._pending:
+            return
+        cursor = QtGui.QTextCursor(self._document)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.beginEditBlock()
+        for colour, parts in self._pending:
+            textformat = QtGui.QTextCharFormat()
+            textformat.setForeground(QtGui.QColor(colour))
+            cursor.insertText(''.join(parts), textformat)
+        cursor.endEditBlock()
+        self._pending = []
+        self._pendingsize = 0
+        for browser in self._browsers:
+            browser.verticalScrollBar().setValue(browser.verticalScrollBar().maximum())
+        return
 
 
 class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
@@ -571,44 +350,49 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
 
         # Save counter
         self._count = 1
-        # Voltage-time data storage list
-        self._fulldatabuffer = []
+        # Voltage source used by the run threads
+        self.supply = makesupply(voltagesource, writevoltage, readvoltage)
+        # Voltage-time data journal of the current run (opened with its first result), the only store of its results
+        self.journal = None
+
+        # Command window log shared by the three text browsers
+        self.console = LogConsole([self.textBrowser_1, self.textBrowser_2, self.textBrowser_3])
+
+        # Plot canvas is set up when the results tab is first shown
+        self.plotcanvas = None
+        self.tabWidget.currentChanged.connect(self.tabchanged)
+
+    @pyqtSlot(int)
+    def tabchanged(self, index):
+        """Method/slot to set up plotting when the results tab is shown"""
+        if self.tabWidget.widget(index) is self.tab_3:
+            self.setupplot()
+        return
 
-        # Plot canvas setup
-        self.plotcanvas = MpltCanvas()
-        self.graphicsLayout.addWidget(self.plotcanvas)
+    def setupplot(self):
+        """Imports matplotlib and adds the plot canvas to the results tab"""
+        if self.plotcanvas is None:
+            from mplcanvas import MpltCanvas
+            self.plotcanvas = MpltCanvas()
+            self.graphicsLayout.addWidget(self.plotcanvas)
+            self.replot()
+        return
+
+    def replot(self):
+        """Redraws all results of the current run from its journal (new results are added as they arrive)"""
+        replot(self.plotcanvas, self.journal)
+        return
 
     @pyqtSlot(str)
     def writestr(self, text):
         """Display message method/slot"""
-        if len(text) == 1:
-            self.textBrowser_1.insertPlainText(text)
-            self.textBrowser_2.insertPlainText(text)
-            self.textBrowser_3.insertPlainText(text)
-        else:
-            self.textBrowser_1.append(text)
-            self.textBrowser_2.append(text)
-            self.textBrowser_3.append(text)
-        self.textBrowser_1.verticalScrollBar().setValue(self.textBrowser_1.verticalScrollBar().maximum())
-        self.textBrowser_2.verticalScrollBar().setValue(self.textBrowser_2.verticalScrollBar().maximum())
-        self.textBrowser_3.verticalScrollBar().setValue(self.textBrowser_3.verticalScrollBar().maximum())
+        self.console.write(text, newline=len(text) != 1)
         return
 
     @pyqtSlot(str)
     def writestrRED(self, text):
         """Display error message method/slot"""
-        self.textBrowser_1.setTextColor(QtGui.QColor('red'))
-        self.textBrowser_2.setTextColor(QtGui.QColor('red'))
-        self.textBrowser_3.setTextColor(QtGui.QColor('red'))
-        self.textBrowser_1.append(text)
-        self.textBrowser_2.append(text)
-        self.textBrowser_3.append(text)
-        self.textBrowser_1.setTextColor(QtGui.QColor('black'))
-        self.textBrowser_2.setTextColor(QtGui.QColor('black'))
-        self.textBrowser_3.setTextColor(QtGui.QColor('black'))
-        self.textBrowser_1.verticalScrollBar().setValue(self.textBrowser_1.verticalScrollBar().maximum())
-        self.textBrowser_2.verticalScrollBar().setValue(self.textBrowser_2.verticalScrollBar().maximum())
-        self.textBrowser_3.verticalScrollBar().setValue(self.textBrowser_3.verticalScrollBar().maximum())
+        self.console.write(text, colour='red')
         return
 
     @pyqtSlot()
@@ -619,13 +403,30 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_14.setEnabled(True)
         return
 
-    @pyqtSlot(list, list)
+    @pyqtSlot(object, list)
     def storeresult(self, data, header):
-        """Method/slot to append new data to the data buffer"""
-        self._fulldatabuffer.append(header)
-        self._fulldatabuffer.append(np.array(data))
+        """Method/slot to append new data to the run journal (which keeps the last resultcache blocks in memory)"""
+        if self.journal is None:
+            self.journal = newjournal(save_path, cachesize=resultcache)
+            self.writestr("Journal: {:s}".format(self.journal.filename))
+        storeresult(self.journal, self.plotcanvas, data, header)
         return
 
+    def newrun(self):
+        """Closes the journal of the previous run so the next result starts a new one"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.plotcanvas is not None:
+            self.plotcanvas.clear_plot()
+        return
+
+    def runbuffer(self):
+        """Returns the alternating header/data buffer of the current run (blocks not in the journal cache are memory-mapped)"""
+        if self.journal is None:
+            return []
+        return self.journal.runresult()
+
     def init_WR(self):
         """Method for initializing variables in the Write-Read program"""
         self.pushButton_1.setEnabled(False)
@@ -634,7 +435,7 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
 
         # Read text boxes and menus
         self.wline = self.comboBox_1.currentIndex()
-        self.arraysize = self.comboBox_2.currentIndex() + 1
+        self.arraysize = str(self.comboBox_2.currentText())
         self.pattern = str(self.lineEdit_1.text())
         self.writePW = self.lineEdit_2.text()
         self.prePW = self.lineEdit_3.text()
@@ -665,7 +466,7 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_11.setEnabled(False)
 
         # Read text boxes and menus
-        self.arraysize = self.comboBox_3.currentIndex() + 1
+        self.arraysize = str(self.comboBox_3.currentText())
         self.pattern = str(self.lineEdit_11.text())
         self.writePW = self.lineEdit_6.text()
         self.gndPW = self.lineEdit_7.text()
@@ -696,7 +497,7 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
 
         # Read text boxes and menus
         self.wline = self.comboBox_4.currentIndex()
-        self.arraysize = self.comboBox_5.currentIndex() + 1
+        self.arraysize = str(self.comboBox_5.currentText())
         self.prePW = self.lineEdit_12.text()
         self.gndPW = self.lineEdit_13.text()
 
@@ -722,10 +523,10 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_2.setEnabled(False)
         self.pushButton_4.setEnabled(False)
         self.pushButton_12.setEnabled(False)
-        self._fulldatabuffer = []
+        self.newrun()
 
         # Creates new RunWriteRead class and connects slots
-        self.runresult = RunWriteRead(self.wline, self.arraysize, self.pattern, self.writePW, self.prePW, self.gndPW, self.loop)
+        self.runresult = RunWriteRead(self.wline, self.arraysize, self.pattern, self.writePW, self.prePW, self.gndPW, self.loop, self.supply)
         self.runresult.message.connect(self.writestr)
         self.runresult.errormesg.connect(self.writestrRED)
         self.runresult.changevoltage.connect(self.changevoltagewait)
@@ -748,10 +549,10 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_2.setEnabled(False)
         self.pushButton_4.setEnabled(False)
         self.pushButton_12.setEnabled(False)
-        self._fulldatabuffer = []
+        self.newrun()
 
         # Creates new RunWriteOnly class and connects slots
-        self.runresult = RunWriteOnly(self.arraysize, self.pattern, self.writePW, self.gndPW, self.loop)
+        self.runresult = RunWriteOnly(self.arraysize, self.pattern, self.writePW, self.gndPW, self.loop, self.supply)
         self.runresult.message.connect(self.writestr)
         self.runresult.errormesg.connect(self.writestrRED)
         self.runresult.changevoltage.connect(self.changevoltagewait)
@@ -773,10 +574,10 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_2.setEnabled(False)
         self.pushButton_4.setEnabled(False)
         self.pushButton_12.setEnabled(False)
-        self._fulldatabuffer = []
+        self.newrun()
 
         # Creates new RunWriteRead class and connects slots
-        self.runresult = RunReadOnly(self.wline, self.arraysize, self.prePW, self.gndPW)
+        self.runresult = RunReadOnly(self.wline, self.arraysize, self.prePW, self.gndPW, self.supply)
         self.runresult.message.connect(self.writestr)
         self.runresult.errormesg.connect(self.writestrRED)
         self.runresult.changevoltage.connect(self.changevoltagewait)
@@ -801,7 +602,7 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         datafilename = "{:s}_{:s}.txt".format(self.lineEdit_9.text(), self.lineEdit_10.text())
 
         # Creates new SaveFile class and connects slots
-        self.save = SaveFile(self._fulldatabuffer, datafilename, save_path)
+        self.save = SaveFile(self.runbuffer(), datafilename, save_path, self.checkBox_1.isChecked())
         self.save.message.connect(self.writestr)
         self.save.errormesg.connect(self.writestrRED)
         self.save.finished.connect(self.done)
@@ -815,16 +616,11 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
 
     def plotdata(self):
         """Method for plotting data"""
-        self.pushButton_15.setEnabled(False)
-
-        # Creates new PlotResults class and connects slots
-        self.plot = PlotResults(self._fulldatabuffer, self.plotcanvas)
-        self.plot.message.connect(self.writestr)
-        self.plot.errormesg.connect(self.writestrRED)
-        self.plot.finished.connect(self.done)
-
-        # Start save thread
-        self.plot.start()
+        self.writestr("Plotting...")
+        if self.plotcanvas is None:
+            self.setupplot()
+        else:
+            self.replot()
         return
 
     def resetcnt(self):
@@ -835,8 +631,8 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
 
     def continue_run(self):
         """Method to continue the program after setting a voltage"""
-        global paused
-        paused = False
+        if self.supply.manual:
+            self.supply.resume()
         self.pushButton_9.setEnabled(False)
         self.pushButton_10.setEnabled(False)
         self.pushButton_14.setEnabled(False)
@@ -845,6 +641,8 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
     def done(self):
         """Done method to reset buttons"""
         self.writestr("Done.")
+        if self.journal is not None:
+            self.journal.sync()
         self.pushButton_1.setEnabled(True)
         self.pushButton_3.setEnabled(True)
         self.pushButton_11.setEnabled(True)
@@ -854,7 +652,6 @@ class MainApp(QtGui.QMainWindow, mainwindow.Ui_MainWindow):
         self.pushButton_12.setEnabled(True)
 
         self.pushButton_5.setEnabled(True)
-        self.pushButton_15.setEnabled(True)
 
         self.pushButton_7.setEnabled(False)
         self.pushButton_8.setEnabled(False)
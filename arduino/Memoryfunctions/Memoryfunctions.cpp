@@ -2,7 +2,7 @@
 Memoryfunctions.cpp - Library for memory testing functions
 Jeremy Smith
 EECS, University of California Berkeley
-Version 1.6
+Version 1.7
 */
 
 #include <Arduino.h>
@@ -12,19 +12,34 @@ Version 1.6
 #define MEASURETYPE 1      // Change for measure while applying pattern (1) or apply pattern then measure (0)
 #define CAMTYPE 0          // Change for CAM apply pattern with 2/3V (1) or V (0)
 
+#define FEATURESAMPLES 16  // Number of fixed time samples in a feature record
+#define FEATURESTEP 1000   // Timer2 counts between fixed time samples (0.5 ms)
+#define FEATURELENGTH (12 + 6 + 2*FEATURESAMPLES)  // Feature record payload length
+
+// Free-running ADC capture state shared with the ADC interrupt
+static volatile unsigned int *isrbuffer;  // Sample buffer
+static volatile unsigned int isrindex;    // Index of next sample
+static volatile unsigned int isrcount;    // Number of samples to take
+
+ISR(ADC_vect){
+  // Stores each conversion and stops free running after isrcount samples
+  isrbuffer[isrindex++] = ADC;
+  if (isrindex >= isrcount){
+    ADCSRA &= ~(_BV(ADATE) | _BV(ADIE));
+  }
+}
+
 // Pre-instantiate an object of this library class
 Memoryfunctions mem;
 
+// Default 3x3 pin map (replaced by setarray)
+static const int defaultAnalogWL[3] = {A0, A1, A2};   // Analogue read WL0-2
+static const int defaultWL[3] = {24, 26, 28};         // Control WL0-2
+static const int defaultReadWL[3] = {36, 38, 40};     // Digital read WL0-2
+static const int defaultBL[3] = {25, 27, 29};         // Control BL0-2
+
 Memoryfunctions::Memoryfunctions(){
-  _analogPinARD[0] = A0;    // Analogue read WL0
-  _analogPinARD[1] = A1;    // Analogue read WL1
-  _analogPinARD[2] = A2;    // Analogue read WL2
-  _digitalPinWL[0] = 24;    // Control WL0
-  _digitalPinWL[1] = 26;    // Control WL1
-  _digitalPinWL[2] = 28;    // Control WL2
-  _digitalPinBL[0] = 25;    // Control BL0
-  _digitalPinBL[1] = 27;    // Control BL1
-  _digitalPinBL[2] = 29;    // Control BL2
+  setarray(3, 3, defaultWL, defaultReadWL, defaultAnalogWL, defaultBL);
 
   _digitalPinWLSELA = 30;    // Voltage select WLs V - 2/3V
   _digitalPinWLSELB = 32;    // Voltage select WLs float - SELC
@@ -36,13 +51,37 @@ Memoryfunctions::Memoryfunctions(){
   _digitalPinINHWL = 22;     // Inhibit all WLs
   _digitalPinINHBL = 23;     // Inhibit all BLs
 
-  _digitalPinReadWL[0] = 36;    // Digital read WL0
-  _digitalPinReadWL[1] = 38;    // Digital read WL1
-  _digitalPinReadWL[2] = 40;    // Digital read WL2
-
   _ledPin = 13;     // LED pin
 }
 
+int Memoryfunctions::setarray(int rows, int cols, const int *wl, const int *readwl, const int *analogwl, const int *bl){
+  /*
+  Loads the pin map of a rows x cols array (call before initPinMode)
+  wl, readwl and analogwl give the control, digital read and analogue read pins of each WL,
+  bl the control pin of each BL
+  Returns 0 if loaded or 1 if the array is larger than MAXROWS x MAXCOLS
+  */
+  if (rows < 1 || rows > MAXROWS || cols < 1 || cols > MAXCOLS){
+    return 1;
+  }
+  _rows = rows;
+  _cols = cols;
+  for (int i=0; i<rows; i++){
+    _digitalPinWL[i] = wl[i];
+    _digitalPinReadWL[i] = readwl[i];
+    _analogPinARD[i] = analogwl[i];
+  }
+  for (int i=0; i<cols; i++){
+    _digitalPinBL[i] = bl[i];
+  }
+  return 0;
+}
+
+int Memoryfunctions::inarray(int w, int b){
+  // Returns 1 if WL w and BL b are in the pin map, otherwise 0
+  return w >= 0 && w < _rows && b >= 0 && b < _cols;
+}
+
 /*
 Basic functions for:
 1. Precharging
@@ -61,15 +100,16 @@ void Memoryfunctions::precharge(int t, int line){
   digitalWrite(_digitalPinINHWL, HIGH);    // Inhibit WLs (keeps each WL floating and isolated)
 }
 
-void Memoryfunctions::applypattern(int pattern, int t){
+void Memoryfunctions::applypattern(const byte *pattern, int t){
   digitalWrite(_digitalPinINHBL, HIGH);  // Inhibit BLs
   digitalWrite(_digitalPinBLSELB, LOW);  // BLs: GND mode
   // apply pattern to the BLs ("1" = V, "0" = GND for CAMTYPE=0; "1" = 2/3V, "0" = GND for CAMTYPE=1)
   #if CAMTYPE
     digitalWrite(_digitalPinBLSELA, LOW);  // BLs: 2/3V mode
   #endif
-  for (int y=0; y<3; y++){
-    if (pattern & (1<<y)){
+  // bit y of the pattern is bit y%8 of pattern[y/8]
+  for (int y=0; y<_cols; y++){
+    if (pattern[y >> 3] & (1 << (y & 7))){
       digitalWrite(_digitalPinBL[y], HIGH); // BL[y] to V
     } else{
       digitalWrite(_digitalPinBL[y], LOW);  // BL[y] to GND
@@ -83,7 +123,7 @@ void Memoryfunctions::applypattern(int pattern, int t){
   #endif
 }
 
-void Memoryfunctions::wordlineread(int line){
+void Memoryfunctions::wordlineread(int line, int output){
   // read voltage as function of time
   timer2.reset();
   for (int i=0; i<500; i++){
@@ -93,20 +133,56 @@ void Memoryfunctions::wordlineread(int line){
   #if MEASURETYPE
     digitalWrite(_digitalPinINHBL, HIGH); // Inhibit BLs
   #endif
-  // writes out data to serial port
-  for (int j=0; j<500; j++){
-    Serial.print(_time[j]);
-    Serial.print(',');
-    Serial.print(_vwordline[j]);
-    Serial.print('\n');
+  // writes out data to serial port (comma separated text, binary frame or feature record)
+  if (output == 1){
+    sendframe();
+  } else if (output == 2){
+    sendfeatures();
+  } else{
+    for (int j=0; j<500; j++){
+      Serial.print(_time[j]);
+      Serial.print(',');
+      Serial.print(_vwordline[j]);
+      Serial.print('\n');
+    }
   }
   delay(100);
+  releaselines();
+}
+
+void Memoryfunctions::adcread(int line, int prescale, int count){
+  // read voltage with the ADC free running at 16 MHz / 2^prescale / 13 samples per second
+  // the ADC interrupt stores count samples, times are implicit from the sample clock
+  // prescale is at least 4 (208 CPU cycles per sample): below that the ISR cannot keep up and drops samples
+  if (prescale < 4 || prescale > 7) prescale = 4;
+  if (count < 1 || count > MAXSAMPLES) count = MAXSAMPLES;
+  byte adcsra = ADCSRA;                 // ADC settings from setup (FASTADC)
+  byte adcsrb = ADCSRB;
+  int channel = _analogPinARD[line] - A0;
+  isrbuffer = _samples;
+  isrindex = 0;
+  isrcount = count;
+  ADMUX = _BV(REFS0) | (channel & 0x07);                    // AVCC reference, WL[line] input
+  ADCSRB = (channel & 0x08) ? _BV(MUX5) : 0;               // free running trigger
+  ADCSRA = _BV(ADEN) | _BV(ADSC) | _BV(ADATE) | _BV(ADIE) | prescale;
+  while (isrindex < isrcount){}         // ISR stops free running after the last sample
+  ADCSRA = adcsra;
+  ADCSRB = adcsrb;
+  #if MEASURETYPE
+    digitalWrite(_digitalPinINHBL, HIGH); // Inhibit BLs
+  #endif
+  sendsamples(prescale, count);
+  delay(100);
+  releaselines();
+}
+
+void Memoryfunctions::releaselines(){
   // restore normal mode (all lines floating)
   #if CAMTYPE
     digitalWrite(_digitalPinBLSELA, HIGH);  // BLs: Vread mode
   #endif
   digitalWrite(_digitalPinBLSELB, HIGH); // BLs: float mode
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], LOW); // BL[i]: float
   }
   digitalWrite(_digitalPinINHBL, LOW);   // Enable BLs
@@ -117,8 +193,10 @@ void Memoryfunctions::forming(int t){
   Serial.println(F("FORM..."));
   digitalWrite(_digitalPinINHWL, HIGH); // Inhibit WLs
   digitalWrite(_digitalPinINHBL, HIGH); // Inhibit BLs
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], HIGH); // WL[i]: V
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], LOW);  // BL[i]: GND
   }
   digitalWrite(_digitalPinINHWL, LOW); // Enable WLs
@@ -126,8 +204,10 @@ void Memoryfunctions::forming(int t){
   delay(t);
   digitalWrite(_digitalPinINHWL, HIGH); // Inhibit WLs
   digitalWrite(_digitalPinINHBL, HIGH); // Inhibit BLs
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], LOW);  // WL[i]: 1/3V
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], HIGH); // BL[i]: 2/3V
   }
   digitalWrite(_digitalPinINHWL, LOW); // Enable WLs
@@ -207,8 +287,10 @@ void Memoryfunctions::gndall(int t){
   digitalWrite(_digitalPinBLSELB, LOW);  // BLs: BLSELC mode (GND)
   digitalWrite(_digitalPinWLSELC, HIGH);  // WLs: GND
   digitalWrite(_digitalPinBLSELC, HIGH);  // BLs: GND
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], LOW);   // WL[i]: GND
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], LOW);   // BL[i]: GND
   }
   digitalWrite(_digitalPinINHWL, LOW);  // Enable WLs
@@ -236,11 +318,13 @@ void Memoryfunctions::initPinMode(){
   pinMode(_digitalPinBLSELB, OUTPUT);
   pinMode(_digitalPinBLSELC, OUTPUT);
   
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     pinMode(_digitalPinWL[i], OUTPUT);
-    pinMode(_digitalPinBL[i], OUTPUT);
     pinMode(_digitalPinReadWL[i], INPUT);
   }
+  for (int i=0; i<_cols; i++){
+    pinMode(_digitalPinBL[i], OUTPUT);
+  }
   
   pinMode(_digitalPinINHWL, OUTPUT);
   pinMode(_digitalPinINHBL, OUTPUT);
@@ -263,8 +347,10 @@ void Memoryfunctions::initContentAddress(){
   digitalWrite(_digitalPinBLSELB, HIGH);   // BLs: float mode
   digitalWrite(_digitalPinBLSELC, HIGH);   // BLs: GND mode
   
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], LOW); // WL[i]: float
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], LOW); // BL[i]: float
   }
   
@@ -289,8 +375,10 @@ void Memoryfunctions::initOneThirdTwoThirdZERO(){
   digitalWrite(_digitalPinBLSELB, LOW);   // BLs: WLSELC mode
   digitalWrite(_digitalPinBLSELC, HIGH);  // BLs: GND mode
   
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], LOW);  // WL[i]: 1/3V
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], HIGH); // BL[i]: 2/3V
   }
   
@@ -315,8 +403,10 @@ void Memoryfunctions::initOneThirdTwoThirdONE(){
   digitalWrite(_digitalPinBLSELB, LOW);   // BLs: BLSELC mode
   digitalWrite(_digitalPinBLSELC, LOW);   // BLs: 1/3V mode
   
-  for (int i=0; i<3; i++){
+  for (int i=0; i<_rows; i++){
     digitalWrite(_digitalPinWL[i], HIGH); // WL[i]: 2/3V
+  }
+  for (int i=0; i<_cols; i++){
     digitalWrite(_digitalPinBL[i], LOW);  // BL[i]: 1/3V
   }
   
@@ -335,22 +425,159 @@ void Memoryfunctions::establishContact(char contact){
   }
 }
 
+void Memoryfunctions::sendframe(){
+  /*
+  Sends the word line samples as one binary frame
+  '#', payload length (uint16), 500 x [time (uint32), voltage (uint16)], checksum (uint16)
+  All values little endian, checksum is the sum of the payload bytes
+  */
+  unsigned int length = 500*6;
+  unsigned int checksum = 0;
+  byte sample[6];
+  Serial.write('#');
+  Serial.write(lowByte(length));
+  Serial.write(highByte(length));
+  for (int j=0; j<500; j++){
+    sample[0] = _time[j] & 0xFF;
+    sample[1] = (_time[j] >> 8) & 0xFF;
+    sample[2] = (_time[j] >> 16) & 0xFF;
+    sample[3] = (_time[j] >> 24) & 0xFF;
+    sample[4] = lowByte(_vwordline[j]);
+    sample[5] = highByte(_vwordline[j]);
+    for (int k=0; k<6; k++){
+      checksum += sample[k];
+    }
+    Serial.write(sample, 6);
+  }
+  Serial.write(lowByte(checksum));
+  Serial.write(highByte(checksum));
+}
+
+void Memoryfunctions::sendsamples(int prescale, int count){
+  /*
+  Sends free-running ADC samples as one binary frame (framed as in sendframe)
+  ADC clock divider (uint16, sample period is 13 x divider / 16 MHz), count x voltage (uint16)
+  */
+  unsigned int divider = 1 << prescale;
+  unsigned int length = 2 + 2*count;
+  unsigned int checksum = lowByte(divider) + highByte(divider);
+  for (int j=0; j<count; j++){
+    checksum += lowByte(_samples[j]) + highByte(_samples[j]);
+  }
+  Serial.write('#');
+  Serial.write(lowByte(length));
+  Serial.write(highByte(length));
+  Serial.write(lowByte(divider));
+  Serial.write(highByte(divider));
+  for (int j=0; j<count; j++){
+    Serial.write(lowByte(_samples[j]));
+    Serial.write(highByte(_samples[j]));
+  }
+  Serial.write(lowByte(checksum));
+  Serial.write(highByte(checksum));
+}
+
+static int packlong(byte *buf, int n, unsigned long x){
+  // Stores x little endian at buf[n] and returns the next index
+  for (int k=0; k<4; k++){
+    buf[n++] = (x >> (8*k)) & 0xFF;
+  }
+  return n;
+}
+
+static int packint(byte *buf, int n, unsigned int x){
+  // Stores x little endian at buf[n] and returns the next index
+  buf[n++] = lowByte(x);
+  buf[n++] = highByte(x);
+  return n;
+}
+
+void Memoryfunctions::sendfeatures(){
+  /*
+  Sends features of the word line samples as one binary frame (framed as in sendframe)
+  threshold time (uint32, first time below half the first voltage, 0xFFFFFFFF if never),
+  last time (uint32), area (uint32, sum of voltage x time to next sample),
+  first, minimum and maximum voltage (uint16),
+  FEATURESAMPLES voltages (uint16) at every FEATURESTEP counts (0xFFFF after the last sample)
+  Times in timer2 counts (0.5 us), voltages in ADC counts
+  */
+  unsigned long tthreshold = 0xFFFFFFFF;
+  unsigned long area = 0;
+  unsigned int vthreshold = _vwordline[0]/2;
+  unsigned int vmin = _vwordline[0];
+  unsigned int vmax = _vwordline[0];
+  unsigned int fixed[FEATURESAMPLES];
+  int k = 0;
+  for (int j=0; j<500; j++){
+    unsigned int v = _vwordline[j];
+    if (v < vmin) vmin = v;
+    if (v > vmax) vmax = v;
+    if (tthreshold == 0xFFFFFFFF && v < vthreshold) tthreshold = _time[j];
+    if (j < 499) area += (unsigned long)v*(_time[j+1] - _time[j]);
+    while (k < FEATURESAMPLES && _time[j] >= (unsigned long)(k+1)*FEATURESTEP){
+      fixed[k++] = v;                     // first sample at or after each fixed time
+    }
+  }
+  for (; k<FEATURESAMPLES; k++){
+    fixed[k] = 0xFFFF;
+  }
+
+  byte payload[FEATURELENGTH];
+  int n = 0;
+  n = packlong(payload, n, tthreshold);
+  n = packlong(payload, n, _time[499]);
+  n = packlong(payload, n, area);
+  n = packint(payload, n, _vwordline[0]);
+  n = packint(payload, n, vmin);
+  n = packint(payload, n, vmax);
+  for (k=0; k<FEATURESAMPLES; k++){
+    n = packint(payload, n, fixed[k]);
+  }
+  unsigned int checksum = 0;
+  for (k=0; k<n; k++){
+    checksum += payload[k];
+  }
+  Serial.write('#');
+  Serial.write(lowByte(n));
+  Serial.write(highByte(n));
+  Serial.write(payload, n);
+  Serial.write(lowByte(checksum));
+  Serial.write(highByte(checksum));
+}
+
 /*
 High level functions for:
-1. Content addressable read
+1. Content addressable read (polled or free-running ADC capture)
 2. Forming all bits
 3. Writing a ZERO state
 4. Writing a ONE state
 5. Standard read function
 */
 
-void Memoryfunctions::camread(int line, int pattern, int t_pat, int t_pre, int t_gnd){
-  // Content addressable read function
+void Memoryfunctions::camread(int line, const byte *pattern, int t_pat, int t_pre, int t_gnd, int output){
+  // Content addressable read function (output 0 text, 1 binary frame, 2 feature record)
+  if (!inarray(line, 0)){               // WL outside the pin map
+    return;
+  }
   digitalWrite(_ledPin, HIGH);
   initContentAddress();                 // reinitialize
   precharge(t_pre, line);               // precharge time, WL number
-  applypattern(pattern, t_pat);         // pattern (binary), time for applying pattern in ms
-  wordlineread(line);                   // WL number
+  applypattern(pattern, t_pat);         // pattern (bytes, BL0 first), time for applying pattern in ms
+  wordlineread(line, output);           // WL number, output format
+  gndall(t_gnd);                        // grounds all lines for time in ms
+  digitalWrite(_ledPin, LOW);
+}
+
+void Memoryfunctions::camreadadc(int line, const byte *pattern, int t_pat, int t_pre, int t_gnd, int prescale, int count){
+  // Content addressable read function with a free-running ADC capture of count samples
+  if (!inarray(line, 0)){               // WL outside the pin map
+    return;
+  }
+  digitalWrite(_ledPin, HIGH);
+  initContentAddress();                 // reinitialize
+  precharge(t_pre, line);               // precharge time, WL number
+  applypattern(pattern, t_pat);         // pattern (bytes, BL0 first), time for applying pattern in ms
+  adcread(line, prescale, count);       // WL number, ADC clock prescaler, number of samples
   gndall(t_gnd);                        // grounds all lines for time in ms
   digitalWrite(_ledPin, LOW);
 }
@@ -368,6 +595,9 @@ void Memoryfunctions::formarray(int t_form, int loop, int t_gnd){
 
 void Memoryfunctions::writeZERO(int w, int b, int t_write, int loop, int t_gnd){
   // Write a ZERO state function
+  if (!inarray(w, b)){                  // cell outside the pin map
+    return;
+  }
   digitalWrite(_ledPin, HIGH);
   initOneThirdTwoThirdZERO();           // 1/3-2/3 initialize ZERO write
   delay(100);
@@ -381,6 +611,9 @@ void Memoryfunctions::writeZERO(int w, int b, int t_write, int loop, int t_gnd){
 
 void Memoryfunctions::writeONE(int w, int b, int t_write, int loop, int t_gnd){
   // Write a ONE state function
+  if (!inarray(w, b)){                  // cell outside the pin map
+    return;
+  }
   digitalWrite(_ledPin, HIGH);
   initOneThirdTwoThirdONE();            // 1/3-2/3 initialize ONE write
   delay(100);
@@ -395,6 +628,9 @@ void Memoryfunctions::writeONE(int w, int b, int t_write, int loop, int t_gnd){
 int Memoryfunctions::stdread_rewrite(int w, int b, int t_read, int t_write, int loop, int t_gnd){
   // Standard read functon and rewrite
   // STILL IN TESTING
+  if (!inarray(w, b)){                  // cell outside the pin map
+    return -1;
+  }
   digitalWrite(_ledPin, HIGH);
   initOneThirdTwoThirdZERO();           // 1/3-2/3 initialize ZERO write
   int state = stdread(w, b, t_read);    // read at bit w, b, for time in ms
@@ -2,7 +2,7 @@
 Memoryfunctions.h - Library for memory testing functions
 Jeremy Smith
 EECS, University of California Berkeley
-Version 1.6
+Version 1.7
 */
 
 #ifndef Memoryfunctions_h
@@ -10,14 +10,23 @@ Version 1.6
 
 #include <Arduino.h>
 
+#define MAXSAMPLES 1500           // Samples stored by a free-running ADC capture
+#define MAXROWS 16                // Word lines in the largest array (one analog input each)
+#define MAXCOLS 32                // Bit lines in the largest array
+#define PATTERNBYTES ((MAXCOLS + 7)/8)  // Bytes in the longest CAM read pattern
+
 class Memoryfunctions {
   public:
     // declare class constructor method
     Memoryfunctions();
+    // declare array setup function
+    int setarray(int, int, const int*, const int*, const int*, const int*);
+    int inarray(int, int);
     // declare basic functions
     void precharge(int, int);
-    void applypattern(int, int);
-    void wordlineread(int);
+    void applypattern(const byte*, int);
+    void wordlineread(int, int);
+    void adcread(int, int, int);
     void forming(int);
     int stdread(int, int, int);
     void stdwriteZERO(int, int, int);
@@ -30,17 +39,23 @@ class Memoryfunctions {
     void initOneThirdTwoThirdZERO();
     // declare other functions
     void establishContact(char);
+    void sendframe();
+    void sendfeatures();
+    void sendsamples(int, int);
     // declare high level functions
-    void camread(int, int, int, int, int);
+    void camread(int, const byte*, int, int, int, int);
+    void camreadadc(int, const byte*, int, int, int, int, int);
     void formarray(int, int, int);
     void writeZERO(int, int, int, int, int);
     void writeONE(int, int, int, int, int);
     int stdread_rewrite(int, int, int, int, int, int);
   private:
-    int _analogPinARD[3];       // Analog reads for WLs
-    int _digitalPinWL[3];       // Controls for WLs
-    int _digitalPinBL[3];       // Controls for BLs
-    int _digitalPinReadWL[3];   // Digital reads for WLs
+    int _rows;                        // Number of WLs in the pin map
+    int _cols;                        // Number of BLs in the pin map
+    int _analogPinARD[MAXROWS];       // Analog reads for WLs
+    int _digitalPinWL[MAXROWS];       // Controls for WLs
+    int _digitalPinBL[MAXCOLS];       // Controls for BLs
+    int _digitalPinReadWL[MAXROWS];   // Digital reads for WLs
 
     int _digitalPinWLSELA;      // V<->2/3V select for WLs
     int _digitalPinWLSELB;      // float<->SELC select for WLs
@@ -55,8 +70,15 @@ class Memoryfunctions {
 
     int _ledPin;
 
-    unsigned int _vwordline[500]; // Stores analogue voltage read on WL
-    unsigned long _time[500];     // Stores time in ms during read
+    void releaselines();
+
+    union {
+      struct {
+        unsigned int _vwordline[500]; // Stores analogue voltage read on WL
+        unsigned long _time[500];     // Stores time in ms during read
+      };
+      unsigned int _samples[MAXSAMPLES];  // Stores free-running ADC samples (same RAM)
+    };
 };
 
 // external existence of object mem so it can be used in sketch
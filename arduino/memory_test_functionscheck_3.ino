@@ -45,7 +45,8 @@ void setup(){
 }
 
 void loop(){
-  //mem.camread(0, B111, 0, 100, 100);      // CAM read function (line, pattern, t_pat, t_pre, t_gnd)
+  //byte pattern[1] = {B111};                // CAM read pattern (BL0 is bit 0)
+  //mem.camread(0, pattern, 0, 100, 100, 0); // CAM read function (line, pattern, t_pat, t_pre, t_gnd, output)
 
   mem.writeZERO(0, 0, 20, 1, 40);    // Write ONE function (w, b, t_write, loop, t_gnd)
 
@@ -19,15 +19,37 @@ Version 3.0
 #define sbi(sfr, bit) (_SFR_BYTE(sfr) |= _BV(bit))
 #endif
 
+#define MAXBATCH 32         // maximum number of commands in one batch
+#define COMMANDLENGTH (8 + PATTERNBYTES - 1)  // longest command (CAM read with the widest pattern)
+#define LINKTESTBYTES 256   // bytes in the serial link test block
+
+// Array pin map (WL i uses wlPins[i], wlReadPins[i] and wlAnalogPins[i], BL j uses blPins[j])
+// Edit for the array under test, up to MAXROWS x MAXCOLS
+const int arrayRows = 3;
+const int arrayCols = 3;
+const int wlPins[arrayRows] = {24, 26, 28};
+const int wlReadPins[arrayRows] = {36, 38, 40};
+const int wlAnalogPins[arrayRows] = {A0, A1, A2};
+const int blPins[arrayCols] = {25, 27, 29};
+
+// Serial rates selectable by the 'S' command (index 0 is the startup rate)
+const long baudRates[] = {115200, 250000, 500000, 1000000, 2000000};
+const int baudCount = 5;
+
 const int ledPin = 13;      // LED pin number
+long baud = baudRates[0];   // current serial rate
 unsigned int inByte;        // incoming serial byte for program number
 unsigned int inBuffer[7];   // serial buffer for other data parsed from python
+byte pattern[PATTERNBYTES]; // CAM read pattern (inBuffer[2] then any extra pattern bytes)
+int patternBytes = 1;       // bytes in a CAM read pattern (set by the 'W' command)
 int state;                  // read state (1 or 0)
+byte batchBuffer[MAXBATCH][COMMANDLENGTH];  // stored commands for a batch
 
 /*
 Setup function
   Blinks LED
   Sets ADC smple rate
+  Loads the array pin map
   Initializes pins and sets initial voltages
   Sends establish contact byte 'A'
 */
@@ -40,7 +62,7 @@ void setup(){
     digitalWrite(ledPin, LOW);
     delay(200);
   }
-  Serial.begin(115200);
+  Serial.begin(baud);
   timer2.setup();             // setup for timer2 counter
   #if FASTADC
     // set prescale to 16 i.e. 1 MHz ADC clock and theoretical 76.9 kHz sample rate (1 Mhz / 13)
@@ -49,6 +71,7 @@ void setup(){
     cbi(ADCSRA,ADPS0);
   #endif
   delay(1000);
+  mem.setarray(arrayRows, arrayCols, wlPins, wlReadPins, wlAnalogPins, blPins);
   mem.initPinMode();          // initialization required pin modes to OUTPUT
   mem.initContentAddress();   // initial initialization (all float ready for probing)
   mem.establishContact('A');  // establish contact
@@ -58,7 +81,7 @@ void setup(){
 /*
 Main function
    Reads in serial port data from python script
-   Runs required function
+   Runs required function (or batch of functions)
    Sends establish contact byte 'Z'
 */
 
@@ -68,30 +91,214 @@ void loop(){
     for (int i=0; i<7; i++){
       inBuffer[i] = Serial.read();  // reads serial data from python into buffer
     }
-    switch (inByte){
-      case '1':
-        // Content addressable read function
-        mem.camread(inBuffer[0], inBuffer[2], inBuffer[3], inBuffer[4], inBuffer[6]);
-        break;
-      case '2':
-        // Forming all bits function
-        mem.formarray(inBuffer[4], inBuffer[5], inBuffer[6]);
-        break;
-      case '3':
-        // Write a ZERO state function
-        mem.writeZERO(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[5], inBuffer[6]);
-        break;
-      case '4':
-        // Write a ONE state function
-        mem.writeONE(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[5], inBuffer[6]);
-        break;
-      case '5':
-        // Standard read function (currently not functioning)
-        mem.stdread_rewrite(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[3], inBuffer[5], inBuffer[6]);
-        break;
+    if (inByte == 'B'){
+      runbatch(inBuffer[0]);        // batch of inBuffer[0] commands follows
+    } else if (inByte == 'W'){
+      setwidth(inBuffer[0], inBuffer[1]);  // pattern width in BLs and number of WLs
+    } else if (inByte == 'S'){
+      setbaud(inBuffer[0]);         // serial rate baudRates[inBuffer[0]]
+    } else{
+      readpattern(inByte, NULL);    // extra pattern bytes of a CAM read follow
+      if (runcommand() == 3){
+        Serial.println(F("ADDRESS ERROR"));
+      }
     }
     delay(1000);
     mem.establishContact('Z');
   }
 }
 
+
+/*
+Pattern functions
+   CAM read patterns have bit y on BL y, low byte in inBuffer[2]
+   Patterns wider than 8 BLs send patternBytes-1 more bytes after the command
+*/
+
+int camcommand(int program){
+  return program == '1' || program == '6' || program == '7' || program == '8';
+}
+
+void readpattern(int program, byte *extra){
+  // extra holds the pattern bytes already read (batch) or NULL to read them from serial
+  pattern[0] = inBuffer[2];
+  for (int i=1; i<PATTERNBYTES; i++){
+    pattern[i] = 0;
+  }
+  if (!camcommand(program)){
+    return;
+  }
+  for (int i=1; i<patternBytes; i++){
+    if (extra == NULL){
+      while (Serial.available() == 0){}
+      pattern[i] = Serial.read();
+    } else{
+      pattern[i] = extra[i-1];
+    }
+  }
+}
+
+void setwidth(int cols, int rows){
+  // Sets the pattern width and replies "WIDTH cols rows" (WIDTH 0 0 if the array does not fit the pin map)
+  if (cols < 1 || cols > arrayCols || rows < 1 || rows > arrayRows){
+    cols = 0;
+    rows = 0;
+  } else{
+    patternBytes = (cols + 7)/8;
+  }
+  Serial.print(F("WIDTH "));
+  Serial.print(cols);
+  Serial.print(' ');
+  Serial.println(rows);
+}
+
+
+/*
+Serial rate functions
+   'S' replies "BAUD rate" (BAUD 0 if the index is not in baudRates) and switches to the rate
+   The host then sends LINKTESTBYTES bytes which are echoed back as a binary frame
+   The rate is kept if the host replies 'K', otherwise the previous rate is restored
+*/
+
+void setbaud(int index){
+  if (index < 0 || index >= baudCount){
+    Serial.println(F("BAUD 0"));
+    return;
+  }
+  Serial.print(F("BAUD "));
+  Serial.println(baudRates[index]);
+  Serial.flush();             // waits until the reply has been sent at the old rate
+  Serial.end();
+  Serial.begin(baudRates[index]);
+  if (linktest()){
+    baud = baudRates[index];
+  } else{
+    Serial.end();
+    Serial.begin(baud);
+  }
+}
+
+int linktest(){
+  // Echoes the test block framed as in sendframe and returns 1 if the host confirms with 'K'
+  byte block[LINKTESTBYTES];
+  byte reply = 0;
+  unsigned int checksum = 0;
+  int count = Serial.readBytes(block, LINKTESTBYTES);
+  Serial.write('#');
+  Serial.write(lowByte(count));
+  Serial.write(highByte(count));
+  for (int i=0; i<count; i++){
+    Serial.write(block[i]);
+    checksum += block[i];
+  }
+  Serial.write(lowByte(checksum));
+  Serial.write(highByte(checksum));
+  Serial.readBytes(&reply, 1);
+  return reply == 'K';
+}
+
+
+/*
+Run command function
+   Runs the program in inByte with parameters in inBuffer
+   Returns 0 if run, 1 if the program number is unknown or 3 if the WL or BL is outside the pin map
+*/
+
+int runcommand(){
+  if (!inaddress()){
+    return 3;
+  }
+  switch (inByte){
+    case '1':
+      // Content addressable read function
+      mem.camread(inBuffer[0], pattern, inBuffer[3], inBuffer[4], inBuffer[6], 0);
+      break;
+    case '2':
+      // Forming all bits function
+      mem.formarray(inBuffer[4], inBuffer[5], inBuffer[6]);
+      break;
+    case '3':
+      // Write a ZERO state function
+      mem.writeZERO(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[5], inBuffer[6]);
+      break;
+    case '4':
+      // Write a ONE state function
+      mem.writeONE(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[5], inBuffer[6]);
+      break;
+    case '5':
+      // Standard read function (currently not functioning)
+      mem.stdread_rewrite(inBuffer[0], inBuffer[1], inBuffer[3], inBuffer[3], inBuffer[5], inBuffer[6]);
+      break;
+    case '6':
+      // Content addressable read function with binary framed output
+      mem.camread(inBuffer[0], pattern, inBuffer[3], inBuffer[4], inBuffer[6], 1);
+      break;
+    case '7':
+      // Content addressable read function sending only a feature record
+      mem.camread(inBuffer[0], pattern, inBuffer[3], inBuffer[4], inBuffer[6], 2);
+      break;
+    case '8':
+      // Content addressable read function with free-running ADC capture
+      // (ADC clock prescaler 2^inBuffer[1], inBuffer[5] x 10 samples)
+      mem.camreadadc(inBuffer[0], pattern, inBuffer[3], inBuffer[4], inBuffer[6], inBuffer[1], inBuffer[5]*10);
+      break;
+    default:
+      return 1;
+  }
+  return 0;
+}
+
+
+int inaddress(){
+  // Checks the WL (CAM reads) or WL and BL (writes and reads of one cell) against the pin map
+  if (camcommand(inByte)){
+    return mem.inarray(inBuffer[0], 0);
+  }
+  if (inByte == '3' || inByte == '4' || inByte == '5'){
+    return mem.inarray(inBuffer[0], inBuffer[1]);
+  }
+  return 1;
+}
+
+
+/*
+Run batch function
+   Reads count commands (8 bytes and any extra pattern bytes) then runs them back to back
+   Sends "OP k" before and "ST k status" after each command
+   Status is 0 (run), 1 (unknown program), 2 (not run, batch too long) or 3 (address outside the pin map)
+*/
+
+void runbatch(int count){
+  byte command[COMMANDLENGTH];
+  for (int k=0; k<count; k++){      // reads all commands (they may not fit in the serial buffer)
+    if (Serial.readBytes(command, 8) < 8){
+      Serial.println(F("BATCH TIMEOUT"));
+      return;
+    }
+    int length = camcommand(command[0]) ? 8 + patternBytes - 1 : 8;
+    if (length > 8 && Serial.readBytes(command + 8, length - 8) < length - 8){
+      Serial.println(F("BATCH TIMEOUT"));
+      return;
+    }
+    if (k < MAXBATCH){
+      memcpy(batchBuffer[k], command, length);
+    }
+  }
+  for (int k=0; k<count; k++){
+    int status = 2;
+    Serial.print(F("OP "));
+    Serial.println(k);
+    if (k < MAXBATCH){
+      inByte = batchBuffer[k][0];
+      for (int i=0; i<7; i++){
+        inBuffer[i] = batchBuffer[k][i+1];
+      }
+      readpattern(inByte, batchBuffer[k] + 8);
+      status = runcommand();
+    }
+    Serial.print(F("ST "));
+    Serial.print(k);
+    Serial.print(' ');
+    Serial.println(status);
+  }
+}
@@ -47,9 +47,26 @@ class Ui_MainWindow(object):
         self.comboBox_1.addItem(_fromUtf8(""))
         self.comboBox_1.addItem(_fromUtf8(""))
         self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
+        self.comboBox_1.addItem(_fromUtf8(""))
         self.comboBox_2 = QtGui.QComboBox(self.tab_1)
         self.comboBox_2.setGeometry(QtCore.QRect(130, 60, 104, 26))
         self.comboBox_2.setObjectName(_fromUtf8("comboBox_2"))
+        self.comboBox_2.setEditable(True)
+        self.comboBox_2.addItem(_fromUtf8(""))
+        self.comboBox_2.addItem(_fromUtf8(""))
+        self.comboBox_2.addItem(_fromUtf8(""))
         self.comboBox_2.addItem(_fromUtf8(""))
         self.comboBox_2.addItem(_fromUtf8(""))
         self.comboBox_2.addItem(_fromUtf8(""))
@@ -119,6 +136,10 @@ class Ui_MainWindow(object):
         self.comboBox_3 = QtGui.QComboBox(self.tab_2)
         self.comboBox_3.setGeometry(QtCore.QRect(130, 30, 104, 26))
         self.comboBox_3.setObjectName(_fromUtf8("comboBox_3"))
+        self.comboBox_3.setEditable(True)
+        self.comboBox_3.addItem(_fromUtf8(""))
+        self.comboBox_3.addItem(_fromUtf8(""))
+        self.comboBox_3.addItem(_fromUtf8(""))
         self.comboBox_3.addItem(_fromUtf8(""))
         self.comboBox_3.addItem(_fromUtf8(""))
         self.comboBox_3.addItem(_fromUtf8(""))
@@ -182,9 +203,26 @@ class Ui_MainWindow(object):
         self.comboBox_4.addItem(_fromUtf8(""))
         self.comboBox_4.addItem(_fromUtf8(""))
         self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
+        self.comboBox_4.addItem(_fromUtf8(""))
         self.comboBox_5 = QtGui.QComboBox(self.tab_4)
         self.comboBox_5.setGeometry(QtCore.QRect(130, 60, 104, 26))
         self.comboBox_5.setObjectName(_fromUtf8("comboBox_5"))
+        self.comboBox_5.setEditable(True)
+        self.comboBox_5.addItem(_fromUtf8(""))
+        self.comboBox_5.addItem(_fromUtf8(""))
+        self.comboBox_5.addItem(_fromUtf8(""))
         self.comboBox_5.addItem(_fromUtf8(""))
         self.comboBox_5.addItem(_fromUtf8(""))
         self.comboBox_5.addItem(_fromUtf8(""))
@@ -261,6 +299,9 @@ class Ui_MainWindow(object):
         self.pushButton_15 = QtGui.QPushButton(self.tab_3)
         self.pushButton_15.setGeometry(QtCore.QRect(450, 200, 120, 32))
         self.pushButton_15.setObjectName(_fromUtf8("pushButton_15"))
+        self.checkBox_1 = QtGui.QCheckBox(self.tab_3)
+        self.checkBox_1.setGeometry(QtCore.QRect(580, 165, 130, 21))
+        self.checkBox_1.setObjectName(_fromUtf8("checkBox_1"))
 
         self.tabWidget.addTab(self.tab_3, _fromUtf8(""))
 
@@ -276,18 +317,53 @@ class Ui_MainWindow(object):
         self.comboBox_1.setItemText(0, _translate("MainWindow", "0", None))
         self.comboBox_1.setItemText(1, _translate("MainWindow", "1", None))
         self.comboBox_1.setItemText(2, _translate("MainWindow", "2", None))
+        self.comboBox_1.setItemText(3, _translate("MainWindow", "3", None))
+        self.comboBox_1.setItemText(4, _translate("MainWindow", "4", None))
+        self.comboBox_1.setItemText(5, _translate("MainWindow", "5", None))
+        self.comboBox_1.setItemText(6, _translate("MainWindow", "6", None))
+        self.comboBox_1.setItemText(7, _translate("MainWindow", "7", None))
+        self.comboBox_1.setItemText(8, _translate("MainWindow", "8", None))
+        self.comboBox_1.setItemText(9, _translate("MainWindow", "9", None))
+        self.comboBox_1.setItemText(10, _translate("MainWindow", "10", None))
+        self.comboBox_1.setItemText(11, _translate("MainWindow", "11", None))
+        self.comboBox_1.setItemText(12, _translate("MainWindow", "12", None))
+        self.comboBox_1.setItemText(13, _translate("MainWindow", "13", None))
+        self.comboBox_1.setItemText(14, _translate("MainWindow", "14", None))
+        self.comboBox_1.setItemText(15, _translate("MainWindow", "15", None))
         self.comboBox_2.setItemText(0, _translate("MainWindow", "1x1", None))
         self.comboBox_2.setItemText(1, _translate("MainWindow", "2x2", None))
         self.comboBox_2.setItemText(2, _translate("MainWindow", "3x3", None))
+        self.comboBox_2.setItemText(3, _translate("MainWindow", "4x4", None))
+        self.comboBox_2.setItemText(4, _translate("MainWindow", "8x8", None))
+        self.comboBox_2.setItemText(5, _translate("MainWindow", "12x12", None))
         self.comboBox_3.setItemText(0, _translate("MainWindow", "1x1", None))
         self.comboBox_3.setItemText(1, _translate("MainWindow", "2x2", None))
         self.comboBox_3.setItemText(2, _translate("MainWindow", "3x3", None))
+        self.comboBox_3.setItemText(3, _translate("MainWindow", "4x4", None))
+        self.comboBox_3.setItemText(4, _translate("MainWindow", "8x8", None))
+        self.comboBox_3.setItemText(5, _translate("MainWindow", "16x16", None))
         self.comboBox_4.setItemText(0, _translate("MainWindow", "0", None))
         self.comboBox_4.setItemText(1, _translate("MainWindow", "1", None))
         self.comboBox_4.setItemText(2, _translate("MainWindow", "2", None))
+        self.comboBox_4.setItemText(3, _translate("MainWindow", "3", None))
+        self.comboBox_4.setItemText(4, _translate("MainWindow", "4", None))
+        self.comboBox_4.setItemText(5, _translate("MainWindow", "5", None))
+        self.comboBox_4.setItemText(6, _translate("MainWindow", "6", None))
+        self.comboBox_4.setItemText(7, _translate("MainWindow", "7", None))
+        self.comboBox_4.setItemText(8, _translate("MainWindow", "8", None))
+        self.comboBox_4.setItemText(9, _translate("MainWindow", "9", None))
+        self.comboBox_4.setItemText(10, _translate("MainWindow", "10", None))
+        self.comboBox_4.setItemText(11, _translate("MainWindow", "11", None))
+        self.comboBox_4.setItemText(12, _translate("MainWindow", "12", None))
+        self.comboBox_4.setItemText(13, _translate("MainWindow", "13", None))
+        self.comboBox_4.setItemText(14, _translate("MainWindow", "14", None))
+        self.comboBox_4.setItemText(15, _translate("MainWindow", "15", None))
         self.comboBox_5.setItemText(0, _translate("MainWindow", "1x1", None))
         self.comboBox_5.setItemText(1, _translate("MainWindow", "2x2", None))
         self.comboBox_5.setItemText(2, _translate("MainWindow", "3x3", None))
+        self.comboBox_5.setItemText(3, _translate("MainWindow", "4x4", None))
+        self.comboBox_5.setItemText(4, _translate("MainWindow", "8x8", None))
+        self.comboBox_5.setItemText(5, _translate("MainWindow", "12x12", None))
 
         self.lineEdit_1.setText(_translate("MainWindow", "0", None))
         self.lineEdit_2.setText(_translate("MainWindow", "100", None))
@@ -328,6 +404,7 @@ class Ui_MainWindow(object):
         self.pushButton_4.setText(_translate("MainWindow", "RUN", None))
         self.pushButton_5.setText(_translate("MainWindow", "Save", None))
         self.pushButton_6.setText(_translate("MainWindow", "Reset", None))
+        self.checkBox_1.setText(_translate("MainWindow", "Also save .npy", None))
         self.pushButton_7.setText(_translate("MainWindow", "Cancel", None))
         self.pushButton_8.setText(_translate("MainWindow", "Cancel", None))
         self.pushButton_9.setText(_translate("MainWindow", "Continue...", None))
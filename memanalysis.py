@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memanalysis.py
+Hamming distance extraction from CAM read word line discharge curves
+
+Run with e.g.:
+    python memanalysis.py results/cal.txt --calibrate --word 011 --save cal.json
+    python memanalysis.py results/run1.txt --calibration cal.json
+
+A CAM read precharges the word line and lets it discharge through every
+cell on it; cells whose stored bit mismatches the applied pattern conduct
+much more, so the discharge rate rises with the Hamming distance between
+pattern and stored word. Features of many curves are computed at once on
+NaN padded (curves, samples) arrays:
+    v0     precharge voltage [V]
+    ttt    time to fall to threshold*v0 [us] (NaN if it never does)
+    slope  initial slope from a line fit to the first samples [V/us]
+    tau    RC constant from a fit of log(V) against time [us]
+and each curve is assigned the distance whose calibrated discharge rate
+(1/tau) is nearest.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import re
+import sys
+import json
+import argparse
+import numpy as np
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Header lines written by MemTest
+addressline = re.compile(r'WL\s+(\d+)')
+patternline = re.compile(r'Data Pattern:\s*([01]+)')
+# Distance table columns
+tabledtype = np.dtype([('wordline', '<i4'), ('pattern', '<i4'), ('distance', '<i4'),
+                       ('v0', '<f8'), ('ttt', '<f8'), ('slope', '<f8'), ('tau', '<f8')])
+
+
+def stack(curves):
+    """Returns (time, voltage) as (curves, samples) arrays padded with NaN from a list of (n, 2) arrays"""
+    lengths = [len(c) for c in curves]
+    if lengths and min(lengths) == max(lengths):
+        data = np.asarray(curves, dtype=float).reshape(len(curves), lengths[0], 2)
+        return data[:, :, 0], data[:, :, 1]
+    n = max(lengths) if lengths else 0
+    t = np.full((len(curves), n), np.nan)
+    v = np.full((len(curves), n), np.nan)
+    for i, c in enumerate(curves):
+        c = np.asarray(c, dtype=float).reshape(-1, 2)
+        t[i, :len(c)] = c[:, 0]
+        v[i, :len(c)] = c[:, 1]
+    return t, v
+
+
+def features(t, v, threshold=0.5, head=10, floor=0.05):
+    """Returns a dictionary of v0, ttt, slope and tau arrays for (curves, samples) time [us] and voltage [V]
+
+    threshold is the fraction of v0 for ttt, head the number of samples
+    for the initial slope and floor [V] the lowest voltage used in the RC
+    fit (below it the ADC noise dominates).
+    """
+    rows = np.arange(t.shape[0])
+    v0 = v[:, 0]
+
+    # Time to threshold, interpolated between the samples either side
+    level = threshold*v0
+    with np.errstate(invalid='ignore'):
+        below = v < level[:, None]
+    i1 = below.argmax(axis=1)
+    found = below[rows, i1] & (i1 > 0)
+    i0 = np.maximum(i1 - 1, 0)
+    dv = v[rows, i0] - v[rows, i1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(dv > 0, (v[rows, i0] - level)/dv, 0.0)
+    ttt = np.where(found, t[rows, i0] + frac*(t[rows, i1] - t[rows, i0]), np.nan)
+
+    # Initial slope: least squares line through the first head samples
+    th = t[:, :head]
+    vh = v[:, :head]
+    tc = th - np.nanmean(th, axis=1)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.nansum(tc*(vh - np.nanmean(vh, axis=1)[:, None]), axis=1)/np.nansum(tc*tc, axis=1)
+
+    # RC constant: least squares line through log(V) of samples above floor
+    with np.errstate(invalid='ignore'):
+        use = v > floor
+    w = use.astype(float)
+    tw = np.where(use, t, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lw = np.where(use, np.log(np.where(use, v, 1.0)), 0.0)
+        n = w.sum(axis=1)
+        st = tw.sum(axis=1)
+        sl = lw.sum(axis=1)
+        b = (n*(tw*lw).sum(axis=1) - st*sl)/(n*(tw*tw).sum(axis=1) - st*st)
+        tau = np.where((n >= 3) & (b < 0), -1.0/b, np.inf)
+    return {'v0': v0, 'ttt': ttt, 'slope': slope, 'tau': tau}
+
+
+def hamming(patterns, word):
+    """Returns the Hamming distances between pattern numbers (bit y on bit line y) and a stored word string"""
+    patterns = np.asarray(patterns, dtype=np.int64)
+    distance = np.zeros(patterns.shape, dtype=np.int64)
+    for y, c in enumerate(word):
+        distance += ((patterns >> y) & 1) != int(c)
+    return distance
+
+
+class Calibration(object):
+    """Class for the discharge rate (1/tau) [1/us] of each Hamming distance 0..arraysize
+
+    Built from curves of known distance; distances missing from the
+    calibration are filled from a straight line fit of rate against
+    distance (the rate is the sum of the cell conductances).
+    """
+    def __init__(self, rates):
+        self.rates = np.asarray(rates, dtype=float)
+
+    @property
+    def arraysize(self):
+        return len(self.rates) - 1
+
+    @classmethod
+    def fromfeatures(cls, tau, distance, arraysize):
+        """Returns a Calibration from tau [us] and the known distance of each curve"""
+        rate = 1.0/np.asarray(tau, dtype=float)
+        distance = np.asarray(distance)
+        known = np.unique(distance[np.isfinite(rate)])
+        if len(known) == 0:
+            raise ValueError("no usable calibration curves")
+        means = np.array([np.median(rate[(distance == d) & np.isfinite(rate)]) for d in known])
+        rates = np.empty(arraysize + 1)
+        if len(known) > 1:
+            fit = np.polyfit(known, means, 1)
+            rates[:] = np.polyval(fit, np.arange(arraysize + 1))
+        else:
+            rates[:] = means[0]
+        rates[known] = means
+        return cls(rates)
+
+    def classify(self, tau):
+        """Returns the Hamming distance of each curve from its tau [us]"""
+        rate = 1.0/np.asarray(tau, dtype=float)
+        rate = np.where(np.isfinite(rate), rate, 0.0)
+        return np.abs(rate[:, None] - self.rates[None, :]).argmin(axis=1)
+
+    def save(self, filename):
+        with open(filename, 'w') as outfile:
+            json.dump({'version': __version__, 'rates': list(self.rates)}, outfile, indent=1)
+        return
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as infile:
+            return cls(json.load(infile)['rates'])
+
+
+def splitrun(runresult):
+    """Returns (wordlines, patterns, curves) of the CAM reads in an alternating header/data buffer or a memstore.ResultStore"""
+    if hasattr(runresult, 'records'):
+        records = runresult.records
+        selection = np.nonzero((records['pattern'] >= 0) & (records['length'] > 0))[0]
+        return (records['wordline'][selection].clip(0).astype(int), records['pattern'][selection].astype(int),
+                [runresult[i] for i in selection])
+    wordlines = []
+    patterns = []
+    curves = []
+    header = []
+    for block in runresult:
+        if not isinstance(block, np.ndarray):
+            header = list(block)
+            continue
+        text = '\n'.join(header)
+        pattern = patternline.search(text)
+        if pattern is None or len(block) == 0:
+            continue
+        address = addressline.search(text)
+        wordlines.append(int(address.group(1)) if address else 0)
+        patterns.append(int(pattern.group(1), 2))
+        curves.append(block)
+    return np.array(wordlines, dtype=int), np.array(patterns, dtype=int), curves
+
+
+def distancetable(runresult, calibration, **kwargs):
+    """Returns a table (structured array, one row per CAM read) of the Hamming distance of each pattern"""
+    wordlines, patterns, curves = splitrun(runresult)
+    table = np.zeros(len(curves), dtype=tabledtype)
+    if len(curves) == 0:
+        return table
+    f = features(*stack(curves), **kwargs)
+    table['wordline'] = wordlines
+    table['pattern'] = patterns
+    table['distance'] = calibration.classify(f['tau'])
+    for key in ('v0', 'ttt', 'slope', 'tau'):
+        table[key] = f[key]
+    return table
+
+
+def calibrate(runresult, word, **kwargs):
+    """Returns a Calibration from a run of CAM reads of every pattern against a known stored word"""
+    wordlines, patterns, curves = splitrun(runresult)
+    if len(curves) == 0:
+        raise ValueError("no CAM reads to calibrate with")
+    f = features(*stack(curves), **kwargs)
+    return Calibration.fromfeatures(f['tau'], hamming(patterns, word), len(word))
+
+
+def loadresults(filename):
+    """Returns the alternating header/data buffer of a results .txt, .npy/.json or journal .mtj file"""
+    if filename.endswith('.npy') or filename.endswith('.json'):
+        from memstore import loadbinary
+        return loadbinary(filename).runresult()
+    if filename.endswith('.mtj'):
+        from memjournal import readjournal
+        return readjournal(filename)
+    # Text files have a blank line after each header and each data block
+    runresult = []
+    with open(filename) as infile:
+        for block in infile.read().split('\n\n'):
+            lines = block.strip().split('\n')
+            if not lines[0]:
+                continue
+            if lines[0][:1].isdigit():
+                runresult.append(np.array([x.split('\t') for x in lines], dtype=float).reshape(-1, 2))
+            else:
+                runresult.append(lines)
+    return runresult
+
+
+def formattable(table, arraysize=None):
+    """Returns the distance table as text"""
+    lines = ["{:>3s} {:>8s} {:>8s} {:>8s} {:>10s} {:>10s}".format("WL", "Pattern", "Distance", "V0 [V]", "ttt [us]", "tau [us]")]
+    for row in table:
+        width = arraysize or max(1, int(row['pattern']).bit_length())
+        lines.append("{:3d} {:>8s} {:8d} {:8.3f} {:10.1f} {:10.1f}".format(
+            row['wordline'], "{:0{w}b}".format(row['pattern'], w=width), row['distance'], row['v0'], row['ttt'], row['tau']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hamming distances from MemTest CAM reads")
+    parser.add_argument('results', help="results file (.txt, .npy/.json or journal .mtj)")
+    parser.add_argument('--calibration', help="calibration file from --calibrate --save")
+    parser.add_argument('--calibrate', action='store_true', help="calibrate from results of reading a known word")
+    parser.add_argument('--word', help="stored word for --calibrate, bit line 0 first (e.g. 011)")
+    parser.add_argument('--save', help="file to save the calibration to")
+    parser.add_argument('--threshold', type=float, default=0.5, help="fraction of V0 for time to threshold (default 0.5)")
+    args = parser.parse_args(argv)
+
+    runresult = loadresults(args.results)
+    if args.calibrate:
+        if not args.word:
+            parser.error("--calibrate needs --word")
+        calibration = calibrate(runresult, args.word, threshold=args.threshold)
+        sys.stdout.write("Rates [1/ms] by distance: {:s}\n".format(" ".join("{:.3f}".format(r*1000) for r in calibration.rates)))
+        if args.save:
+            calibration.save(args.save)
+    elif args.calibration:
+        calibration = Calibration.load(args.calibration)
+    else:
+        parser.error("give --calibration or --calibrate")
+    table = distancetable(runresult, calibration, threshold=args.threshold)
+    sys.stdout.write(formattable(table, calibration.arraysize) + '\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+membench.py
+Benchmarks for the MemTest acquisition, parse, save and plot pipeline
+
+Run with:
+    python membench.py --output bench.json [--baseline baseline.json]
+
+Each stage is timed on synthetic captures (or captures loaded from a
+results file with --capture) at several array sizes, sample counts and
+block counts. Results are written as JSON and compared against a stored
+baseline, exiting with status 1 if any stage regresses. The comparison
+uses the fastest repeat, which is far less sensitive to other load on
+the machine than the median.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import sys
+import json
+import shutil
+import struct
+import tempfile
+import argparse
+from timeit import default_timer as timer
+import numpy as np
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Default cases as (arraysize, samples per block, blocks)
+defaultcases = [(1, 500, 1), (3, 500, 8), (3, 500, 1000), (3, 500, 10000),
+                (2, 10000, 100), (1, 100000, 1), (3, 100000, 10)]
+# Stages in pipeline order
+stagenames = ['receive_ascii', 'receive_binary', 'parse', 'store', 'save', 'save_binary', 'plot']
+
+
+class StageSkipped(Exception):
+    """Raised when a stage cannot run for a case (missing module or unsupported size)"""
+    pass
+
+
+class Capture(object):
+    """Class for one synthetic or recorded CAM read capture"""
+    def __init__(self, ticks, counts, header):
+        self.ticks = np.asarray(ticks, dtype=np.uint32)
+        self.counts = np.asarray(counts, dtype=np.uint16)
+        self.header = header
+
+    def ascii(self):
+        """Returns the capture as wordlineread sends it in ASCII mode"""
+        body = '\n'.join("{:d},{:d}".format(t, v) for t, v in zip(self.ticks, self.counts))
+        return ("PREC...\r\n" + body + "\nGNDS...\r\nZ").encode('ascii')
+
+    def binary(self):
+        """Returns the capture as wordlineread sends it as a binary frame"""
+        samples = np.empty(len(self.ticks), dtype=[('ticks', '<u4'), ('adc', '<u2')])
+        samples['ticks'] = self.ticks
+        samples['adc'] = self.counts
+        payload = samples.tobytes()
+        if len(payload) > 0xFFFF:
+            raise StageSkipped("capture too long for a binary frame")
+        checksum = int(np.frombuffer(payload, dtype=np.uint8).sum()) & 0xFFFF
+        return b"PREC...\r\n#" + struct.pack('<H', len(payload)) + payload + struct.pack('<H', checksum) + b"GNDS...\r\nZ"
+
+
+def header(arraysize, pattern, wordline=0):
+    """Returns a 7 line header like MemTest for a camread"""
+    return ["Program: 1 camread",
+            "Address: WL {:d}   BL 0".format(wordline),
+            "Data Pattern: {:0{width}b}".format(pattern, width=arraysize),
+            "Read/write time: 100 ms",
+            "Form/precharge time: 5 ms",
+            "Number of read/write pulses: 1",
+            "Ground time: 100 ms"]
+
+
+def synthetic(arraysize, samples, blocks, seed=0):
+    """Returns a list of synthetic captures of discharging word lines"""
+    rng = np.random.RandomState(seed)
+    captures = []
+    for b in range(blocks):
+        pattern = b % 2**arraysize
+        ticks = np.cumsum(rng.randint(32, 36, size=samples)) - 32
+        rate = 0.05 + bin(pattern).count('1')
+        volts = 2.0*np.exp(-rate*ticks*0.0005) + rng.normal(0.0, 0.007, size=samples)
+        counts = np.clip(np.round(volts*1023/5.0), 0, 1023)
+        captures.append(Capture(ticks, counts, header(arraysize, pattern)))
+    return captures
+
+
+def recorded(filename):
+    """Returns captures loaded from a results file written by SaveFile"""
+    captures = []
+    header = []
+    with open(filename) as infile:
+        blocks = infile.read().split('\n\n')
+    # Each header and each data block is followed by a blank line
+    for block in blocks:
+        lines = block.strip().split('\n')
+        if not lines[0]:
+            continue
+        if not lines[0][:1].isdigit():
+            header = lines
+            continue
+        data = np.array([x.split('\t') for x in lines], dtype=float)
+        ticks = np.round(data[:, 0]/0.5)
+        counts = np.round(data[:, 1]*1023/5.0)
+        captures.append(Capture(ticks, counts, header))
+    return captures
+
+
+def memtestmodule():
+    """Imports MemTest, skipping stages that need it when PyQt4 is not installed"""
+    try:
+        import MemTest
+    except ImportError as e:
+        raise StageSkipped("MemTest not importable ({:s})".format(str(e)))
+    return MemTest
+
+
+def runresult(captures):
+    """Returns the alternating header/data buffer that MainApp builds"""
+    buf = []
+    for c in captures:
+        buf.append(c.header)
+        buf.append(np.column_stack((c.ticks*0.5, c.counts*5.0/1023)))
+    return buf
+
+
+def stage_receive(captures, binary, chunksize=4096):
+    """Feeds captures to StreamParser in chunks as SerialSession does"""
+    from memserial import StreamParser
+    streams = [c.binary() if binary else c.ascii() for c in captures]
+    sink = []
+    def run():
+        for stream in streams:
+            parser = StreamParser(sink.extend, sink.append if binary else None)
+            for i in range(0, len(stream), chunksize):
+                if parser.feed(stream[i:i + chunksize]):
+                    break
+            del sink[:]
+    return run
+
+
+def stage_parse(captures):
+    """Runs MemTest.output on the received lines of each capture"""
+    from memcore import MemTest
+    tests = []
+    for c in captures:
+        test = MemTest('bench', 'camread')
+        test._lines = c.ascii().decode('ascii').replace('\r', '').rstrip('Z').rstrip('\n').split('\n')
+        tests.append(test)
+    def run():
+        for test in tests:
+            test.output()
+    return run
+
+
+def stage_store(captures, pathname):
+    """Runs MemTest.storeresult (as MainApp does, appending to a run journal) for each capture"""
+    MemTest = memtestmodule()
+    from memjournal import newjournal
+    data = [(np.column_stack((c.ticks*0.5, c.counts*5.0/1023)), c.header) for c in captures]
+    def run():
+        journal = newjournal(pathname, cachesize=MemTest.resultcache)
+        for d, h in data:
+            MemTest.storeresult(journal, None, d, h)
+        journal.close()
+    return run
+
+
+def stage_save(captures, pathname):
+    """Runs writeresults (as SaveFile.run does) on the full result buffer"""
+    from memcore import writeresults
+    buf = runresult(captures)
+    def run():
+        writeresults(buf, "bench.txt", pathname)
+    return run
+
+
+def stage_savebinary(captures, pathname):
+    """Runs savebinary (as SaveFile.run does with binary set) on the full result buffer"""
+    from memstore import savebinary
+    buf = runresult(captures)
+    def run():
+        savebinary(buf, "bench", pathname)
+    return run
+
+
+def stage_plot(captures, pathname):
+    """Runs MemTest.replot (every block of a run journal to the MpltCanvas line pool) and draws the canvas"""
+    MemTest = memtestmodule()
+    from PyQt4 import QtGui
+    if QtGui.QApplication.instance() is None:
+        stage_plot.app = QtGui.QApplication(sys.argv)
+    from mplcanvas import MpltCanvas
+    from memjournal import newjournal
+    plotcanvas = MpltCanvas()
+    journal = newjournal(pathname, cachesize=MemTest.resultcache)
+    for c in captures:
+        journal.append(c.header, np.column_stack((c.ticks*0.5, c.counts*5.0/1023)))
+    journal.sync()
+    def run():
+        MemTest.replot(plotcanvas, journal)
+        plotcanvas.redraw()
+        plotcanvas.draw()
+    return run
+
+
+def measure(run, repeats, mintime):
+    """Returns a list of latencies [s] of run, repeated at least repeats times and mintime seconds"""
+    latencies = []
+    start = timer()
+    while len(latencies) < repeats or timer() - start < mintime:
+        t0 = timer()
+        run()
+        latencies.append(timer() - t0)
+        if len(latencies) >= 100*repeats:
+            break
+    return latencies
+
+
+def benchmark(cases, stages, repeats=20, mintime=1.0, capture=None, report=None):
+    """Runs each stage on each case and returns a list of result dictionaries"""
+    results = []
+    pathname = tempfile.mkdtemp()
+    try:
+        for arraysize, samples, blocks in cases:
+            if capture is not None:
+                captures = recorded(capture)
+                arraysize = len(captures[0].header[2].split()[-1]) if captures else arraysize
+                samples = len(captures[0].ticks) if captures else 0
+                blocks = len(captures)
+            else:
+                captures = synthetic(arraysize, samples, blocks)
+            nsamples = samples*blocks
+            for stage in stages:
+                result = {'stage': stage, 'arraysize': arraysize, 'samples': samples, 'blocks': blocks}
+                result['key'] = "{:s}/{:d}x{:d}x{:d}".format(stage, arraysize, samples, blocks)
+                try:
+                    if stage == 'receive_ascii':
+                        run = stage_receive(captures, False)
+                    elif stage == 'receive_binary':
+                        run = stage_receive(captures, True)
+                    elif stage == 'parse':
+                        run = stage_parse(captures)
+                    elif stage == 'store':
+                        run = stage_store(captures, pathname)
+                    elif stage == 'save':
+                        run = stage_save(captures, pathname)
+                    elif stage == 'save_binary':
+                        run = stage_savebinary(captures, pathname)
+                    elif stage == 'plot':
+                        run = stage_plot(captures, pathname)
+                    else:
+                        raise StageSkipped("unknown stage")
+                    latencies = np.array(measure(run, repeats, mintime))
+                except StageSkipped as e:
+                    result['skipped'] = str(e)
+                    results.append(result)
+                    if report is not None:
+                        report("{:40s} skipped: {:s}".format(result['key'], str(e)))
+                    continue
+                result['repeats'] = len(latencies)
+                result['min'] = float(latencies.min())
+                result['p50'] = float(np.percentile(latencies, 50))
+                result['p90'] = float(np.percentile(latencies, 90))
+                result['p99'] = float(np.percentile(latencies, 99))
+                result['samples_per_s'] = nsamples/result['p50'] if result['p50'] > 0 else float('inf')
+                result['blocks_per_s'] = blocks/result['p50'] if result['p50'] > 0 else float('inf')
+                results.append(result)
+                if report is not None:
+                    report("{:40s} min {:9.3f} ms  p50 {:9.3f} ms  p90 {:9.3f} ms  p99 {:9.3f} ms  {:12.0f} samples/s".format(
+                        result['key'], result['min']*1e3, result['p50']*1e3, result['p90']*1e3, result['p99']*1e3, result['samples_per_s']))
+            if capture is not None:
+                break
+    finally:
+        shutil.rmtree(pathname, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regression messages for results slower than baseline by more than tolerance
+
+    Compares the fastest repeat of each stage (p50 for baselines written
+    before min was recorded).
+    """
+    reference = dict((r['key'], r) for r in baseline.get('results', []) if 'p50' in r)
+    regressions = []
+    for r in results:
+        if 'p50' not in r or r['key'] not in reference:
+            continue
+        stat = 'min' if 'min' in r and 'min' in reference[r['key']] else 'p50'
+        limit = reference[r['key']][stat]*(1.0 + tolerance)
+        if r[stat] > limit:
+            regressions.append("{:s}: {:s} {:.3f} ms exceeds baseline {:.3f} ms (+{:.0f}%)".format(
+                r['key'], stat, r[stat]*1e3, reference[r['key']][stat]*1e3, tolerance*100))
+    return regressions
+
+
+def parsecase(text):
+    """Parses an ARRAYSIZExSAMPLESxBLOCKS case argument"""
+    try:
+        arraysize, samples, blocks = [int(x) for x in text.lower().split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("case must be ARRAYSIZExSAMPLESxBLOCKS, e.g. 3x500x100")
+    return arraysize, samples, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MemTest pipeline")
+    parser.add_argument('--case', type=parsecase, action='append', help="ARRAYSIZExSAMPLESxBLOCKS (repeatable)")
+    parser.add_argument('--stage', choices=stagenames, action='append', help="stage to run (repeatable, default all)")
+    parser.add_argument('--capture', help="results file to use as input instead of synthetic captures")
+    parser.add_argument('--repeats', type=int, default=20, help="minimum repeats per stage (default 20)")
+    parser.add_argument('--mintime', type=float, default=1.0, help="minimum time per stage [s] (default 1.0)")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown of the fastest repeat vs baseline (default 0.5)")
+    args = parser.parse_args()
+
+    def report(text):
+        sys.stdout.write(text + '\n')
+        sys.stdout.flush()
+
+    results = benchmark(args.case or defaultcases, args.stage or stagenames, args.repeats, args.mintime, args.capture, report)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump({'version': __version__, 'results': results}, outfile, indent=1)
+    if args.baseline:
+        with open(args.baseline) as infile:
+            regressions = compare(results, json.load(infile), args.tolerance)
+        for r in regressions:
+            report("REGRESSION " + r)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
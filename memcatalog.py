@@ -0,0 +1,227 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memcatalog.py
+SQLite catalog of the results text files for finding past CAM reads without parsing every file
+
+Run with e.g.:
+    python memcatalog.py --wline 1 --pattern 101 --ftime 5
+    python memcatalog.py --path . --program 1 --load
+
+The catalog (results/catalog.sqlite) has one row per file with its size
+and modification time and one row per data block with the header fields
+(as memstore.parseheader reads them) and the byte offset and length of
+the block in its file. scan() only parses files that are new or whose
+size or modification time changed, and drops files that were deleted.
+select() finds blocks from the indexed header columns and load() seeks
+straight to a block and parses just its samples.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import numpy as np
+from memstore import parseheader
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Catalog file in the results folder
+catalogname = "catalog.sqlite"
+# Header columns of a block that can be queried (memstore.recorddtype names)
+querycolumns = ('program', 'wordline', 'bitline', 'pattern', 'rtime', 'ftime', 'loop', 'gtime', 'board')
+# Tables and indexes
+schema = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, name TEXT UNIQUE, mtime REAL, size INTEGER);
+CREATE TABLE IF NOT EXISTS blocks (id INTEGER PRIMARY KEY, file INTEGER REFERENCES files(id), block INTEGER,
+    program INTEGER, wordline INTEGER, bitline INTEGER, pattern INTEGER, width INTEGER,
+    rtime INTEGER, ftime INTEGER, loop INTEGER, gtime INTEGER, board TEXT,
+    header TEXT, offset INTEGER, length INTEGER, rows INTEGER);
+CREATE INDEX IF NOT EXISTS blocks_file ON blocks (file);
+CREATE INDEX IF NOT EXISTS blocks_address ON blocks (wordline, pattern);
+CREATE INDEX IF NOT EXISTS blocks_program ON blocks (program, ftime);
+"""
+
+
+def scanblocks(filename):
+    """Returns (header, offset, length, rows) of each data block in a results text file
+
+    offset and length are in bytes. Each block has the header lines
+    before it (as loadresults reads them: lines starting with a digit are
+    data, other lines header, blocks separated by blank lines).
+    """
+    blocks = []
+    header = []
+    newheader = True
+    start = None
+    rows = 0
+    pos = 0
+    with open(filename, 'rb') as infile:
+        for line in infile:
+            text = line.strip()
+            if start is not None and (not text or not text[:1].isdigit()):
+                blocks.append((header, start, pos - start, rows))
+                start = None
+                newheader = True
+            if not text:
+                newheader = True
+            elif text[:1].isdigit():
+                if start is None:
+                    start = pos
+                    rows = 0
+                rows += 1
+            else:
+                if newheader:
+                    header = []
+                    newheader = False
+                header.append(text.decode('ascii', 'replace'))
+            pos += len(line)
+    if start is not None:
+        blocks.append((header, start, pos - start, rows))
+    return blocks
+
+
+class Catalog(object):
+    """Class for the SQLite catalog of the text files in pathname/results
+
+    Rows from select() are sqlite3.Row objects with the file name, block
+    number in the file, header columns (None where the header has no
+    value), header text, offset, length and rows. Use as a context
+    manager or call close().
+    """
+    def __init__(self, pathname='.', filename=None):
+        self.folder = os.path.join(pathname, "results")            # Folder of the results files
+        if not os.path.isdir(self.folder):
+            os.mkdir(self.folder)
+        self.filename = filename or os.path.join(self.folder, catalogname)  # SQLite database file
+        self._db = sqlite3.connect(self.filename)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._db.close()
+        return
+
+    def scan(self):
+        """Indexes new and changed results files, drops deleted ones, and returns (parsed, removed) file counts"""
+        known = dict((row['name'], row) for row in self._db.execute("SELECT id, name, mtime, size FROM files"))
+        names = sorted(name for name in os.listdir(self.folder) if name.endswith('.txt'))
+        parsed = 0
+        with self._db:
+            for name in names:
+                stat = os.stat(os.path.join(self.folder, name))
+                row = known.pop(name, None)
+                if row is not None and row['mtime'] == stat.st_mtime and row['size'] == stat.st_size:
+                    continue
+                if row is not None:
+                    self._db.execute("DELETE FROM blocks WHERE file = ?", (row['id'],))
+                    self._db.execute("DELETE FROM files WHERE id = ?", (row['id'],))
+                self._index(name, stat)
+                parsed += 1
+            for row in known.values():
+                self._db.execute("DELETE FROM blocks WHERE file = ?", (row['id'],))
+                self._db.execute("DELETE FROM files WHERE id = ?", (row['id'],))
+        return parsed, len(known)
+
+    def _index(self, name, stat):
+        """Adds a file and its blocks to the catalog"""
+        fileid = self._db.execute("INSERT INTO files (name, mtime, size) VALUES (?, ?, ?)",
+                                  (name, stat.st_mtime, stat.st_size)).lastrowid
+        rows = []
+        for k, (header, offset, length, count) in enumerate(scanblocks(os.path.join(self.folder, name))):
+            fields = parseheader(header)
+            width = [len(line.split(':', 1)[1].strip()) for line in header if line.startswith("Data Pattern:")]
+            board = [line.split(':', 1)[1].strip() for line in header if line.startswith("Board:")]
+            rows.append((fileid, k, fields.get('program'), fields.get('wordline'), fields.get('bitline'), fields.get('pattern'),
+                         width[0] if width else None, fields.get('rtime'), fields.get('ftime'), fields.get('loop'),
+                         fields.get('gtime'), board[0] if board else None, '\n'.join(header), offset, length, count))
+        self._db.executemany("INSERT INTO blocks (file, block, program, wordline, bitline, pattern, width, rtime, ftime, loop, gtime,"
+                             " board, header, offset, length, rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return
+
+    def select(self, filename=None, **fields):
+        """Returns the blocks whose header columns equal the given values, in file and block order
+
+        Columns are those in querycolumns. A pattern may be a number or a
+        bit string as written in the header (e.g. '101', which also has to
+        match the pattern width).
+        """
+        where = []
+        values = []
+        for column, value in sorted(fields.items()):
+            if column not in querycolumns:
+                raise ValueError("unknown catalog column '{:s}'".format(column))
+            if column == 'pattern' and isinstance(value, str):
+                where.append("blocks.width = ?")
+                values.append(len(value))
+                value = int(value, 2)
+            where.append("blocks.{:s} = ?".format(column))
+            values.append(value)
+        if filename is not None:
+            where.append("files.name = ?")
+            values.append(filename)
+        query = "SELECT files.name, blocks.* FROM blocks JOIN files ON blocks.file = files.id"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return self._db.execute(query + " ORDER BY files.name, blocks.block", values).fetchall()
+
+    def load(self, row):
+        """Returns the (n, 2) time [us] and voltage [V] array of a block from select(), reading only that block"""
+        with open(os.path.join(self.folder, row['name']), 'rb') as infile:
+            infile.seek(row['offset'])
+            text = infile.read(row['length']).decode('ascii')
+        return np.fromstring(text.replace('\t', ' '), sep=' ').reshape(-1, 2)
+
+    def find(self, **fields):
+        """Returns an alternating header/data buffer of the blocks matching fields (as select)"""
+        runresult = []
+        for row in self.select(**fields):
+            runresult.append(row['header'].split('\n'))
+            runresult.append(self.load(row))
+        return runresult
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find CAM reads in the results files")
+    parser.add_argument('--path', default='.', help="folder containing the results folder (default .)")
+    parser.add_argument('--program', type=int, help="program number")
+    parser.add_argument('--wline', type=int, help="word line")
+    parser.add_argument('--bline', type=int, help="bit line")
+    parser.add_argument('--pattern', help="data pattern as written in the header, e.g. 101")
+    parser.add_argument('--rtime', type=int, help="read/write time [ms]")
+    parser.add_argument('--ftime', type=int, help="form/precharge time [ms]")
+    parser.add_argument('--board', help="board ID")
+    parser.add_argument('--load', action='store_true', help="also read each block and print its samples and voltage range")
+    args = parser.parse_args(argv)
+
+    fields = {'program': args.program, 'wordline': args.wline, 'bitline': args.bline, 'pattern': args.pattern,
+              'rtime': args.rtime, 'ftime': args.ftime, 'board': args.board}
+    with Catalog(args.path) as catalog:
+        parsed, removed = catalog.scan()
+        sys.stdout.write("Catalog: {:d} files parsed, {:d} removed\n".format(parsed, removed))
+        rows = catalog.select(**dict((k, v) for k, v in fields.items() if v is not None))
+        for row in rows:
+            line = "{:s} block {:d}: WL {} pattern {} precharge {} ms, {:d} samples".format(
+                row['name'], row['block'], row['wordline'],
+                "-" if row['pattern'] is None else "{:0{w}b}".format(row['pattern'], w=row['width'] or 1), row['ftime'], row['rows'])
+            if args.load:
+                data = catalog.load(row)
+                line += ", {:.3f} to {:.3f} V".format(data[:, 1].min(), data[:, 1].max()) if len(data) else ""
+            sys.stdout.write(line + '\n')
+        sys.stdout.write("{:d} blocks found\n".format(len(rows)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memcli.py
+Command line runner for MemTest programs (no GUI or plotting imports)
+
+Run with e.g.:
+    python memcli.py writeread --wline 0 --arraysize 2 --pattern 0110 --save run1
+    python memcli.py readonly --wline 5 --arraysize 8x16
+    python memcli.py --config run.json --yes
+    python memcli.py readonly --board A=/dev/ttyACM0 --board B=/dev/ttyACM1 --yes
+
+A config file is a JSON object with any of the option names below
+(e.g. {"program": "readonly", "wline": 1, "arraysize": 3, "boards": ["A=COM3"]}).
+Options given on the command line override the config file. With several
+boards the program runs on all of them at once through memsched and each
+result header gets a "Board: ID" line.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import sys
+import json
+import time
+import argparse
+import memcore
+import memsupply
+import memsched
+from memjournal import newjournal
+from memstore import ResultStore
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Default values of input parameters (as in the GUI)
+defaults = {'program': None, 'port': memcore.serialport, 'wline': 0, 'arraysize': 1, 'pattern': '0',
+            'writePW': 100, 'prePW': 5, 'gndPW': 200, 'loop': 1, 'save': None, 'binary': False, 'path': '.', 'yes': False,
+            'features': memcore.featuretransfer, 'divider': memcore.adcdivider, 'samples': memcore.adcsamples, 'supply': memcore.voltagesource, 'writeV': memcore.writevoltage, 'readV': memcore.readvoltage, 'boards': None,
+            'cache': memcore.cellcache, 'verify': memcore.verifycalibration, 'plan': memcore.runplanner,
+            'metrics': memcore.metricsenabled, 'negotiate': bool(memcore.linkrates)}
+programs = ('writeread', 'writeonly', 'readonly')
+
+
+def parseargs(argv=None):
+    """Returns settings from the command line merged with the config file and defaults"""
+    parser = argparse.ArgumentParser(description="Run MemTest programs without the GUI")
+    parser.add_argument('program', nargs='?', choices=programs, help="program to run")
+    parser.add_argument('--config', help="JSON file of settings")
+    parser.add_argument('--port', help="Arduino serial port (default {:s})".format(memcore.serialport))
+    parser.add_argument('--wline', type=int, help="word line for CAM reads (default 0)")
+    parser.add_argument('--arraysize', help="memory array size N (N x N) or RxC, e.g. 8x16 (default 1)")
+    parser.add_argument('--pattern', help="pattern written into array, e.g. 0110 (default 0)")
+    parser.add_argument('--write-pw', dest='writePW', type=int, help="write pulse width [ms] (default 100)")
+    parser.add_argument('--pre-pw', dest='prePW', type=int, help="precharge pulse width [ms] (default 5)")
+    parser.add_argument('--gnd-pw', dest='gndPW', type=int, help="ground pulse width [ms] (default 200)")
+    parser.add_argument('--loop', type=int, help="number of write pulses (default 1)")
+    parser.add_argument('--save', help="results file name (default <program>_<date>_<time>)")
+    parser.add_argument('--binary', action='store_true', default=None, help="also save samples as .npy with a .json header sidecar")
+    parser.add_argument('--features', action='store_true', default=None, help="CAM reads send on-board features instead of raw samples")
+    parser.add_argument('--adc-divider', dest='divider', type=int, help="CAM reads use a free-running ADC capture with this clock divider (16, 32, 64 or 128)")
+    parser.add_argument('--adc-samples', dest='samples', type=int, help="samples in a free-running capture (default {:d}, up to {:d})".format(memcore.adcsamples, memcore.maxsamples))
+    parser.add_argument('--rewrite-all', dest='cache', action='store_false', default=None, help="rewrite every cell before each CAM read instead of only cells not already written")
+    parser.add_argument('--no-plan', dest='plan', action='store_false', default=None, help="read patterns in numeric order with a voltage change before each read (no run planner)")
+    parser.add_argument('--no-negotiate', dest='negotiate', action='store_false', default=None, help="stay at 115200 baud instead of testing faster serial rates at connect")
+    parser.add_argument('--metrics', action='store_true', default=None, help="time every run phase and count serial bytes, saved to results/metrics")
+    parser.add_argument('--verify', help="calibration file (memanalysis.py --save) for checking CAM reads against the written cells")
+    parser.add_argument('--path', help="folder containing the results folder (default .)")
+    parser.add_argument('--supply', help="voltage source: manual, fake, tcp:HOST:PORT or serial:DEVICE[:BAUD] (default {:s})".format(memcore.voltagesource))
+    parser.add_argument('--write-v', dest='writeV', type=float, help="write voltage [V] for a programmable supply")
+    parser.add_argument('--read-v', dest='readV', type=float, help="read voltage [V] for a programmable supply")
+    parser.add_argument('--board', dest='boards', action='append', help="run on board ID=PORT at the same time as the others (repeatable, replaces --port)")
+    parser.add_argument('--yes', action='store_true', default=None, help="do not wait for voltage changes")
+    args = vars(parser.parse_args(argv))
+
+    settings = dict(defaults)
+    if args['config']:
+        with open(args['config']) as infile:
+            config = json.load(infile)
+        for key in config:
+            if key not in defaults:
+                parser.error("unknown setting '{:s}' in {:s}".format(key, args['config']))
+        settings.update(config)
+    for key in defaults:
+        if args.get(key) is not None:
+            settings[key] = args[key]
+    if settings['program'] not in programs:
+        parser.error("program must be one of {:s}".format(", ".join(programs)))
+    return settings
+
+
+def makeprogram(settings):
+    """Returns the memcore program for the settings, or raises ValueError if they are not valid"""
+    s = settings
+    if s['program'] == 'writeread':
+        error = memcore.checkwriteread(s['wline'], s['arraysize'], s['pattern'], s['writePW'], s['prePW'], s['gndPW'])
+        program = memcore.WriteRead(s['wline'], s['arraysize'], s['pattern'], s['writePW'], s['prePW'], s['gndPW'], s['loop'], s['port'])
+    elif s['program'] == 'writeonly':
+        error = memcore.checkwriteonly(s['arraysize'], s['pattern'], s['writePW'], s['gndPW'])
+        program = memcore.WriteOnly(s['arraysize'], s['pattern'], s['writePW'], s['gndPW'], s['loop'], s['port'])
+    else:
+        error = memcore.checkreadonly(s['wline'], s['arraysize'], s['prePW'], s['gndPW'])
+        program = memcore.ReadOnly(s['wline'], s['arraysize'], s['prePW'], s['gndPW'], s['port'])
+    error = error or memcore.checkcapture(s['divider'], s['samples'])
+    if error is not None:
+        raise ValueError(error)
+    program.features = s['features']
+    program.adcdivider = s['divider']
+    program.adcsamples = s['samples']
+    program.planner = s['plan']
+    program.metrics.enabled = s['metrics']
+    if not s['negotiate']:
+        program.linkrates = ()
+    if not s['cache']:
+        program.cells = None
+    if s['verify']:
+        program.verify = memcore.Calibration.load(s['verify'])
+    return program
+
+
+def main(argv=None):
+    settings = parseargs(argv)
+    try:
+        if settings['boards']:
+            boards = [memsched.parseboard(b) for b in settings['boards']]
+            if settings['supply'] in (None, '', 'manual') and not settings['yes']:
+                raise ValueError("Several boards need --yes or a programmable --supply")
+            programs = [(board, makeprogram(dict(settings, port=port))) for board, port in boards]
+        else:
+            programs = [(None, makeprogram(settings))]
+    except ValueError as e:
+        sys.stderr.write("{:s}\n".format(str(e)))
+        return 2
+
+    def message(text):
+        sys.stdout.write(text.rstrip('\n') + '\n')
+        sys.stdout.flush()
+
+    def errormesg(text):
+        sys.stderr.write(text.strip('\n') + '\n')
+        sys.stderr.flush()
+
+    def pause(supply):
+        sys.stdout.write("Press Enter to continue...")
+        sys.stdout.flush()
+        sys.stdin.readline()
+        supply.resume()
+
+    # Each board gets its own voltage source
+    for board, program in programs:
+        supply = memsupply.makesupply(settings['supply'], settings['writeV'], settings['readV'])
+        if supply.manual:
+            supply.confirm = not settings['yes']
+            supply.prompt = (lambda supply=supply: pause(supply)) if supply.confirm else None
+        program.supply = supply
+
+    journal = []
+    results = ResultStore()
+
+    def result(data, header):
+        # Each result goes straight to the run journal so a crash loses nothing
+        if not journal:
+            journal.append(newjournal(settings['path'], cachesize=0))   # The result store holds the run in memory
+            message("Journal: {:s}".format(journal[0].filename))
+        journal[0].append(header, data)
+        results.append(header, data)
+
+    if settings['boards']:
+        runner = memsched.BoardScheduler()
+        for board, program in programs:
+            runner.add(board, program)
+    else:
+        runner = programs[0][1]
+    runner.message.connect(message)
+    runner.errormesg.connect(errormesg)
+    runner.result.connect(result)
+    try:
+        completed = runner.run()
+    finally:
+        if journal:
+            journal[0].close()
+
+    filename = settings['save'] or "{:s}_{:s}".format(settings['program'], time.strftime("%Y%m%d_%H%M%S"))
+    if not filename.endswith('.txt'):
+        filename += '.txt'
+    if settings['metrics']:
+        for board, program in programs:
+            for line in program.metrics.summary():
+                message(line)
+            basename = filename[:-4] if board is None else "{:s}_{:s}".format(filename[:-4], board)
+            message("Timing metrics saved as: {:s}".format(program.metrics.save(settings['path'], basename)))
+    if journal:
+        runresult = results.runresult()
+        fullname = memcore.writeresults(runresult, filename, settings['path'])
+        message("Saved {:d} results as: {:s}".format(len(runresult)//2, fullname))
+        if settings['binary']:
+            import memstore
+            message("Saved samples as: {:s}".format(memstore.savebinary(runresult, filename[:-4], settings['path'])))
+    if not completed:
+        if settings['boards']:
+            errormesg("Failed on board(s): {:s}".format(", ".join(runner.failed)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1003 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memcore.py
+Memory test programs without any GUI dependency
+
+Used by the GUI (MemTest.py) and the command line runner (memcli.py).
+Objects report through Signal objects with the same connect/emit
+interface as Qt signals, so the GUI can forward them to pyqtSignals.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import re
+import abc
+import time
+import threading
+import serial
+import numpy as np
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from memserial import SerialSession, decodeframe, decoderecord, decodesamples, featurestep
+from memsupply import ManualSupply, SupplyError
+from memanalysis import Calibration, stack, features, hamming
+from memplan import planwriteread, planreadonly, orderwrites
+from memmetrics import Metrics, nometrics
+
+__author__ = "Jeremy Smith"
+__version__ = "1.5"
+
+# Define constants
+# Serial port address
+serialport = '/dev/cu.usbmodem1421'
+# Binary framed transfer of CAM read samples (False for ASCII output when debugging)
+binarytransfer = True
+# CAM reads send an on-board feature record instead of the raw samples (False for raw capture)
+featuretransfer = False
+# Free-running ADC capture for CAM reads: ADC clock divider 16 to 128 (None for the polled capture)
+# (below 16 the sample interrupt cannot keep up and the ADC is outside its clock spec)
+# and number of samples (multiple of 10 up to MAXSAMPLES in Memoryfunctions.h)
+adcdivider = None
+adcsamples = 500
+maxsamples = 1500
+# Maximum number of commands the Arduino runs in one batch (MAXBATCH in memory_test_v3.ino)
+maxbatch = 32
+# Largest array the firmware can address (MAXROWS and MAXCOLS in Memoryfunctions.h)
+maxrows = 16
+maxcols = 32
+# Widest array for Write-Read and Read Only runs, which read all 2^cols patterns on the bit lines
+maxreadcols = 12
+# Maximum allowable pulse width [ms]
+maxpulsewidth = 250
+# Captures waiting to be processed before acquisition is held back
+pipelinedepth = 4
+# Voltage source (see memsupply.makesupply): 'manual', 'fake' or e.g. 'tcp:192.168.1.20:5025'
+voltagesource = 'manual'
+# Write and read voltages [V] set by a programmable voltage source
+writevoltage = 3.0
+readvoltage = 1.0
+# Skip writes of cells already holding the written state (False rewrites every cell before each CAM read)
+cellcache = True
+# Calibration file (memanalysis.py --save) for checking CAM reads against the written cells (None for no verify)
+verifycalibration = None
+# Read patterns in Gray code order and group writes under one write voltage change (False for the original order)
+runplanner = True
+# Record timing spans of every run phase and serial byte counts (saved to results/metrics)
+metricsenabled = False
+# Serial rates tried at connect, fastest passing a loopback test is used (empty to stay at 115200)
+linkrates = (250000, 500000, 1000000, 2000000)
+
+
+class Signal(object):
+    """Class for a callback list with the connect/emit interface of a Qt signal"""
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot):
+        self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+
+class MemTest(object):
+    """Class for running memory test sequence on Arduino"""
+    # Constants for Arduino ADC
+    v_ratio = 5.0/1023
+    time_step = 0.5
+    # Any line of Arduino output that is not a "time,voltage" sample
+    statusline = re.compile(r'^(?!\s*\d+,\d+\s*$).*\n', re.M)
+    # Minimum time between message window updates while receiving [s]
+    emit_interval = 0.1
+    # Timing spans (memmetrics.Metrics, disabled unless set)
+    metrics = nometrics
+
+    def __init__(self, serialport, program, wordline=0, bitline=0, pattern=0, rtime=100, ftime=200, loop=1, gtime=100, baud=115200, binary=False, features=False, divider=None, samples=500, width=3, link=None):
+        # Signals for output messages to command window
+        self.message = Signal()
+        self.errormesg = Signal()
+        _progdict = {'camread': 1, 'form': 2, 'writezero': 3, 'writeone': 4, 'stdread': 5}
+        try:
+            self._prognum = _progdict[program]    # Program number
+        except KeyError:
+            self.errormesg.emit("Program not specified (camread, form, writezero, writeone, stdread) for MemTest\n")
+            return
+
+        # Program number sent to the Arduino (6 is camread with binary framed output, 7 with a feature record,
+        # 8 with a free-running ADC capture)
+        if divider is not None and program == 'camread':
+            self._wireprog = 8
+        elif features and program == 'camread':
+            self._wireprog = 7
+        elif binary and program == 'camread':
+            self._wireprog = 6
+        else:
+            self._wireprog = self._prognum
+
+        self._serialport = serialport             # Serial port
+        self._program = program                   # Program name
+        self._wordline = wordline                 # Word line number
+        self._bitline = bitline                   # Bit line number
+        self._pattern = pattern                   # Data pattern to match
+        self._rtime = rtime                       # Read/write pulse time
+        self._ftime = ftime                       # Forming/precharge pulse time
+        self._loop = loop                         # Number of loops
+        self._gtime = gtime                       # Ground time
+        self._baud = baud                         # Arduino serial port bit rate
+        self._width = width                       # Pattern width in bit lines
+        if self._wireprog == 8:
+            # ADC clock prescaler (2^bitline) and samples (loop x 10) replace the unused camread parameters
+            self._bitline = int(divider).bit_length() - 1
+            self._loop = samples//10
+        self._lines = []                          # List for storing Arduino output lines
+        self._pending = []                        # Lines waiting to be sent to message window
+        self._lastemit = 0.0                      # Time of last message window update
+        self._frame = None                        # Binary frame payload for storing Arduino output
+        self.metadata = []                        # Status lines from Arduino output (set by output)
+        self.record = None                        # Feature record in us and V (set by output in feature mode)
+        self.error = None                         # Error message if the Arduino did not run the program
+        # Header list
+        self._headlist = []
+        self._headlist.append("Program: {:d} {:s}".format(self._prognum, program))
+        self._headlist.append("Address: WL {:d}   BL {:d}".format(wordline, bitline))
+        self._headlist.append("Data Pattern: {:0{width}b}".format(pattern, width=width))
+        self._headlist.append("Read/write time: {:d} ms".format(rtime))
+        self._headlist.append("Form/precharge time: {:d} ms".format(ftime))
+        self._headlist.append("Number of read/write pulses: {:d}".format(loop))
+        self._headlist.append("Ground time: {:d} ms".format(gtime))
+        if self._wireprog == 8:
+            self._headlist.append("ADC capture: {:d} samples every {:.3f} us".format(samples, self.adcperiod(divider)))
+        if link is not None:
+            self._headlist.append(linkheader(*link))
+
+    @property
+    def wordline(self):
+        return self._wordline
+
+    @property
+    def pattern(self):
+        return self._pattern
+
+    @property
+    def width(self):
+        return self._width
+
+    def display(self):
+        """Displays settings for MemTest object"""
+        self.message.emit('\n'.join(self._headlist))
+        self.message.emit('\n')
+        return
+
+    def command(self):
+        """Returns the 8 byte program command for the Arduino
+
+        A CAM read pattern wider than 8 bit lines continues in extra bytes
+        (bit lines 8-15, 16-23, ...) after the command, as many as set by
+        the 'W' command (see Program.setwidth).
+        """
+        command = bytearray([ord(str(self._wireprog)),    # program number
+                             self._wordline,              # buffer 0
+                             self._bitline,               # buffer 1
+                             self._pattern & 0xFF,        # buffer 2
+                             self._rtime,                 # buffer 3
+                             self._ftime,                 # buffer 4
+                             self._loop,                  # buffer 5
+                             self._gtime])                # buffer 6
+        if self._prognum == 1:
+            for k in range(1, patternbytes(self._width)):
+                command.append((self._pattern >> 8*k) & 0xFF)
+        return command
+
+    def runprogram(self, session=None):
+        """Runs program over an open SerialSession, or connects to Arduino for this program only
+
+        Serial errors are reported here only when connecting for this
+        program; on a given session they are raised to the caller.
+        """
+        self.display()
+        ownsession = session is None
+        if ownsession:
+            session = SerialSession(self._serialport, self._baud)
+        try:
+            if not session.is_open():
+                self.message.emit("Waiting to Connect...")
+                session.open()
+                self.message.emit("Connected to Arduino\n\n")
+            with self.metrics.span('command', program=self._wireprog, wordline=self._wordline, pattern=self._pattern):
+                session.transact(self.command(), self._receive, self.reset, self._receiveframe)
+            self._flushmessages()
+            if "ADDRESS ERROR" in self._lines:
+                self.error = "WL {:d} BL {:d} is outside the Arduino pin map (not run)".format(self._wordline, self._bitline)
+                self.errormesg.emit(self.error)
+        except (OSError, serial.SerialException):
+            if not ownsession:
+                raise                          # Reported by the program running the session
+            self.errormesg.emit("\nPlease Connect Arduino via USB\n")
+            time.sleep(1.0)
+            return
+        finally:
+            if ownsession:
+                session.close()                # Close the port
+        if ownsession:
+            self.message.emit("Disconnected successfully\n")
+        return
+
+    def _receive(self, lines):
+        """Handles complete lines received from the Arduino"""
+        self._lines.extend(lines)              # Stores the Arduino output as a list of lines
+        self._pending.extend(lines)
+        if time.time() - self._lastemit > self.emit_interval:
+            self._flushmessages()
+        return
+
+    def _flushmessages(self):
+        """Sends lines waiting for the message window as one string"""
+        if self._pending:
+            self.message.emit('\n'.join(self._pending))
+            self._pending = []
+        self._lastemit = time.time()
+        return
+
+    def _receiveframe(self, payload):
+        """Handles a binary frame received from the Arduino"""
+        self._flushmessages()
+        self.message.emit("\nReceived binary frame ({:d} bytes)\n".format(len(payload)))
+        self._frame = payload                  # Stores the Arduino output as a binary frame
+        return
+
+    def output(self):
+        """Converts Arduino output to an (n, 2) array of time [us] and voltage [V] and returns it along with header
+
+        Lines that are not "time,voltage" samples (e.g. PREC... and GNDS...)
+        are kept in metadata rather than parsed. Returns None if there are no
+        samples or the Arduino did not run the program.
+        """
+        if self.error is not None:
+            return
+        if self._frame is not None and self._wireprog == 7:
+            return self._outputrecord()
+        if self._frame is not None and self._wireprog == 8:
+            divider, counts = decodesamples(self._frame)
+            ticks = np.arange(len(counts))*(self.adcperiod(divider)/self.time_step)
+            self.metadata = list(self._lines)
+        elif self._frame is not None:
+            ticks, counts = decodeframe(self._frame)
+            self.metadata = list(self._lines)
+        elif len(self._lines) != 0:
+            text = '\n'.join(self._lines) + '\n'
+            self.metadata = [x.strip() for x in self.statusline.findall(text) if x.strip()]
+            values = np.fromstring(self.statusline.sub('', text).replace(',', ' '), sep=' ')
+            ticks, counts = values[0::2], values[1::2]
+            if len(ticks) == 0:
+                return
+        else:
+            return
+        voltage_data = np.empty((len(ticks), 2))
+        np.multiply(ticks, self.time_step, out=voltage_data[:, 0])
+        np.multiply(counts, self.v_ratio, out=voltage_data[:, 1])
+        return voltage_data, self._headlist
+
+    @staticmethod
+    def adcperiod(divider):
+        """Returns the free-running ADC sample period [us] (13 ADC clocks of 16 MHz/divider)"""
+        return 13.0*divider/16.0
+
+    def _outputrecord(self):
+        """Converts a feature record to the fixed time samples as an (n, 2) array, and returns it along with header
+
+        The first sample and the threshold crossing are included, so the
+        array can be analysed like a full capture. The record itself is
+        kept in record and summarised in an extra header line.
+        """
+        rec = decoderecord(self._frame)
+        self.metadata = list(self._lines)
+        ttt = np.nan if rec['tthreshold'] == 0xFFFFFFFF else rec['tthreshold']*self.time_step
+        self.record = {'ttt': ttt,
+                       'duration': rec['tend']*self.time_step,
+                       'area': rec['area']*self.time_step*self.v_ratio,
+                       'v0': rec['v0']*self.v_ratio,
+                       'vmin': rec['vmin']*self.v_ratio,
+                       'vmax': rec['vmax']*self.v_ratio}
+        valid = rec['fixed'] != 0xFFFF
+        ticks = np.concatenate(([0], featurestep*(np.nonzero(valid)[0] + 1)))
+        counts = np.concatenate(([rec['v0']], rec['fixed'][valid]))
+        if ttt == ttt:
+            ticks = np.append(ticks, rec['tthreshold'])
+            counts = np.append(counts, rec['v0']//2)
+        order = np.argsort(ticks, kind='mergesort')
+        voltage_data = np.empty((len(ticks), 2))
+        np.multiply(ticks[order], self.time_step, out=voltage_data[:, 0])
+        np.multiply(counts[order], self.v_ratio, out=voltage_data[:, 1])
+        header = self._headlist + ["Features: ttt {ttt:.1f} us, duration {duration:.1f} us, area {area:.1f} V us, "
+                                   "V0 {v0:.5f} V, min {vmin:.5f} V, max {vmax:.5f} V".format(**self.record)]
+        return voltage_data, header
+
+    def reset(self):
+        """Empties stored data"""
+        self._lines = []
+        self._pending = []
+        self._frame = None
+        self.metadata = []
+        self.error = None
+        return
+
+
+class MemBatch(object):
+    """Class for running a list of MemTest programs on Arduino as one batch
+
+    The Arduino runs the programs back to back and sends "OP k" before and
+    "ST k status" after each one, then a single 'Z' when the batch is done.
+    Output between the markers is passed to the MemTest object for that
+    program, so output() works on each one as if it had been run alone.
+    """
+    # Status codes sent by runbatch in memory_test_v3.ino
+    statusdict = {0: "OK", 1: "unknown program", 2: "batch too long", 3: "address outside the pin map"}
+    # Timing spans (memmetrics.Metrics, disabled unless set)
+    metrics = nometrics
+
+    def __init__(self, tests):
+        # Signals for output messages to command window
+        self.message = Signal()
+        self.errormesg = Signal()
+        self._tests = list(tests)                 # MemTest objects in run order
+        self._current = None                      # MemTest receiving output
+        self.status = []                          # Status of each program (None if not run)
+
+    def command(self):
+        """Returns the batch header followed by the 8 byte command of each program"""
+        command = bytearray([ord('B'), len(self._tests), 0, 0, 0, 0, 0, 0])
+        for test in self._tests:
+            command += test.command()
+        return command
+
+    def runprogram(self, session=None):
+        """Runs all programs over an open SerialSession, or connects to Arduino for this batch only (serial errors as MemTest)"""
+        if len(self._tests) == 0:
+            return
+        if len(self._tests) > maxbatch:
+            self.status = []
+            for i in range(0, len(self._tests), maxbatch):
+                part = MemBatch(self._tests[i:i + maxbatch])
+                part.metrics = self.metrics
+                part.message.connect(self.message.emit)
+                part.errormesg.connect(self.errormesg.emit)
+                part.runprogram(session)
+                self.status.extend(part.status)
+            return
+        ownsession = session is None
+        if ownsession:
+            first = self._tests[0]
+            session = SerialSession(first._serialport, first._baud)   # The port and rate the programs were made for
+        self.reset()
+        try:
+            if not session.is_open():
+                self.message.emit("Waiting to Connect...")
+                session.open()
+                self.message.emit("Connected to Arduino\n\n")
+            with self.metrics.span('batch', programs=len(self._tests)):
+                session.transact(self.command(), self._receive, self.reset, self._receiveframe)
+            for test in self._tests:
+                test._flushmessages()
+        except (OSError, serial.SerialException):
+            if not ownsession:
+                raise                          # Reported by the program running the session
+            self.errormesg.emit("\nPlease Connect Arduino via USB\n")
+            time.sleep(1.0)
+            return
+        finally:
+            if ownsession:
+                session.close()                # Close the port
+        for i, status in enumerate(self.status):
+            if status != 0:
+                self.errormesg.emit("Batch program {:d} failed: {:s}".format(i, self.statusdict.get(status, "not run")))
+        if ownsession:
+            self.message.emit("Disconnected successfully\n")
+        return
+
+    def _receive(self, lines):
+        """Passes lines to the MemTest for the running program and records status markers"""
+        output = []
+        for line in lines:
+            marker = line.split()
+            if len(marker) == 2 and marker[0] == 'OP' and marker[1].isdigit() and int(marker[1]) < len(self._tests):
+                self._deliver(output)
+                output = []
+                self._current = self._tests[int(marker[1])]
+                self._current.display()
+            elif len(marker) == 3 and marker[0] == 'ST' and marker[1].isdigit() and marker[2].isdigit() and int(marker[1]) < len(self._tests):
+                self._deliver(output)
+                output = []
+                self.status[int(marker[1])] = int(marker[2])
+                self._current = None
+            else:
+                output.append(line)
+        self._deliver(output)
+        return
+
+    def _deliver(self, output):
+        """Passes output lines to the current MemTest (or the message window outside a program)"""
+        if not output:
+            return
+        if self._current is not None:
+            self._current._receive(output)
+        else:
+            self.message.emit('\n'.join(output))
+        return
+
+    def _receiveframe(self, payload):
+        """Passes a binary frame to the MemTest for the running program"""
+        if self._current is not None:
+            self._current._receiveframe(payload)
+        return
+
+    def reset(self):
+        """Empties stored data of all programs"""
+        for test in self._tests:
+            test.reset()
+        self._current = None
+        self.status = [None]*len(self._tests)
+        return
+
+
+class Pipeline(object):
+    """Class for processing captures on a worker thread while the next command runs
+
+    put() hands a received MemTest to a bounded queue and returns at once,
+    unless depth captures are already waiting, in which case it blocks
+    until the worker catches up. The worker calls process with each one in
+    order. close() waits until the queue is empty and re-raises the first
+    error from process.
+    """
+    def __init__(self, process, depth=pipelinedepth):
+        self._process = process
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, test):
+        """Queues a capture for processing (blocks while the queue is full)"""
+        self._queue.put(test)
+        return
+
+    def close(self):
+        """Processes the remaining captures and stops the worker"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return
+
+    def _work(self):
+        while True:
+            test = self._queue.get()
+            if test is None:
+                return
+            if self._error is not None:
+                continue                        # Drain without processing after an error
+            try:
+                self._process(test)
+            except Exception as e:
+                self._error = e
+
+
+class CellCache(object):
+    """Class for the last written state of each cell of the array
+
+    Programs write only cells whose state is unknown or differs from the
+    pattern. A cell is known once its write reports OK, and is forgotten
+    again when invalidated (e.g. by a CAM read that does not match).
+    Invalidation may come from the Pipeline worker thread.
+    """
+    def __init__(self):
+        self._states = {}                         # Last written state of each (wordline, bitline)
+        self._lock = threading.Lock()
+        self.sent = 0                             # Number of cell writes sent
+        self.skipped = 0                          # Number of cell writes skipped
+
+    def pending(self, arraysize, pattern):
+        """Returns (wordline, bitline, state) of each cell in pattern (row by row) that needs writing"""
+        rows, cols = arrayshape(arraysize)
+        cells = []
+        with self._lock:
+            for i, c in enumerate(pattern):
+                if self._states.get((i//cols, i%cols)) != c:
+                    cells.append((i//cols, i%cols, c))
+        self.skipped += len(pattern) - len(cells)
+        return cells
+
+    def written(self, wordline, bitline, state):
+        """Records a successful write of state ('0' or '1') to a cell"""
+        with self._lock:
+            self._states[(wordline, bitline)] = state
+        return
+
+    def word(self, wordline, cols):
+        """Returns the stored word of a word line (bit line 0 first), or None if any cell is unknown"""
+        with self._lock:
+            states = [self._states.get((wordline, b)) for b in range(cols)]
+        return None if None in states else ''.join(states)
+
+    def invalidate(self, wordline=None):
+        """Forgets the cells of a word line (all cells if None) so they are written again"""
+        with self._lock:
+            if wordline is None:
+                self._states.clear()
+            else:
+                for cell in [x for x in self._states if x[0] == wordline]:
+                    del self._states[cell]
+        return
+
+
+# Abstract base class for both Python 2 and 3
+ABC = abc.ABCMeta('ABC', (object,), {})
+
+
+class Program(ABC):
+    """Base class for running a memory test program on Arduino
+
+    Subclasses implement sequence(), the commands run on the open session.
+    run() returns True only if the sequence ran to the end.
+
+    Output goes through the message/errormesg signals and CAM read data
+    through result, which is emitted from a Pipeline worker thread so the
+    next command can be sent while a capture is parsed and stored. Write and read voltages are set through supply (a
+    memsupply.VoltageSource); with a ManualSupply changevoltage is emitted
+    and the run waits until supply.resume() is called.
+
+    Cells already in their written state are not written again (see
+    CellCache). With planner set the pattern order comes from memplan and
+    the voltage is only changed when the run needs the other level. With a
+    verify Calibration each CAM read is checked against the written word
+    and the word line is rewritten if the Hamming distance disagrees.
+    """
+    title = "Memory Test Program"
+
+    def __init__(self, port=None, supply=None):
+        self.port = port or serialport          # Serial port
+        self.supply = supply or ManualSupply()  # Voltage source
+        self._pipeline = None                   # Processes captures during run
+        self.features = featuretransfer         # CAM reads send feature records instead of raw samples
+        self.adcdivider = adcdivider            # ADC clock divider for free-running capture (None for polled)
+        self.adcsamples = adcsamples            # Samples in a free-running capture
+        self.cells = CellCache() if cellcache else None  # Last written cell states
+        self.verify = Calibration.load(verifycalibration) if verifycalibration else None  # Checks CAM reads
+        self.planner = runplanner               # Plan pattern order and voltage changes (see memplan)
+        self._mode = None                       # Voltage mode set during the run
+        self.metrics = Metrics(metricsenabled)  # Timing spans and byte counts of the run
+        self.linkrates = linkrates              # Serial rates to negotiate at connect
+        self.link = None                        # (baud, bytes/s) of the serial link during the run
+        # Signals for output messages to command window
+        self.message = Signal()
+        self.errormesg = Signal()
+        # Signal when changing voltages manually
+        self.changevoltage = Signal()
+        # Signal to return data and data header
+        self.result = Signal()
+        # Signal with each timing span record as it finishes
+        self.timing = Signal()
+        self.metrics.listener = self.timing.emit
+
+    def banner(self):
+        """Displays program banner"""
+        self.message.emit("Running...")
+        self.message.emit("\n================================")
+        self.message.emit(self.title)
+        self.message.emit(__author__)
+        self.message.emit("Version {:s}".format(__version__))
+        self.message.emit("Email: j-smith@eecs.berkeley.edu")
+        self.message.emit("================================\n")
+        return
+
+    def complete(self):
+        """Displays program complete message"""
+        self.message.emit("\n========================")
+        self.message.emit("MEMORY TEST COMPLETE")
+        self.message.emit("========================\n")
+        return
+
+    def waitvoltage(self, mode, text):
+        """Sets the 'write' or 'read' voltage (asking with text if manual) and waits until it has settled"""
+        if self.supply.manual:
+            self.supply.arm()                   # Before the Continue button is enabled, so no click is lost
+            self.message.emit(text)
+            self.changevoltage.emit()
+        elif mode != self.supply.mode:
+            self.message.emit(self.supply.describe(mode))
+        with self.metrics.span('voltage', mode=mode):
+            self.supply.setvoltage(mode)
+        return
+
+    def setmode(self, mode, text):
+        """Sets the voltage as waitvoltage, but with the planner only if the run has not already set it"""
+        if self.planner and mode == self._mode:
+            return
+        self.waitvoltage(mode, text)
+        self._mode = mode
+        return
+
+    def memtest(self, program, **kwargs):
+        """Returns a MemTest object with its signals connected to this program"""
+        test = MemTest(self.port, program, link=self.link, **kwargs)
+        test.metrics = self.metrics
+        test.message.connect(self.message.emit)
+        test.errormesg.connect(self.errormesg.emit)
+        return test
+
+    def writelist(self, cells, writePW, gndPW, loop):
+        """Returns (written, writelist): the cells that have a write object and the write objects, in the same order
+
+        Cells whose state is not '0' or '1' are reported and left out of both lists.
+        """
+        written = []
+        writelist = []
+        for w, b, c in cells:
+            if c == '0':
+                program = 'writezero'
+            elif c == '1':
+                program = 'writeone'
+            else:
+                self.errormesg.emit("Write pattern error - use 0 or 1")
+                continue
+            written.append((w, b, c))
+            writelist.append(self.memtest(program, wordline=w, bitline=b, rtime=writePW, loop=loop, gtime=gndPW))
+        return written, writelist
+
+    def writecells(self, session, arraysize, pattern, writePW, gndPW, loop):
+        """Writes the cells of pattern (row by row) that are not known to hold their state, as one batch
+
+        Does nothing, not even the change to the write voltage, if every
+        cell already holds its state.
+        """
+        if self.cells is not None:
+            cells = self.cells.pending(arraysize, pattern)
+        else:
+            rows, cols = arrayshape(arraysize)
+            cells = [(i//cols, i%cols, c) for i, c in enumerate(pattern)]
+        if not cells:
+            return
+        if self.planner:
+            cells = orderwrites(cells)
+        # Writes are sent to the Arduino as one batch, and their statuses line up with the written cells
+        cells, writelist = self.writelist(cells, writePW, gndPW, loop)
+        if not cells:
+            return
+        writebatch = self.writebatch(writelist)
+        self.setmode('write', "\nSet WRITE voltage. Press Continue...\n")
+        writebatch.runprogram(session)
+        if self.cells is not None:
+            self.cells.sent += len(cells)
+            for (w, b, c), status in zip(cells, writebatch.status):
+                if status == 0:
+                    self.cells.written(w, b, c)
+        return
+
+    def verifyread(self, applypattern, data, cols):
+        """Checks the Hamming distance of a CAM read against the written word and invalidates the word line if it differs"""
+        word = self.cells.word(applypattern.wordline, cols)
+        if word is None:
+            return
+        expected = int(hamming(applypattern.pattern, word))
+        measured = int(self.verify.classify(features(*stack([data]))['tau'])[0])
+        if measured != expected:
+            self.errormesg.emit("Verify: WL {:d} pattern {:0{width}b} read distance {:d}, expected {:d} - rewriting WL {:d}".format(
+                applypattern.wordline, applypattern.pattern, measured, expected, applypattern.wordline, width=cols))
+            self.cells.invalidate(applypattern.wordline)
+        return
+
+    def writebatch(self, writelist):
+        """Returns a MemBatch with its signals connected to this program"""
+        batch = MemBatch(writelist)
+        batch.metrics = self.metrics
+        batch.message.connect(self.message.emit)
+        batch.errormesg.connect(self.errormesg.emit)
+        return batch
+
+    def setwidth(self, session, rows, cols):
+        """Sets the CAM read pattern width on the Arduino and returns True if its pin map has the rows x cols array
+
+        The Arduino keeps the width until it is reset, so it is sent at the
+        start of every run and again after any reconnect. The reply "WIDTH
+        cols rows" confirms the array fits the pin map. Firmware without the
+        'W' command runs nothing and only sends the contact byte ending the
+        command (transact raises SerialException after idletime if there is
+        no reply at all); it cannot send wide patterns and is not used.
+        """
+        lines = []
+        command = bytearray([ord('W'), cols, rows, 0, 0, 0, 0, 0])
+        session.transact(command, lines.extend)
+        session.setup = [command]
+        if not any(line.startswith("WIDTH") for line in lines):
+            self.errormesg.emit("Arduino firmware has no 'W' command (upload memory_test_v3.ino)\n")
+            return False
+        if "WIDTH {:d} {:d}".format(cols, rows) not in lines:
+            self.errormesg.emit("Arduino pin map cannot address a {:d}x{:d} array (check arrayRows and arrayCols in memory_test_v3.ino)\n".format(rows, cols))
+            return False
+        return True
+
+    def camread(self, applypattern, session):
+        """Runs a CAM read and queues the capture for processing"""
+        applypattern.runprogram(session)
+        if self._pipeline is not None:
+            with self.metrics.span('queue wait'):
+                self._pipeline.put(applypattern)
+        else:
+            self.deliver(applypattern)
+        return
+
+    def deliver(self, applypattern):
+        """Converts a CAM read capture and emits the result if there is data"""
+        # Attempts to output data if it exists
+        try:
+            with self.metrics.span('parse', wordline=applypattern.wordline, pattern=applypattern.pattern):
+                data, header = applypattern.output()
+        except TypeError:
+            if applypattern.error is None:
+                self.errormesg.emit("No data to output")
+            return
+        with self.metrics.span('emit'):
+            self.result.emit(data, header)
+        if self.verify is not None and self.cells is not None:
+            self.verifyread(applypattern, data, applypattern.width)
+        return
+
+    def connect(self, session):
+        """Opens the session and negotiates the serial rate, and returns False (after an error message) if there is no board"""
+        try:
+            self.message.emit("Waiting to Connect...")
+            session.open()
+            if self.linkrates:
+                session.negotiate(self.linkrates)
+                self.link = (session.baud, session.linkspeed)
+        except (OSError, serial.SerialException):
+            self.errormesg.emit("\nPlease Connect Arduino via USB\n")
+            return False
+        self.message.emit("Connected to Arduino\n")
+        if self.link is not None:
+            self.message.emit(linkheader(*self.link))
+        return True
+
+    def run(self):
+        """Runs the program"""
+        self.banner()
+        # Serial session shared by every MemTest in the run
+        session = SerialSession(self.port)
+        self._pipeline = Pipeline(self.deliver)
+        if self.cells is not None:
+            self.cells = CellCache()            # Cells may have changed since the last run
+        self._mode = None
+        self.link = None
+        session.metrics = self.metrics
+        completed = False
+        try:
+            with self.metrics.span('supply open'):
+                self.supply.open()
+            if self.connect(session):
+                with self.metrics.span('run', program=type(self).__name__):
+                    completed = bool(self.sequence(session))
+        except SupplyError as e:
+            # Before OSError, which SupplyError derives from
+            self.errormesg.emit("\nVoltage source error: {:s}\n".format(str(e)))
+        except (OSError, serial.SerialException):
+            self.errormesg.emit("\nPlease Connect Arduino via USB\n")
+        finally:
+            session.close()
+            self.supply.close()
+            pipeline, self._pipeline = self._pipeline, None
+            pipeline.close()
+        self.message.emit("Disconnected successfully\n")
+        if completed:
+            self.complete()
+        return completed
+
+    @abc.abstractmethod
+    def sequence(self, session):
+        """Runs the program's commands on the connected session and returns True if it ran to the end"""
+        return False
+
+
+class WriteRead(Program):
+    """Class for running Write CAM Read functionality"""
+    def __init__(self, wline, arraysize, pattern, writePW, prePW, gndPW, loop, port=None, supply=None):
+        Program.__init__(self, port, supply)
+        self.wline = wline                      # Word line
+        self.arraysize = arraysize              # Memory array size (n for n x n, or (rows, columns))
+        self.rows, self.cols = arrayshape(arraysize)
+        self.pattern = pattern                  # Pattern written into array
+        self.writePW = int(writePW)             # Write pulse width
+        self.prePW = int(prePW)                 # Precharge pulse width
+        self.gndPW = int(gndPW)                 # Ground pulse width
+        self.loop = int(loop)                   # Loop number
+
+    def sequence(self, session):
+        error = checkarray(self.arraysize, camread=True) or checkwordline(self.wline, self.arraysize)
+        if error is not None:
+            self.errormesg.emit(error)
+            return False
+        plan, baseline = planwriteread((self.rows, self.cols), self.pattern, self.planner, self.cells is not None)
+        for line in plan.summary(baseline):
+            self.message.emit(line)
+
+        # Runs writes (of cells not already written) and then does CAM read of every pattern on the bit lines
+        if not self.setwidth(session, self.rows, self.cols):
+            return False
+        for a in plan.patterns:
+            applypattern = self.memtest('camread', wordline=self.wline, pattern=a, ftime=self.prePW, binary=binarytransfer,
+                                       features=self.features, divider=self.adcdivider, samples=self.adcsamples, width=self.cols)
+
+            self.writecells(session, self.arraysize, self.pattern, self.writePW, self.gndPW, self.loop)
+
+            self.setmode('read', "\nSet READ voltage. Press Continue...\n")
+            self.camread(applypattern, session)
+        if self.cells is not None:
+            self.message.emit("Cell writes: {:d} sent, {:d} skipped".format(self.cells.sent, self.cells.skipped))
+        return True
+
+
+class WriteOnly(Program):
+    """Class for running Write Only functionality"""
+    title = "Memory Test Program (Write Only)"
+
+    def __init__(self, arraysize, pattern, writePW, gndPW, loop, port=None, supply=None):
+        Program.__init__(self, port, supply)
+        self.arraysize = arraysize              # Memory array size (n for n x n, or (rows, columns))
+        self.pattern = pattern                  # Pattern written into array
+        self.writePW = int(writePW)             # Write pulse width
+        self.gndPW = int(gndPW)                 # Ground pulse width
+        self.loop = int(loop)                   # Loop number
+
+    def sequence(self, session):
+        if not self.setwidth(session, *arrayshape(self.arraysize)):
+            return False
+        self.writecells(session, self.arraysize, self.pattern, self.writePW, self.gndPW, self.loop)
+        return True
+
+
+class ReadOnly(Program):
+    """Class for running Read Only functionality"""
+    def __init__(self, wline, arraysize, prePW, gndPW, port=None, supply=None):
+        Program.__init__(self, port, supply)
+        self.wline = wline                      # Word line
+        self.arraysize = arraysize              # Memory array size (n for n x n, or (rows, columns))
+        self.rows, self.cols = arrayshape(arraysize)
+        self.prePW = int(prePW)                 # Precharge pulse width
+        self.gndPW = int(gndPW)                 # Ground pulse width
+
+    def sequence(self, session):
+        error = checkarray(self.arraysize, camread=True) or checkwordline(self.wline, self.arraysize)
+        if error is not None:
+            self.errormesg.emit(error)
+            return False
+        plan, baseline = planreadonly(self.cols, self.planner)
+        for line in plan.summary(baseline):
+            self.message.emit(line)
+
+        # Runs CAM reads of every pattern on the bit lines
+        if not self.setwidth(session, self.rows, self.cols):
+            return False
+        for a in plan.patterns:
+            applypattern = self.memtest('camread', wordline=self.wline, pattern=a, ftime=self.prePW, binary=binarytransfer,
+                                       features=self.features, divider=self.adcdivider, samples=self.adcsamples, width=self.cols)
+
+            self.waitvoltage('read', "\nSet READ voltage and rewrite pattern. Press Continue...\n")
+            self.camread(applypattern, session)
+        return True
+
+
+def checkwriteread(wline, arraysize, pattern, writePW, prePW, gndPW):
+    """Returns an error message if Write CAM Read variables are not valid, otherwise None"""
+    return checkarray(arraysize, camread=True) or checkwordline(wline, arraysize) or checkpattern(arraysize, pattern) or checkpulse("Write", writePW) or checkpulse("Precharge", prePW) or checkpulse("Ground", gndPW)
+
+
+def checkwriteonly(arraysize, pattern, writePW, gndPW):
+    """Returns an error message if Write Only variables are not valid, otherwise None"""
+    return checkarray(arraysize) or checkpattern(arraysize, pattern) or checkpulse("Write", writePW) or checkpulse("Ground", gndPW)
+
+
+def checkreadonly(wline, arraysize, prePW, gndPW):
+    """Returns an error message if CAM Read Only variables are not valid, otherwise None"""
+    return checkarray(arraysize, camread=True) or checkwordline(wline, arraysize) or checkpulse("Precharge", prePW) or checkpulse("Ground", gndPW)
+
+
+def checkcapture(divider, samples):
+    """Returns an error message if free-running ADC capture settings are not valid, otherwise None"""
+    if divider is None:
+        return None
+    if divider not in (16, 32, 64, 128):
+        return "ADC clock divider must be 16, 32, 64 or 128"
+    if samples < 10 or samples > maxsamples or samples % 10:
+        return "Number of ADC samples must be a multiple of 10 from 10 to {:d}".format(maxsamples)
+    return None
+
+
+def checkarray(arraysize, camread=False):
+    """Returns an error message if the array is larger than the firmware can address, otherwise None
+
+    With camread True the array is also checked for a run reading every
+    pattern on the bit lines (at most maxreadcols of them).
+    """
+    try:
+        rows, cols = arrayshape(arraysize)
+    except ValueError:
+        return "Array size must be N or RxC, e.g. 3 or 8x16"
+    if rows < 1 or rows > maxrows or cols < 1 or cols > maxcols:
+        return "Array must be from 1x1 to {:d}x{:d}".format(maxrows, maxcols)
+    if camread and cols > maxreadcols:
+        return "CAM reads of every pattern are limited to {:d} bit lines ({:d} reads)".format(maxreadcols, 2**maxreadcols)
+    return None
+
+
+def checkwordline(wline, arraysize):
+    """Returns an error message if the word line is not in the array, otherwise None"""
+    rows, cols = arrayshape(arraysize)
+    if wline < 0 or wline >= rows:
+        return "Word line must be from 0 to {:d} for a {:d}x{:d} array".format(rows - 1, rows, cols)
+    return None
+
+
+def checkpattern(arraysize, pattern):
+    """Returns an error message if the write pattern (row by row) does not suit the array, otherwise None"""
+    rows, cols = arrayshape(arraysize)
+    if len(pattern) != rows*cols:
+        return "Array size and write pattern do not match"
+    if not set(pattern) <= set('01'):
+        return "Pattern must be a binary number"
+    return None
+
+
+def arrayshape(arraysize):
+    """Returns (rows, columns) of an array size given as n (n x n), (rows, columns) or 'RxC'"""
+    if isinstance(arraysize, str):
+        rows, sep, cols = arraysize.lower().partition('x')
+        return (int(rows), int(cols)) if sep else (int(rows), int(rows))
+    if isinstance(arraysize, (tuple, list)):
+        return int(arraysize[0]), int(arraysize[1])
+    return int(arraysize), int(arraysize)
+
+
+def linkheader(baud, speed=None):
+    """Returns the header line for the serial link rate [baud] and measured throughput [bytes/s]"""
+    if speed is None:
+        return "Serial link: {:d} baud".format(baud)
+    return "Serial link: {:d} baud, {:.0f} bytes/s".format(baud, speed)
+
+
+def patternbytes(cols):
+    """Returns the number of bytes in a CAM read pattern for cols bit lines"""
+    return max(1, (cols + 7)//8)
+
+
+def checkpulse(name, width):
+    """Returns an error message if the pulse width is too long, otherwise None"""
+    if int(width) > maxpulsewidth:
+        return "{:s} pulse must be less than {:d} ms".format(name, maxpulsewidth)
+    return None
+
+
+def writeresults(runresult, filename, pathname):
+    """Writes alternating header/data blocks to results/filename and returns the full path"""
+    # Create a results folder if it does not exist
+    if "results" not in os.listdir(pathname):
+        os.mkdir(os.path.join(pathname, "results"))
+    fullname = os.path.join(pathname, "results", filename)
+    # Opens out file and writes header followed by data
+    with open(fullname, 'w') as outfile:
+        for block in runresult:
+            if isinstance(block, np.ndarray):
+                np.savetxt(outfile, block, fmt=("%.1f", "%.5f"), delimiter='\t')
+            else:
+                for line in block:
+                    outfile.write("{:s}\n".format(line))
+            outfile.write('\n')
+    return fullname
@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memjournal.py
+Append-only, crash-safe journal of results written as they arrive
+
+File format: b'MTJ1' then one record per result block
+    b'R', header length (uint32), rows (uint32), header (JSON list of lines),
+    samples (rows x 2 float64), CRC32 of header and samples (uint32)
+all little endian. A record cut short by a crash fails its length or CRC
+check and is ignored (with everything after it) when the journal is read.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import json
+import time
+import zlib
+import struct
+import collections
+import numpy as np
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+magic = b'MTJ1'
+recordhead = struct.Struct('<cII')
+recordtail = struct.Struct('<I')
+sampledtype = np.dtype('<f8')
+
+
+def newjournal(pathname, **kwargs):
+    """Returns a new Journal in results/journal named by the current time"""
+    folder = os.path.join(pathname, "results", "journal")
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    name = time.strftime("%Y%m%d_%H%M%S")
+    filename = os.path.join(folder, name + ".mtj")
+    count = 1
+    while os.path.exists(filename):
+        filename = os.path.join(folder, "{:s}_{:d}.mtj".format(name, count))
+        count += 1
+    return Journal(filename, **kwargs)
+
+
+class Journal(object):
+    """Class for an append-only results journal with an optional bounded in-memory cache
+
+    Each append is written and flushed straight away; fsync is batched to
+    every syncevery records or syncinterval seconds, whichever comes first.
+    The last cachesize blocks are kept in memory (0 for no cache); older
+    blocks are read back from the file when needed. An existing journal
+    reopened for appending is cut back to its last good record; with
+    readonly True it is only read, so a journal still being written by
+    another run is left alone.
+    """
+    def __init__(self, filename, syncevery=8, syncinterval=1.0, cachesize=64, readonly=False):
+        self.filename = filename
+        self._syncevery = syncevery               # Records between fsyncs
+        self._syncinterval = syncinterval         # Maximum time between fsyncs [s]
+        self._cache = collections.deque(maxlen=cachesize) if cachesize else None
+        self._index = []                          # (header, sample offset, rows) of each record
+        self._map = None                          # Memory map of the file for reading back blocks
+        self._unsynced = 0
+        self._lastsync = time.time()
+        self.readonly = readonly                  # Journal is read but never written
+        exists = os.path.exists(filename) and os.path.getsize(filename) > 0
+        if readonly:
+            self._scan()
+            self._file = open(filename, 'rb')
+        elif exists:
+            end = self._scan()
+            self._file = open(filename, 'r+b')
+            self._file.truncate(end)            # Drops a record cut short by a crash
+            self._file.seek(end)
+        else:
+            self._file = open(filename, 'wb')
+            self._file.write(magic)
+            self._file.flush()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, header, data):
+        """Appends one result block to the journal"""
+        if self.readonly:
+            raise IOError("{:s} is open read-only".format(self.filename))
+        data = np.ascontiguousarray(data, dtype=sampledtype).reshape(-1, 2)
+        headbytes = json.dumps([str(x) for x in header]).encode('utf-8')
+        samplebytes = data.tobytes()
+        crc = zlib.crc32(samplebytes, zlib.crc32(headbytes)) & 0xFFFFFFFF
+        offset = self._file.tell() + recordhead.size + len(headbytes)
+        self._file.write(recordhead.pack(b'R', len(headbytes), len(data)) + headbytes + samplebytes + recordtail.pack(crc))
+        self._file.flush()
+        self._index.append((list(header), offset, len(data)))
+        if self._cache is not None:
+            self._cache.append((list(header), data))
+        self._unsynced += 1
+        if self._unsynced >= self._syncevery or time.time() - self._lastsync > self._syncinterval:
+            self.sync()
+        return
+
+    def sync(self):
+        """Forces written records to disk"""
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._lastsync = time.time()
+        return
+
+    def close(self):
+        """Syncs and closes the journal file"""
+        if self._file is not None and not self._file.closed:
+            if not self.readonly:
+                self.sync()
+            self._file.close()
+        self._map = None
+        return
+
+    def __getitem__(self, i):
+        """Returns (header, data) of block i (from the cache if it is there)"""
+        if i < 0:
+            i += len(self._index)
+        if self._cache is not None and i >= len(self._index) - len(self._cache):
+            return self._cache[i - (len(self._index) - len(self._cache))]
+        header, offset, rows = self._index[i]
+        if self._map is None or len(self._map) < offset + rows*2*sampledtype.itemsize:
+            # One map of the whole file (remapped when it has grown), so reading many blocks holds one file open
+            if not self._file.closed and not self.readonly:
+                self._file.flush()
+            self._map = np.memmap(self.filename, dtype=np.uint8, mode='r')
+        return header, np.frombuffer(self._map, dtype=sampledtype, count=rows*2, offset=offset).reshape(rows, 2)
+
+    def __iter__(self):
+        for i in range(len(self._index)):
+            yield self[i]
+
+    def runresult(self):
+        """Returns an alternating header/data buffer as MainApp builds"""
+        buf = []
+        for header, data in self:
+            buf.append(header)
+            buf.append(data)
+        return buf
+
+    def _scan(self):
+        """Builds the index from an existing journal and returns the end of the last good record"""
+        with open(self.filename, 'rb') as infile:
+            if infile.read(len(magic)) != magic:
+                raise IOError("{:s} is not a MemTest journal".format(self.filename))
+            end = infile.tell()
+            while True:
+                head = infile.read(recordhead.size)
+                if len(head) < recordhead.size:
+                    break
+                tag, headlen, rows = recordhead.unpack(head)
+                if tag != b'R':
+                    break
+                headbytes = infile.read(headlen)
+                samplebytes = infile.read(rows*2*sampledtype.itemsize)
+                tail = infile.read(recordtail.size)
+                if len(headbytes) < headlen or len(samplebytes) < rows*2*sampledtype.itemsize or len(tail) < recordtail.size:
+                    break
+                if recordtail.unpack(tail)[0] != zlib.crc32(samplebytes, zlib.crc32(headbytes)) & 0xFFFFFFFF:
+                    break
+                self._index.append((json.loads(headbytes.decode('utf-8')), end + recordhead.size + headlen, rows))
+                end = infile.tell()
+        return end
+
+
+def readjournal(filename):
+    """Returns an alternating header/data buffer of the good records in a journal file"""
+    journal = Journal(filename, cachesize=0, readonly=True)
+    buf = journal.runresult()
+    journal.close()
+    return buf
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memmetrics.py
+Timing spans and serial byte counters for the phases of a memory test run
+
+Code marks a phase with
+    with metrics.span('receive', program=1) as span:
+        ...
+        span.tag(bytes=n)
+and counts with metrics.count('bytes in', n). Each finished span calls
+listener (if set) with its record, so a GUI can show timings live, and
+save() writes every span as CSV and the spans, counters and per-phase
+totals as JSON to results/metrics/. A disabled Metrics hands out one
+shared do-nothing span, so instrumented code costs one attribute check.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Columns written first in the CSV file (tags follow in name order)
+spancolumns = ('name', 'start', 'duration', 'thread')
+
+
+class _Span(object):
+    """Context manager timing one phase"""
+    def __init__(self, metrics, name, tags):
+        self._metrics = metrics
+        self._name = name
+        self._tags = tags
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self._metrics.add(self._name, self._start, time.time() - self._start, self._tags)
+        return False
+
+    def tag(self, **tags):
+        """Adds tags (e.g. a byte count) to the span"""
+        self._tags.update(tags)
+        return
+
+
+class _NoSpan(object):
+    """Context manager used when metrics are disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def tag(self, **tags):
+        return
+
+
+_nospan = _NoSpan()
+
+
+class Metrics(object):
+    """Class for collecting the timing spans and counters of a run
+
+    Spans may be recorded from several threads (the run, the Pipeline
+    worker and the serial session). start is in seconds from the creation
+    of the Metrics and duration in seconds.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled                    # Record spans and counters
+        self.listener = None                      # Called with each span record as it finishes
+        self.spans = []                           # Span records in order finished
+        self.counters = {}                        # Totals of counted quantities
+        self._origin = time.time()
+        self._lock = threading.Lock()
+
+    def span(self, name, **tags):
+        """Returns a context manager timing the phase name"""
+        if not self.enabled:
+            return _nospan
+        return _Span(self, name, tags)
+
+    def count(self, name, n):
+        """Adds n to the counter name"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        return
+
+    def add(self, name, start, duration, tags=None):
+        """Records a span started at time start [s since the epoch] lasting duration [s]"""
+        record = {'name': name, 'start': start - self._origin, 'duration': duration, 'thread': threading.current_thread().name}
+        if tags:
+            record.update(tags)
+        with self._lock:
+            self.spans.append(record)
+        if self.listener is not None:
+            self.listener(record)
+        return
+
+    def totals(self):
+        """Returns the number, total, mean and maximum duration [s] of each phase"""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            entry = totals.setdefault(record['name'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += record['duration']
+            entry['max'] = max(entry['max'], record['duration'])
+        for entry in totals.values():
+            entry['mean'] = entry['total']/entry['count']
+        return totals
+
+    def summary(self):
+        """Returns lines of the total time of each phase, longest first, and the counters"""
+        totals = self.totals()
+        lines = ["{:<16s} {:6d} x {:9.4f} s = {:9.3f} s".format(name, entry['count'], entry['mean'], entry['total'])
+                 for name, entry in sorted(totals.items(), key=lambda item: -item[1]['total'])]
+        lines.extend("{:<16s} {:d}".format(name, value) for name, value in sorted(self.counters.items()))
+        return lines
+
+    def save(self, pathname, basename=None):
+        """Writes results/metrics/basename.csv and .json and returns the .json path"""
+        folder = os.path.join(pathname, "results", "metrics")
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        basename = basename or time.strftime("%Y%m%d_%H%M%S")
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        tags = sorted(set(key for record in spans for key in record) - set(spancolumns))
+        with open(os.path.join(folder, basename + ".csv"), 'w') as outfile:
+            writer = csv.writer(outfile, lineterminator='\n')
+            writer.writerow(list(spancolumns) + tags)
+            for record in spans:
+                writer.writerow([record.get(key, '') for key in list(spancolumns) + tags])
+        jsonname = os.path.join(folder, basename + ".json")
+        with open(jsonname, 'w') as outfile:
+            json.dump({'version': __version__, 'counters': counters, 'totals': self.totals(), 'spans': spans}, outfile, indent=1)
+        return jsonname
+
+
+# Shared disabled Metrics for objects that are not given one
+nometrics = Metrics(enabled=False)
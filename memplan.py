@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memplan.py
+Run planner for the order of cell writes, CAM read patterns and voltage changes
+
+The original run order reads patterns 0, 1, 2, ... and rewrites every
+cell (switching to the write voltage and back) before each read. A plan
+reads the patterns in Gray code order, so consecutive reads change one
+bit line, writes the cells once with all writes sharing one change to the
+write voltage, and sends the writes of each word line together (0 writes
+before 1 writes). Every write or CAM read command starts with a line state
+initialization (initOneThirdTwoThirdZERO/ONE or initContentAddress) on the
+Arduino, so those are counted with the commands.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+
+def graycode(cols):
+    """Returns every pattern of cols bit lines in Gray code order"""
+    return [a ^ (a >> 1) for a in range(2**cols)]
+
+
+def bitlinechanges(patterns):
+    """Returns the number of bit lines that change between consecutive patterns"""
+    return sum(bin(a ^ b).count('1') for a, b in zip(patterns, patterns[1:]))
+
+
+def orderwrites(cells):
+    """Returns (wordline, bitline, state) cells ordered by word line, 0 writes before 1 writes"""
+    return sorted(cells, key=lambda cell: (cell[0], cell[2], cell[1]))
+
+
+class RunPlan(object):
+    """Class for the planned order of a run and its expected cost
+
+    patterns are the CAM read patterns in order and writes the cells
+    written before the first read. With rewrite True the writes are
+    repeated before every read (the original order) rather than once, and
+    with grouped False the read voltage is set again before every read.
+    """
+    def __init__(self, patterns, writes, rewrite=False, grouped=True):
+        self.patterns = list(patterns)            # CAM read patterns in run order
+        self.writes = list(writes)                # (wordline, bitline, state) in write order
+        self.rewrite = rewrite                    # Writes repeated before every read
+        self.grouped = grouped                    # Reads share one change to the read voltage
+
+    def cost(self):
+        """Returns a dictionary of expected commands, voltage changes and bit line changes"""
+        reads = len(self.patterns)
+        writes = len(self.writes)*(reads if self.rewrite and reads else 1)
+        if self.rewrite and self.writes:
+            changes = 2*reads or 1
+        else:
+            changes = (1 if self.writes else 0) + (min(reads, 1) if self.grouped else reads)
+        return {'writes': writes,
+                'reads': reads,
+                'commands': writes + reads,
+                'initializations': writes + reads,
+                'voltage changes': changes,
+                'bit line changes': bitlinechanges(self.patterns)}
+
+    def summary(self, baseline=None):
+        """Returns lines describing the plan and its savings over baseline (a RunPlan)"""
+        cost = self.cost()
+        lines = ["Run plan: {:d} writes, {:d} CAM reads, {:d} voltage changes".format(
+            cost['writes'], cost['reads'], cost['voltage changes'])]
+        if baseline is not None:
+            base = baseline.cost()
+            for key in ('commands', 'initializations', 'voltage changes', 'bit line changes'):
+                lines.append("  {:s}: {:d} (was {:d}, saves {:d})".format(key.capitalize(), cost[key], base[key], base[key] - cost[key]))
+        return lines
+
+
+def planwriteread(arraysize, pattern, optimize=True, cache=True):
+    """Returns (plan, baseline) RunPlans for writing pattern (row by row) into rows x cols and reading every pattern
+
+    arraysize is (rows, cols). The baseline is the original order. With
+    optimize False the plan keeps the original order, and with cache False
+    the cells are still rewritten before every read.
+    """
+    rows, cols = arraysize
+    cells = [(i//cols, i%cols, c) for i, c in enumerate(pattern)]
+    baseline = RunPlan(range(2**cols), cells, rewrite=True, grouped=False)
+    if not optimize:
+        return RunPlan(range(2**cols), cells, rewrite=not cache, grouped=False), baseline
+    return RunPlan(graycode(cols), orderwrites(cells), rewrite=not cache), baseline
+
+
+def planreadonly(cols, optimize=True):
+    """Returns (plan, baseline) RunPlans for reading every pattern of cols bit lines
+
+    The read voltage is still asked for before every read, since a Read
+    Only run pauses there for the pattern to be rewritten.
+    """
+    baseline = RunPlan(range(2**cols), [], grouped=False)
+    if not optimize:
+        return baseline, baseline
+    return RunPlan(graycode(cols), [], grouped=False), baseline
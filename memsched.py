@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memsched.py
+Runs memory test programs on several Arduino boards at once
+
+Programs are added with the ID and serial port of their board. Each port
+gets one worker thread that runs its programs in order, so boards work in
+parallel while programs sharing a port never overlap. Output from all
+workers is merged into one stream in the calling thread: messages are
+prefixed with the board ID and a "Board: ID" line is added to the header
+of each result.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from memcore import Signal
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+
+class BoardScheduler(object):
+    """Class for running programs concurrently, one worker per serial port
+
+    message, errormesg and result have the same signatures as those of
+    memcore.Program and are emitted from the thread that calls run().
+    """
+    def __init__(self):
+        self.message = Signal()
+        self.errormesg = Signal()
+        self.result = Signal()
+        self._jobs = []                           # (port, [(board, program), ...]) in order added
+        self.failed = []                          # IDs of boards whose program raised an error or did not complete
+
+    def add(self, board, program):
+        """Adds a program to run on board (its port is program.port)"""
+        for port, programs in self._jobs:
+            if port == program.port:
+                programs.append((board, program))
+                return
+        self._jobs.append((program.port, [(board, program)]))
+        return
+
+    def boards(self):
+        """Returns the board IDs in the order added"""
+        return [board for port, programs in self._jobs for board, program in programs]
+
+    def run(self):
+        """Runs every program and returns True when all workers have finished and every program completed"""
+        events = queue.Queue()
+        workers = []
+        for port, programs in self._jobs:
+            worker = threading.Thread(target=self._work, args=(programs, events))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        self.failed = []
+
+        # Merged stream: forward events until every worker has finished
+        running = len(workers)
+        while running:
+            kind, board, args = events.get()
+            if kind == 'done':
+                running -= 1
+            elif kind == 'failed':
+                self.failed.append(board)
+                self.errormesg.emit("[{:s}] {:s}".format(board, args[0]))
+            elif kind == 'message':
+                self.message.emit("[{:s}] {:s}".format(board, args[0]))
+            elif kind == 'errormesg':
+                self.errormesg.emit("[{:s}] {:s}".format(board, args[0]))
+            elif kind == 'result':
+                data, header = args
+                self.result.emit(data, list(header) + ["Board: {:s}".format(board)])
+        for worker in workers:
+            worker.join()
+        return not self.failed
+
+    @staticmethod
+    def _work(programs, events):
+        """Worker thread: runs the programs of one port in order"""
+        for board, program in programs:
+            program.message.connect(lambda text, board=board: events.put(('message', board, (text,))))
+            program.errormesg.connect(lambda text, board=board: events.put(('errormesg', board, (text,))))
+            program.result.connect(lambda data, header, board=board: events.put(('result', board, (data, header))))
+            try:
+                if not program.run():
+                    events.put(('failed', board, ("Run did not complete",)))
+            except Exception as e:
+                events.put(('failed', board, ("{:s}: {:s}".format(type(e).__name__, str(e)),)))
+        events.put(('done', None, ()))
+        return
+
+
+def parseboard(text):
+    """Parses an ID=PORT board argument into (ID, PORT)"""
+    board, sep, port = text.partition('=')
+    if not sep or not board or not port:
+        raise ValueError("board must be ID=PORT, e.g. A=/dev/ttyACM0")
+    return board, port
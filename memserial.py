@@ -0,0 +1,422 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memserial.py
+Persistent serial session for talking to the memory test Arduino
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import time
+import struct
+import serial
+import numpy as np
+from memmetrics import nometrics
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Binary frame sent by Memoryfunctions::sendframe
+# '#', payload length (uint16), payload, checksum (uint16 sum of payload bytes)
+framestart = b'#'
+framedtype = np.dtype([('ticks', '<u4'), ('adc', '<u2')])
+# Feature record sent in a frame by Memoryfunctions::sendfeatures (program 7)
+# Times in timer2 ticks, voltages in ADC counts, fixed[k] sampled at (k + 1)*featurestep ticks
+featurestep = 1000
+featuredtype = np.dtype([('tthreshold', '<u4'), ('tend', '<u4'), ('area', '<u4'), ('v0', '<u2'),
+                         ('vmin', '<u2'), ('vmax', '<u2'), ('fixed', '<u2', (16,))])
+# Serial rates selectable with the 'S' command (baudRates in memory_test_v3.ino, index 0 is the startup rate)
+baudrates = (115200, 250000, 500000, 1000000, 2000000)
+# Bytes in the loopback test block echoed by linktest in memory_test_v3.ino
+linkbytes = 256
+# Longest time after a contact byte that a command is sent without waiting for the next one [s]
+# (the Arduino looks for a command 1 s after each contact byte and sends the next one if there is none)
+contactwindow = 0.5
+# Longest wait for the reply to a link test command [s]
+# (it is read 1 s after it is sent, and firmware without 'S' sends only a contact byte 1 s after that)
+replytime = 3.0
+
+
+class FrameError(serial.SerialException):
+    """Raised when a binary frame fails its checksum"""
+    pass
+
+
+def decodeframe(payload):
+    """Decodes a binary frame payload into timer2 ticks (uint32) and ADC counts (uint16)"""
+    samples = np.frombuffer(payload, dtype=framedtype)
+    return samples['ticks'], samples['adc']
+
+
+def decodesamples(payload):
+    """Decodes a free-running capture frame payload (program 8) into the ADC clock divider and ADC counts (uint16)"""
+    if len(payload) < 2 or len(payload) % 2:
+        raise FrameError("Capture frame has odd length {:d}".format(len(payload)))
+    samples = np.frombuffer(payload, dtype='<u2')
+    return int(samples[0]), samples[1:]
+
+
+def decoderecord(payload):
+    """Decodes a feature record frame payload into a numpy record of featuredtype"""
+    if len(payload) != featuredtype.itemsize:
+        raise FrameError("Feature record is {:d} bytes, expected {:d}".format(len(payload), featuredtype.itemsize))
+    return np.frombuffer(payload, dtype=featuredtype)[0]
+
+
+class StreamParser(object):
+    """Class for incrementally parsing Arduino output read from the port in blocks
+
+    Blocks of bytes are fed in as they arrive. Complete text lines from each
+    block are passed to lines as one list, binary frames are checked and
+    their payload passed to frame, and done is set at the 'Z' contact byte
+    that ends the command (at once for a command with no reply). Every
+    byte is part of the reply: SerialSession sends each command straight
+    after a contact byte, so no earlier contact byte can follow it.
+    """
+    def __init__(self, lines, frame=None):
+        self._lines = lines                       # Callback for a list of complete lines
+        self._frame = frame                       # Callback for a binary frame payload
+        self._buffer = bytearray()                # Bytes not yet parsed
+        self.done = False                         # True when the command has finished
+
+    @property
+    def buffered(self):
+        """Number of bytes fed in but not yet parsed (after done, bytes sent after the end of the command)"""
+        return len(self._buffer)
+
+    def reset(self):
+        """Discards buffered bytes so parsing can start again"""
+        self._buffer = bytearray()
+        self.done = False
+        return
+
+    def feed(self, chunk):
+        """Parses a block of bytes and returns True when the command has finished"""
+        self._buffer += chunk
+        buf = self._buffer
+        pos = 0
+        lines = []
+        while not self.done and pos < len(buf):
+            stop = buf.find(b'Z', pos)
+            if self._frame is not None:
+                fstart = buf.find(framestart, pos, stop if stop >= 0 else len(buf))
+                if fstart >= 0:
+                    stop = fstart
+            if stop < 0:
+                # Only complete lines are passed on, the rest waits for the next block
+                end = buf.rfind(b'\n', pos) + 1
+                if end > pos:
+                    lines.extend(self._split(buf[pos:end]))
+                    pos = end
+                break
+            if stop > pos:
+                lines.extend(self._split(buf[pos:stop]))
+            if buf[stop:stop + 1] == b'Z':
+                pos = stop + 1
+                self.done = True
+                break
+            # Binary frame: '#', length (uint16), payload, checksum (uint16)
+            if len(buf) - stop < 3:
+                pos = stop
+                break
+            length, = struct.unpack_from('<H', bytes(buf[stop + 1:stop + 3]))
+            if len(buf) - stop < length + 5:
+                pos = stop
+                break
+            payload = bytes(buf[stop + 3:stop + 3 + length])
+            checksum, = struct.unpack_from('<H', bytes(buf[stop + 3 + length:stop + 5 + length]))
+            if int(np.frombuffer(payload, dtype=np.uint8).sum()) & 0xFFFF != checksum:
+                raise FrameError("Binary frame checksum error")
+            if lines:
+                self._lines(lines)
+                lines = []
+            self._frame(payload)
+            pos = stop + length + 5
+        del self._buffer[:pos]
+        if lines:
+            self._lines(lines)
+        return self.done
+
+    @staticmethod
+    def _split(text):
+        """Splits bytes into decoded lines without line endings"""
+        return text.decode('ascii', 'replace').replace('\r', '').rstrip('\n').split('\n')
+
+
+class SerialSession(object):
+    """Class for keeping one serial connection to the Arduino open for a whole run
+
+    The port is opened once with DTR held low so the Arduino is not reset,
+    the 'A'/'Z' contact handshake is done once, and every MemTest command
+    is then sent over the same connection. If the port drops the session
+    closes it and reconnects on the next command.
+
+    Commands are only written straight after a contact byte (the one
+    ending the last command, or the next one if that is too old), while
+    the Arduino is still waiting to look for a command, so every byte
+    read afterwards is the reply.
+
+    negotiate() moves the link to the fastest rate that passes a loopback
+    test. The Arduino keeps that rate until told otherwise, so close()
+    returns it to the startup rate and open() looks for it at the other
+    rates if it is heard but does not answer (e.g. after a crashed session).
+    """
+    # Contact bytes sent by establishContact in memory_test_v3.ino
+    contactbytes = (b'A', b'Z')
+    # Timing spans and byte counters (memmetrics.Metrics, disabled unless set)
+    metrics = nometrics
+
+    def __init__(self, serialport, baud=baudrates[0], timeout=0.5, contacttime=10.0, idletime=10.0, retries=2):
+        self._serialport = serialport             # Serial port
+        self._baud = baud                         # Arduino serial port bit rate
+        self._timeout = timeout                   # Read timeout on port [s]
+        self._contacttime = contacttime           # Maximum wait for contact byte [s]
+        self._idletime = idletime                 # Maximum silence during a command [s]
+        self._retries = retries                   # Reconnect attempts per command
+        self._ser = None                          # pyserial object when open
+        self.reconnects = 0                       # Number of times the port was reopened
+        self.setup = []                           # Commands sent again after reconnecting (e.g. pattern width)
+        self.linkspeed = None                     # Throughput measured by the last link test [bytes/s]
+        self._heard = False                       # Bytes other than contact bytes seen in the handshake
+        self._idle = False                        # Nothing read since the last contact byte
+        self._lastcontact = 0.0                   # Time the last contact byte was read
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def baud(self):
+        """Serial bit rate of the link"""
+        return self._baud
+
+    def is_open(self):
+        """Returns True if the port is open and the handshake has been done"""
+        return self._ser is not None and self._ser.is_open
+
+    def open(self):
+        """Opens the port without resetting the Arduino and waits for a contact byte
+
+        If the Arduino is heard but sends no contact byte it is at another
+        rate, so the other rates in baudrates are tried.
+        """
+        if self.is_open():
+            return
+        ser = serial.Serial()
+        ser.port = self._serialport
+        ser.baudrate = self._baud
+        ser.timeout = self._timeout
+        ser.dtr = False                           # Must be set before open to suppress auto-reset
+        with self.metrics.span('port open'):
+            ser.open()
+        self._ser = ser
+        others = [b for b in baudrates if b != self._baud]
+        try:
+            while True:
+                try:
+                    self._handshake()
+                    break
+                except serial.SerialException:
+                    if not self._heard or not others:
+                        raise
+                    self._baud = others.pop(0)
+                    self._ser.baudrate = self._baud
+        except (OSError, serial.SerialException):
+            self.close()
+            raise
+        return
+
+    def close(self):
+        """Returns the Arduino to the startup rate (if changed) and closes the port"""
+        if self._ser is not None:
+            try:
+                if self._baud != baudrates[0]:
+                    self._linktest(0, wait=False)
+            except (OSError, serial.SerialException):
+                pass
+            try:
+                self._ser.close()
+            except (OSError, serial.SerialException):
+                pass
+        self._ser = None
+        return
+
+    def reconnect(self):
+        """Closes and reopens the port"""
+        self.close()
+        self.reconnects += 1
+        self.open()
+        return
+
+    def _handshake(self):
+        """Waits for the Arduino to send 'A' (after reset) or 'Z' (idle after a command)
+
+        Returns as soon as the contact byte is read, so a command can be
+        sent before the next one. Gives up after 2.5 s (more than the 1 s
+        between contact bytes) if bytes arrive but none is a contact byte,
+        i.e. the rate is wrong.
+        """
+        deadline = time.time() + self._contacttime
+        self._heard = False
+        with self.metrics.span('contact wait') as span:
+            while time.time() < deadline:
+                byte = self._ser.read()
+                if byte in self.contactbytes:
+                    break
+                if byte and not self._heard:
+                    self._heard = True
+                    deadline = min(deadline, time.time() + 2.5)
+            else:
+                span.tag(failed=1)
+                raise serial.SerialException("No contact from Arduino on {:s} at {:d} baud".format(self._serialport, self._baud))
+        self._idle = True
+        self._lastcontact = time.time()
+        return
+
+    def _send(self, command):
+        """Writes a command straight after a contact byte
+
+        If bytes arrived since the last contact byte, or it is older than
+        contactwindow, the input is discarded and the next contact byte is
+        waited for first.
+        """
+        if not self._idle or self._ser.in_waiting or time.time() - self._lastcontact > contactwindow:
+            self._ser.reset_input_buffer()
+            self._handshake()
+        self._ser.write(bytearray(command))
+        self._idle = False
+        return
+
+    def negotiate(self, rates=baudrates):
+        """Moves the link to the fastest of rates that passes a loopback test and returns its throughput [bytes/s]
+
+        Rates are tried fastest first. For each the Arduino is asked to
+        switch with 'S', a block of random bytes is sent and echoed back in
+        a checksummed frame, and the rate is kept only if the echo matches;
+        otherwise both ends go back to the previous rate. The current rate
+        is also tested so the throughput is always measured. Returns None
+        if the firmware has no 'S' command or no rate passes.
+        """
+        self.open()
+        self.linkspeed = None
+        for baud in sorted(set(rates) | set([self._baud]), reverse=True):
+            if baud not in baudrates:
+                continue
+            with self.metrics.span('link test', baud=baud) as span:
+                self.linkspeed = self._linktest(baudrates.index(baud))
+                span.tag(passed=int(self.linkspeed is not None))
+            if self.linkspeed is not None:
+                break
+        return self.linkspeed
+
+    def _linktest(self, index, wait=True):
+        """Switches to baudrates[index] if the loopback test passes and returns the measured bytes/s (None if not)
+
+        With wait False the contact byte ending the command is not waited
+        for (when closing the port).
+        """
+        baud = baudrates[index]
+        block = bytearray(os.urandom(linkbytes))
+        self._send([ord('S'), index, 0, 0, 0, 0, 0, 0])
+        reply = []
+        parser = StreamParser(reply.extend)
+        deadline = time.time() + replytime
+        while not reply and not parser.done and time.time() < deadline:
+            parser.feed(self._ser.read(self._ser.in_waiting or 1))
+        if parser.done and not reply:
+            # Firmware without 'S' runs nothing and only ends the command with a contact byte
+            self._idle = parser.buffered == 0
+            self._lastcontact = time.time()
+            return None
+        if reply[:1] != ["BAUD {:d}".format(baud)]:
+            if wait:
+                self._handshake()
+            return None
+        echo = []
+        elapsed = 0.0
+        try:
+            self._ser.baudrate = baud
+        except (ValueError, serial.SerialException):
+            pass                                  # Rate not supported by this port
+        else:
+            parser = StreamParser(lambda lines: None, echo.append)
+            start = time.time()
+            self._ser.write(block)
+            deadline = start + 2.0                # Twice the Serial.readBytes timeout on the Arduino
+            try:
+                while not echo and time.time() < deadline:
+                    parser.feed(self._ser.read(self._ser.in_waiting or 1))
+            except FrameError:
+                pass
+            elapsed = time.time() - start
+        if echo and bytearray(echo[0]) == block:
+            self._ser.write(b'K')
+            self._baud = baud
+            speed = 2*len(block)/elapsed
+        else:
+            self._ser.write(b'X')
+            self._ser.baudrate = self._baud
+            speed = None
+        if wait:
+            time.sleep(0.1)                       # Lets output at the other rate arrive before discarding it
+            self._ser.reset_input_buffer()
+            self._handshake()
+        return speed
+
+    def transact(self, command, lines, restart=None, frame=None):
+        """Sends a command and parses the reply until the 'Z' contact byte
+
+        The port is read in blocks of whatever is waiting and fed to a
+        StreamParser, which passes complete text lines to lines and binary
+        frame payloads to frame (if given). If the port drops (or a frame is
+        corrupted) the session reconnects, calls restart (if given) so the
+        caller can discard partial output, and sends the command again.
+        """
+        parser = StreamParser(lines, frame)
+        for attempt in range(self._retries + 1):
+            try:
+                if attempt > 0:
+                    self.reconnect()
+                    for setup in self.setup:
+                        self._send(setup)
+                        self._receive(StreamParser(lambda lines: None))
+                    parser.reset()
+                    if restart is not None:
+                        restart()
+                else:
+                    self.open()
+                with self.metrics.span('send', bytes=len(command)):
+                    self._send(command)
+                self.metrics.count('bytes out', len(command))
+                with self.metrics.span('receive') as span:
+                    received = self._receive(parser)
+                    span.tag(bytes=received, transfer=received*10.0/self._baud)  # Time on the wire [s], the rest is the Arduino
+                self.metrics.count('bytes in', received)
+                return
+            except (OSError, serial.SerialException):
+                self.close()
+                if attempt == self._retries:
+                    raise
+        return
+
+    def _receive(self, parser):
+        """Reads blocks from the port into the parser until the command completes and returns the bytes read"""
+        lastdata = time.time()
+        received = 0
+        while True:
+            serin = self._ser.read(self._ser.in_waiting or 1)
+            if len(serin) == 0:
+                if time.time() - lastdata > self._idletime:
+                    raise serial.SerialException("Arduino stopped responding")
+                continue
+            lastdata = time.time()
+            received += len(serin)
+            if parser.feed(serin):
+                self._idle = parser.buffered == 0
+                self._lastcontact = lastdata
+                return received
@@ -0,0 +1,418 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memsim.py
+Virtual Arduino speaking the memory_test_v3.ino serial protocol on a pseudo-terminal
+
+Run with:
+    python memsim.py [--timescale 0.01] [--arraysize 3 | --arraysize 8x16]
+then point MemTest at the printed port name.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import sys
+import time
+import math
+import random
+import select
+import struct
+import argparse
+import threading
+import tty
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+
+class VirtualArduino(object):
+    """Class for simulating the memory test Arduino and its memory array
+
+    Implements setup()/loop() of memory_test_v3.ino and the high level
+    functions of Memoryfunctions: the 'A'/'Z' contact bytes, the 8 byte
+    program command (with extra pattern bytes set by 'W'), 'S' link tests, batches and
+    camread/formarray/writeZERO/writeONE/stdread_rewrite. Each cell stores a bit and a CAM read discharges the
+    precharged word line through every cell on it, quickly through bit
+    lines that mismatch the stored bit and slowly (leakage) through bit
+    lines that match, giving the same 500 sample output as wordlineread.
+    All delays are multiplied by timescale so runs can be faster than real
+    time, and output is paced at the serial bit rate (also scaled).
+    """
+    # Maximum number of commands in one batch (MAXBATCH in memory_test_v3.ino)
+    maxbatch = 32
+    # Samples taken by wordlineread
+    samples = 500
+    # Fixed time samples in a feature record and timer2 counts between them (Memoryfunctions.cpp)
+    featuresamples = 16
+    featurestep = 1000
+    # Samples stored by a free-running ADC capture (MAXSAMPLES in Memoryfunctions.h)
+    maxsamples = 1500
+    # Serial rates selectable by 'S' and bytes in its test block (memory_test_v3.ino)
+    baudrates = (115200, 250000, 500000, 1000000, 2000000)
+    linktestbytes = 256
+
+    def __init__(self, arraysize=3, timescale=1.0, baud=115200, vprecharge=2.0, tmatch=20.0, tmismatch=1.0, noise=1.5, seed=None, maxbaud=None):
+        if isinstance(arraysize, int):
+            arraysize = (arraysize, arraysize)
+        self.rows, self.cols = arraysize          # Memory array size (word lines, bit lines)
+        self.timescale = timescale                # Multiplier for all delays (0.01 is 100x real time)
+        self.baud = baud                          # Serial bit rate used to pace output (None for no pacing)
+        self.vprecharge = vprecharge              # Word line precharge voltage [V]
+        self.tmatch = tmatch                      # Discharge time constant of a matching cell [ms]
+        self.tmismatch = tmismatch                # Discharge time constant of a mismatching cell [ms]
+        self.noise = noise                        # ADC noise [counts rms]
+        self.maxbaud = maxbaud                    # Fastest rate that passes the link test (None for all)
+        self.linkbaud = self.baudrates[0]         # Serial rate set by 'S'
+        self.cells = [[0]*self.cols for i in range(self.rows)]  # Stored bit of each cell [WL][BL]
+        self.patternbytes = 1                     # Bytes in a CAM read pattern (set by 'W')
+        self.commands = 0                         # Number of programs run
+        self._random = random.Random(seed)
+        self._master = None
+        self._slave = None
+        self._inbuf = bytearray()
+        self._running = False
+        self._thread = None
+
+    def open(self):
+        """Opens the pseudo-terminal and returns the port name for the host"""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        return os.ttyname(self._slave)
+
+    def start(self):
+        """Opens the pseudo-terminal, runs the simulator in a background thread and returns the port name"""
+        port = self.open()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return port
+
+    def stop(self):
+        """Stops the simulator and closes the pseudo-terminal"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+        return
+
+    def run(self):
+        """Runs setup() then loop() until stopped"""
+        self._running = True
+        try:
+            self.setup()
+            while self._running:
+                self.loop()
+        except OSError:
+            self._running = False
+        return
+
+    # Arduino core functions
+
+    def delay(self, ms):
+        time.sleep(ms/1000.0*self.timescale)
+
+    def available(self, timeout=0.0):
+        """Returns the number of received bytes, waiting up to timeout [s] for more"""
+        if select.select([self._master], [], [], timeout)[0]:
+            self._inbuf += os.read(self._master, 4096)
+        return len(self._inbuf)
+
+    def read(self, size, timeout=None):
+        """Returns up to size received bytes (like Serial.readBytes with a 1 s timeout, scaled unless given)"""
+        deadline = time.time() + (1.0*self.timescale if timeout is None else timeout)
+        while self.available() < size and time.time() < deadline:
+            self.available(0.01)
+        data = self._inbuf[:size]
+        del self._inbuf[:size]
+        return data
+
+    def write(self, data):
+        """Sends bytes to the host, paced at the serial bit rate"""
+        data = bytearray(data)
+        os.write(self._master, bytes(data))
+        if self.baud:
+            time.sleep(len(data)*10.0/self.baud*self.timescale)
+        return
+
+    def println(self, text):
+        self.write(text.encode('ascii') + b'\r\n')
+
+    # memory_test_v3.ino
+
+    def setup(self):
+        self.delay(1600)                          # blinks LED 4 times
+        self.delay(1000)
+        self.establishContact(b'A')
+
+    def loop(self):
+        if self.available(0.05*self.timescale + 0.001) >= 8:
+            command = self.read(8)
+            if command[0:1] == b'B':
+                self.runbatch(command[1])
+            elif command[0:1] == b'W':
+                self.setwidth(command[1], command[2])
+            elif command[0:1] == b'S':
+                self.setbaud(command[1])
+            else:
+                command += self.read(self.extrabytes(command))
+                if self.runcommand(command) == 3:
+                    self.println("ADDRESS ERROR")
+            self.delay(1000)
+            self.establishContact(b'Z')
+
+    def establishContact(self, contact):
+        while self._running and self.available() == 0:
+            self.write(contact)
+            self.delay(1000)
+
+    def extrabytes(self, command):
+        """Returns the number of pattern bytes following a command"""
+        if command[0:1] in (b'1', b'6', b'7', b'8'):
+            return self.patternbytes - 1
+        return 0
+
+    def setwidth(self, cols, rows):
+        if cols < 1 or cols > self.cols or rows < 1 or rows > self.rows:
+            cols = rows = 0
+        else:
+            self.patternbytes = (cols + 7)//8
+        self.println("WIDTH {:d} {:d}".format(cols, rows))
+
+    def setbaud(self, index):
+        """Switches rate and echoes the test block, keeping the rate if the host replies 'K'
+
+        Rates above maxbaud corrupt the echo. The rate only changes the
+        output pacing (if any).
+        """
+        if index >= len(self.baudrates):
+            self.println("BAUD 0")
+            return
+        baud = self.baudrates[index]
+        self.println("BAUD {:d}".format(baud))
+        block = self.read(self.linktestbytes, 1.0)
+        if self.maxbaud is not None and baud > self.maxbaud and block:
+            block[0] ^= 0xFF
+        payload = bytes(block)
+        checksum = sum(bytearray(payload)) & 0xFFFF
+        paced, self.baud = self.baud, self.baud and baud
+        self.write(b'#' + struct.pack('<H', len(payload)) + payload + struct.pack('<H', checksum))
+        if self.read(1, 1.0) == b'K':
+            self.linkbaud = baud
+        else:
+            self.baud = paced
+        return
+
+    def runcommand(self, command):
+        """Runs one command (8 bytes and any pattern bytes) and returns status (0 run, 1 unknown program, 3 outside the array)"""
+        prog = command[0:1]
+        buf = list(bytearray(command[1:8]))
+        if prog in (b'1', b'6', b'7', b'8') and buf[0] >= self.rows:
+            return 3
+        if prog in (b'3', b'4', b'5') and (buf[0] >= self.rows or buf[1] >= self.cols):
+            return 3
+        pattern = buf[2]
+        for k, b in enumerate(bytearray(command[8:])):
+            pattern |= b << 8*(k + 1)
+        self.commands += 1
+        if prog == b'1':
+            self.camread(buf[0], pattern, buf[3], buf[4], buf[6], 0)
+        elif prog == b'2':
+            self.formarray(buf[4], buf[5], buf[6])
+        elif prog == b'3':
+            self.writeZERO(buf[0], buf[1], buf[3], buf[5], buf[6])
+        elif prog == b'4':
+            self.writeONE(buf[0], buf[1], buf[3], buf[5], buf[6])
+        elif prog == b'5':
+            self.stdread_rewrite(buf[0], buf[1], buf[3], buf[3], buf[5], buf[6])
+        elif prog == b'6':
+            self.camread(buf[0], pattern, buf[3], buf[4], buf[6], 1)
+        elif prog == b'7':
+            self.camread(buf[0], pattern, buf[3], buf[4], buf[6], 2)
+        elif prog == b'8':
+            self.camreadadc(buf[0], pattern, buf[3], buf[4], buf[6], buf[1], buf[5]*10)
+        else:
+            self.commands -= 1
+            return 1
+        return 0
+
+    def runbatch(self, count):
+        commands = []
+        for k in range(count):
+            command = self.read(8)
+            extra = self.extrabytes(command) if len(command) == 8 else 0
+            command += self.read(extra)
+            if len(command) < 8 + extra:
+                self.println("BATCH TIMEOUT")
+                return
+            commands.append(command)
+        for k, command in enumerate(commands):
+            self.println("OP {:d}".format(k))
+            status = self.runcommand(command) if k < self.maxbatch else 2
+            self.println("ST {:d} {:d}".format(k, status))
+
+    # Memoryfunctions high level functions
+
+    def camread(self, line, pattern, t_pat, t_pre, t_gnd, output):
+        self.println("PREC...")
+        self.delay(t_pre)
+        ticks, counts = self.wordlineread(line, pattern)
+        if output == 2:
+            self.sendfeatures(ticks, counts)
+        elif output == 1:
+            self.sendframe(ticks, counts)
+        else:
+            self.write(b''.join("{:d},{:d}\n".format(t, v).encode('ascii') for t, v in zip(ticks, counts)))
+        self.delay(100)
+        self.gndall(t_gnd)
+
+    def camreadadc(self, line, pattern, t_pat, t_pre, t_gnd, prescale, count):
+        self.println("PREC...")
+        self.delay(t_pre)
+        if prescale < 4 or prescale > 7:
+            prescale = 4
+        if count < 1 or count > self.maxsamples:
+            count = self.maxsamples
+        counts = self.adcread(line, pattern, prescale, count)
+        payload = struct.pack('<{:d}H'.format(count + 1), 1 << prescale, *counts)
+        checksum = sum(bytearray(payload)) & 0xFFFF
+        self.write(b'#' + struct.pack('<H', len(payload)) + payload + struct.pack('<H', checksum))
+        self.delay(100)
+        self.gndall(t_gnd)
+
+    def formarray(self, t_form, loop, t_gnd):
+        for i in range(loop):
+            self.println("FORM...")
+            self.delay(t_form)
+            self.cells = [[0]*self.cols for w in range(self.rows)]
+        self.gndall(t_gnd)
+
+    def writeZERO(self, w, b, t_write, loop, t_gnd):
+        self._write(w, b, t_write, loop, t_gnd, 0)
+
+    def writeONE(self, w, b, t_write, loop, t_gnd):
+        self._write(w, b, t_write, loop, t_gnd, 1)
+
+    def stdread_rewrite(self, w, b, t_read, t_write, loop, t_gnd):
+        self.println("READ...")
+        self.delay(t_read)
+        self.delay(1000)
+        state = self._cell(w, b)
+        self.println("{:d}".format(state))
+        if state == 1:
+            for i in range(loop):
+                self.println("WRT1...")
+                self.delay(t_write)
+            self.gndall(t_gnd)
+        return state
+
+    def gndall(self, t):
+        self.println("GNDS...")
+        self.delay(t)
+
+    def sendframe(self, ticks, counts):
+        payload = b''.join(struct.pack('<IH', t, v) for t, v in zip(ticks, counts))
+        checksum = sum(bytearray(payload)) & 0xFFFF
+        self.write(b'#' + struct.pack('<H', len(payload)) + payload + struct.pack('<H', checksum))
+
+    def sendfeatures(self, ticks, counts):
+        tthreshold = 0xFFFFFFFF
+        area = 0
+        fixed = []
+        for j, (t, v) in enumerate(zip(ticks, counts)):
+            if tthreshold == 0xFFFFFFFF and v < counts[0]//2:
+                tthreshold = t
+            if j < len(ticks) - 1:
+                area += v*(ticks[j + 1] - t)
+            while len(fixed) < self.featuresamples and t >= (len(fixed) + 1)*self.featurestep:
+                fixed.append(v)
+        fixed += [0xFFFF]*(self.featuresamples - len(fixed))
+        payload = struct.pack('<III3H', tthreshold, ticks[-1], area, counts[0], min(counts), max(counts))
+        payload += struct.pack('<{:d}H'.format(self.featuresamples), *fixed)
+        checksum = sum(bytearray(payload)) & 0xFFFF
+        self.write(b'#' + struct.pack('<H', len(payload)) + payload + struct.pack('<H', checksum))
+
+    # Memory array model
+
+    def _cell(self, w, b):
+        if w < self.rows and b < self.cols:
+            return self.cells[w][b]
+        return 0
+
+    def _write(self, w, b, t_write, loop, t_gnd, state):
+        self.delay(100)
+        for i in range(loop):
+            self.println("WRT{:d}...".format(state))
+            self.delay(t_write)
+            if w < self.rows and b < self.cols:
+                self.cells[w][b] = state
+        self.delay(100)
+        self.gndall(t_gnd)
+
+    def discharge_rate(self, line, pattern):
+        """Returns the word line discharge rate [1/ms] for a pattern applied to the bit lines"""
+        rate = 0.0
+        for y in range(self.cols):
+            if self._cell(line, y) == (pattern >> y) & 1:
+                rate += 1.0/self.tmatch
+            else:
+                rate += 1.0/self.tmismatch
+        return rate
+
+    def adcread(self, line, pattern, prescale, count):
+        """Returns ADC counts of the discharging word line sampled every 13 x 2^prescale / 16 us"""
+        rate = self.discharge_rate(line, pattern)
+        period = 13.0*(1 << prescale)/16.0
+        counts = []
+        for i in range(count):
+            v = self.vprecharge*math.exp(-rate*i*period*0.001) + self._random.gauss(0.0, self.noise*5.0/1023)
+            counts.append(min(1023, max(0, int(round(v*1023/5.0)))))
+        self.delay(count*period*0.001)
+        return counts
+
+    def wordlineread(self, line, pattern):
+        """Returns timer2 counts (0.5 us) and ADC counts of the discharging word line"""
+        rate = self.discharge_rate(line, pattern)
+        ticks = []
+        counts = []
+        t = 0
+        for i in range(self.samples):
+            ticks.append(t)
+            v = self.vprecharge*math.exp(-rate*t*0.0005) + self._random.gauss(0.0, self.noise*5.0/1023)
+            counts.append(min(1023, max(0, int(round(v*1023/5.0)))))
+            t += 32 + self._random.randint(0, 3)  # ~16 us per polled analogRead
+        self.delay(t*0.0005)
+        return ticks, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Arduino for MemTest")
+    parser.add_argument('--arraysize', default='3', help="memory array size N (N x N) or RxC (default 3)")
+    parser.add_argument('--timescale', type=float, default=1.0, help="delay multiplier, e.g. 0.01 for 100x real time")
+    parser.add_argument('--baud', type=int, default=115200, help="serial bit rate for output pacing (0 for none)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for ADC noise")
+    parser.add_argument('--max-baud', dest='maxbaud', type=int, default=None, help="fastest serial rate that passes the link test (default all)")
+    args = parser.parse_args()
+
+    rows, sep, cols = args.arraysize.lower().partition('x')
+    sim = VirtualArduino(arraysize=(int(rows), int(cols or rows)), timescale=args.timescale, baud=args.baud or None, seed=args.seed, maxbaud=args.maxbaud)
+    port = sim.start()
+    sys.stdout.write("Virtual Arduino on {:s}\n".format(port))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        sim.stop()
+    return
+
+
+if __name__ == "__main__":
+    sys.exit(main())
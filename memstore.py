@@ -0,0 +1,257 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memstore.py
+Result stores: in memory (ResultStore) and binary on disk (.npy samples with a JSON sidecar of headers)
+
+ResultStore keeps one record per capture with the header parameters
+parsed into columns and the samples of every capture in one contiguous
+(n, 2) buffer addressed by row offset and length. Records are indexed by
+word line, pattern and run, so a subset is selected without scanning.
+
+On disk the samples of all blocks are written one after another into a
+single (n, 2) float64 .npy file (time [us], voltage [V]) with one bulk
+write per block. The sidecar .json holds the 7 line header of each block
+with its row offset and length. Loading memory-maps the .npy so a large
+campaign can be sliced without reading it all.
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import os
+import re
+import json
+import numpy as np
+
+__author__ = "Jeremy Smith"
+__version__ = "1.1"
+
+# Sample array type on disk
+sampledtype = np.dtype('<f8')
+# Columns of a ResultStore record (-1 where the header has no value)
+recorddtype = np.dtype([('run', '<i4'), ('program', '<i4'), ('wordline', '<i4'), ('bitline', '<i4'), ('pattern', '<i8'),
+                        ('rtime', '<i4'), ('ftime', '<i4'), ('loop', '<i4'), ('gtime', '<i4'),
+                        ('offset', '<i8'), ('length', '<i8')])
+# Header lines written by memcore.MemTest and the record columns they fill
+headerfields = [(re.compile(r'Program:\s*(\d+)'), (('program', 10),)),
+                (re.compile(r'WL\s+(\d+)\s+BL\s+(\d+)'), (('wordline', 10), ('bitline', 10))),
+                (re.compile(r'Data Pattern:\s*([01]+)'), (('pattern', 2),)),
+                (re.compile(r'Read/write time:\s*(\d+)'), (('rtime', 10),)),
+                (re.compile(r'Form/precharge time:\s*(\d+)'), (('ftime', 10),)),
+                (re.compile(r'Number of read/write pulses:\s*(\d+)'), (('loop', 10),)),
+                (re.compile(r'Ground time:\s*(\d+)'), (('gtime', 10),))]
+
+
+def splitblocks(runresult):
+    """Returns (header, data) pairs from an alternating header/data buffer"""
+    blocks = []
+    header = []
+    for block in runresult:
+        if isinstance(block, np.ndarray):
+            blocks.append((header, block))
+            header = []
+        else:
+            header = list(block)
+    return blocks
+
+
+def parseheader(header):
+    """Returns a dictionary of the record columns found in header lines"""
+    fields = {}
+    for line in header:
+        for pattern, columns in headerfields:
+            match = pattern.search(line)
+            if match is not None:
+                for (column, base), text in zip(columns, match.groups()):
+                    fields[column] = int(text, base)
+                break
+    return fields
+
+
+class ResultStore(object):
+    """Class for results in memory with parsed header columns and indexes
+
+    records is a structured array (recorddtype) of one row per capture,
+    headers the header lines of each and store[i] the (n, 2) samples of
+    capture i, a view into one contiguous buffer. Both grow by doubling so
+    appending stays cheap. select() returns the records of a word line,
+    pattern and/or run from the indexes, and runresult() gives the
+    alternating header/data buffer used by writeresults and savebinary.
+    With keepruns set, newrun() drops all but the last keepruns runs
+    (counting the new one); the journal keeps every run on disk.
+    """
+    def __init__(self, capacity=64, rows=32768, keepruns=None):
+        self._capacity = capacity                 # Initial number of records
+        self._rows = rows                         # Initial number of sample rows
+        self.keepruns = keepruns                  # Runs kept in memory (None for all)
+        self.run = 0                              # Run number given to new records
+        self._clear()
+
+    def _clear(self):
+        """Empties the store at its initial size"""
+        self._records = np.zeros(self._capacity, dtype=recorddtype)
+        self._samples = np.empty((self._rows, 2), dtype=sampledtype)
+        self._count = 0                           # Number of records
+        self._used = 0                            # Number of sample rows
+        self.headers = []                         # Header lines of each record
+        self._index = {'wordline': {}, 'pattern': {}, 'run': {}}
+        return
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        record = self._records[i]
+        return self._samples[record['offset']:record['offset'] + record['length']]
+
+    def __iter__(self):
+        """Yields (header, data) for each record"""
+        for i in range(self._count):
+            yield self.headers[i], self[i]
+
+    @property
+    def records(self):
+        """Returns the records (a view, valid until the next append)"""
+        return self._records[:self._count]
+
+    def newrun(self):
+        """Starts a new run number for the following records and returns it"""
+        if self._count and self._records[self._count - 1]['run'] == self.run:
+            self.run += 1
+        if self.keepruns is not None:
+            self.dropruns(self.run - self.keepruns + 1)
+        return self.run
+
+    def dropruns(self, first):
+        """Drops the records of runs before run number first and shrinks the buffers"""
+        keep = np.nonzero(self.records['run'] >= first)[0]
+        if len(keep) == self._count:
+            return
+        kept = [(self.headers[i], int(self._records[i]['run']), np.array(self[i])) for i in keep]
+        run = self.run
+        self._clear()
+        for header, self.run, data in kept:
+            self.append(header, data)
+        self.run = run
+        return
+
+    def append(self, header, data):
+        """Stores a capture and returns its record number"""
+        data = np.asarray(data, dtype=sampledtype).reshape(-1, 2)
+        if self._count == len(self._records):
+            self._records = np.resize(self._records, 2*len(self._records))
+        if self._used + len(data) > len(self._samples):
+            samples = np.empty((max(2*len(self._samples), self._used + len(data)), 2), dtype=sampledtype)
+            samples[:self._used] = self._samples[:self._used]
+            self._samples = samples
+        self._samples[self._used:self._used + len(data)] = data
+
+        i = self._count
+        record = self._records[i]
+        for column in recorddtype.names:
+            record[column] = -1
+        for column, value in parseheader(header).items():
+            record[column] = value
+        record['run'] = self.run
+        record['offset'] = self._used
+        record['length'] = len(data)
+        for column, index in self._index.items():
+            index.setdefault(int(record[column]), []).append(i)
+        self.headers.append(list(header))
+        self._count += 1
+        self._used += len(data)
+        return i
+
+    def select(self, wordline=None, pattern=None, run=None):
+        """Returns the record numbers (in order) matching every value given"""
+        lists = [self._index[column].get(value, []) for column, value in
+                 (('wordline', wordline), ('pattern', pattern), ('run', run)) if value is not None]
+        if not lists:
+            return np.arange(self._count)
+        lists.sort(key=len)
+        selected = set(lists[0])
+        for other in lists[1:]:
+            selected.intersection_update(other)
+        return np.array(sorted(selected), dtype=np.int64)
+
+    def runresult(self, selection=None):
+        """Returns an alternating header/data buffer of the selected records (all by default, data as views)"""
+        buf = []
+        for i in (range(self._count) if selection is None else selection):
+            buf.append(self.headers[i])
+            buf.append(self[i])
+        return buf
+
+    @classmethod
+    def fromrunresult(cls, runresult):
+        """Returns a ResultStore of an alternating header/data buffer"""
+        store = cls()
+        for header, data in splitblocks(runresult):
+            store.append(header, data)
+        return store
+
+
+def savebinary(runresult, basename, pathname):
+    """Writes results/basename.npy and results/basename.json and returns the .npy path"""
+    # Create a results folder if it does not exist
+    if "results" not in os.listdir(pathname):
+        os.mkdir(os.path.join(pathname, "results"))
+    npyname = os.path.join(pathname, "results", basename + ".npy")
+    jsonname = os.path.join(pathname, "results", basename + ".json")
+
+    blocks = [(header, np.ascontiguousarray(data, dtype=sampledtype).reshape(-1, 2)) for header, data in splitblocks(runresult)]
+    total = sum(len(data) for header, data in blocks)
+    index = []
+    with open(npyname, 'wb') as outfile:
+        np.lib.format.write_array_header_1_0(outfile, {'descr': np.lib.format.dtype_to_descr(sampledtype),
+                                                       'fortran_order': False, 'shape': (total, 2)})
+        offset = 0
+        for header, data in blocks:
+            data.tofile(outfile)                # One bulk write per block
+            index.append({'header': header, 'offset': offset, 'length': len(data)})
+            offset += len(data)
+    with open(jsonname, 'w') as outfile:
+        json.dump({'version': __version__, 'samples': os.path.basename(npyname), 'blocks': index}, outfile, indent=1)
+    return npyname
+
+
+class BinaryResults(object):
+    """Class for reading a binary result store with memory-mapped samples
+
+    results[i] returns the (n, 2) samples of block i as a view into the
+    memory map and results.headers[i] its header lines.
+    """
+    def __init__(self, filename):
+        basename = os.path.splitext(filename)[0]
+        with open(basename + ".json") as infile:
+            index = json.load(infile)
+        self.samples = np.load(os.path.join(os.path.dirname(basename), index['samples']), mmap_mode='r')
+        self.headers = [block['header'] for block in index['blocks']]
+        self.offsets = np.array([block['offset'] for block in index['blocks']], dtype=np.int64)
+        self.lengths = np.array([block['length'] for block in index['blocks']], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __getitem__(self, i):
+        return self.samples[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+
+    def __iter__(self):
+        """Yields (header, data) for each block"""
+        for i in range(len(self)):
+            yield self.headers[i], self[i]
+
+    def runresult(self):
+        """Returns an alternating header/data buffer as MainApp builds (data still memory-mapped)"""
+        buf = []
+        for header, data in self:
+            buf.append(header)
+            buf.append(data)
+        return buf
+
+
+def loadbinary(filename):
+    """Returns BinaryResults for a .npy or .json file written by savebinary"""
+    return BinaryResults(filename)
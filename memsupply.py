@@ -0,0 +1,366 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+memsupply.py
+Voltage source drivers for switching between the write and read voltages
+
+Programs call setvoltage('write') or setvoltage('read'), which returns
+once the source has settled. ManualSupply asks the user and waits for
+resume() (the Continue button) on an Event, ScpiSupply drives a bench
+supply with SCPI commands over a serial port or TCP, and FakeInstrument
+is a local SCPI instrument for running without hardware:
+    python memsupply.py [--port 5025]
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import sys
+import abc
+import time
+import socket
+import argparse
+import threading
+import serial
+
+__author__ = "Jeremy Smith"
+__version__ = "1.0"
+
+# Voltage modes used by the programs
+modes = ('write', 'read')
+
+
+class SupplyError(IOError):
+    """Raised when the voltage source does not respond or does not settle"""
+    pass
+
+
+# Abstract base class for both Python 2 and 3
+ABC = abc.ABCMeta('ABC', (object,), {})
+
+
+class VoltageSource(ABC):
+    """Base class for a voltage source with write and read levels [V]
+
+    setvoltage does nothing if the source is already at the requested
+    mode, so a run only waits when the voltage actually changes.
+    """
+    # True if the voltage is changed by hand
+    manual = False
+
+    def __init__(self, write=None, read=None):
+        self.levels = {'write': write, 'read': read}
+        self.mode = None                          # Mode the source is set to
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        return
+
+    def close(self):
+        self.mode = None
+        return
+
+    def setvoltage(self, mode):
+        """Sets the source to the write or read level and returns when it has settled"""
+        if mode not in modes:
+            raise ValueError("voltage mode must be one of {:s}".format(", ".join(modes)))
+        if mode == self.mode:
+            return
+        self.apply(mode)
+        self.mode = mode
+        return
+
+    @abc.abstractmethod
+    def apply(self, mode):
+        """Changes the source to the level of mode and returns when it has settled"""
+        return
+
+    def arm(self):
+        """Prepares for a change asked for before setvoltage is called (only manual sources need it)"""
+        return
+
+    def describe(self, mode):
+        """Returns a message describing the change to mode"""
+        if self.levels[mode] is None:
+            return "Setting {:s} voltage".format(mode.upper())
+        return "Setting {:s} voltage: {:.3f} V".format(mode.upper(), self.levels[mode])
+
+
+class ManualSupply(VoltageSource):
+    """Voltage changed by hand
+
+    prompt (if set) is called to ask the user, then setvoltage waits on an
+    Event until resume() is called. With confirm False it does not wait.
+    The voltage is asked for at every step since it cannot be checked. A
+    caller that asks the user itself before setvoltage calls arm() first,
+    so a resume() that comes before setvoltage is not lost.
+    """
+    manual = True
+
+    def __init__(self, prompt=None, confirm=True):
+        VoltageSource.__init__(self)
+        self.prompt = prompt                      # Called to ask the user to change the voltage
+        self.confirm = confirm                    # Wait for resume() after asking
+        self._resumed = threading.Event()
+        self._armed = False                       # Event cleared by arm() for the next setvoltage
+
+    def setvoltage(self, mode):
+        self.mode = None                          # Always ask, the voltage cannot be checked
+        VoltageSource.setvoltage(self, mode)
+        return
+
+    def arm(self):
+        """Clears any earlier resume() so the next setvoltage waits for a new one"""
+        self._resumed.clear()
+        self._armed = True
+        return
+
+    def apply(self, mode):
+        if not self._armed:
+            self._resumed.clear()
+        self._armed = False
+        if self.prompt is not None:
+            self.prompt()
+        if self.confirm:
+            self._resumed.wait()
+        return
+
+    def resume(self):
+        """Continues a run waiting for the voltage to be changed"""
+        self._resumed.set()
+        return
+
+
+class ScpiSupply(VoltageSource):
+    """Bench supply controlled with SCPI commands
+
+    address is 'tcp:HOST:PORT' or 'serial:DEVICE[:BAUD]'. After setting a
+    level the supply is asked for *OPC? and its output measured until it
+    is within tolerance [V] of the level, then settle [s] is waited.
+    """
+    def __init__(self, address, write, read, channel=None, tolerance=0.02, settle=0.05, timeout=5.0):
+        VoltageSource.__init__(self, write, read)
+        self.address = address                    # Instrument address
+        self.channel = channel                    # Output channel (None for single output supplies)
+        self.tolerance = tolerance                # Allowed difference of measured output [V]
+        self.settle = settle                      # Extra wait after reaching the level [s]
+        self.timeout = timeout                    # Maximum wait for a reply or for settling [s]
+        self.identity = None                      # *IDN? reply
+        self._link = None
+
+    def open(self):
+        """Connects to the instrument and turns the output on"""
+        if self._link is not None:
+            return
+        kind, _, rest = self.address.partition(':')
+        if kind == 'tcp':
+            host, _, port = rest.rpartition(':')
+            self._link = _TcpLink(host, int(port), self.timeout)
+        elif kind == 'serial':
+            device, _, baud = rest.partition(':')
+            self._link = _SerialLink(device, int(baud or 9600), self.timeout)
+        else:
+            raise ValueError("SCPI address must be tcp:HOST:PORT or serial:DEVICE[:BAUD]")
+        self.identity = self.query("*IDN?")
+        if self.channel is not None:
+            self.write("INST:NSEL {:d}".format(self.channel))
+        self.write("OUTP ON")
+        return
+
+    def close(self):
+        if self._link is not None:
+            self._link.close()
+            self._link = None
+        VoltageSource.close(self)
+        return
+
+    def write(self, command):
+        self._link.write(command)
+        return
+
+    def query(self, command):
+        self._link.write(command)
+        return self._link.readline()
+
+    def apply(self, mode):
+        self.open()
+        level = self.levels[mode]
+        self.write("VOLT {:.4f}".format(level))
+        self.query("*OPC?")
+        deadline = time.time() + self.timeout
+        while abs(float(self.query("MEAS:VOLT?")) - level) > self.tolerance:
+            if time.time() > deadline:
+                raise SupplyError("Supply did not settle at {:.3f} V".format(level))
+            time.sleep(0.01)
+        time.sleep(self.settle)
+        return
+
+
+class _TcpLink(object):
+    """Line based SCPI connection over a TCP socket"""
+    def __init__(self, host, port, timeout):
+        try:
+            self._sock = socket.create_connection((host, port), timeout)
+        except (OSError, socket.error) as e:
+            raise SupplyError("Cannot connect to supply at {:s}:{:d} ({:s})".format(host, port, str(e)))
+        self._file = self._sock.makefile('rb')
+
+    def write(self, command):
+        self._sock.sendall(command.encode('ascii') + b'\n')
+
+    def readline(self):
+        try:
+            line = self._file.readline()
+        except socket.timeout:
+            line = b''
+        if not line:
+            raise SupplyError("No reply from supply")
+        return line.decode('ascii').strip()
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class _SerialLink(object):
+    """Line based SCPI connection over a serial port"""
+    def __init__(self, device, baud, timeout):
+        try:
+            self._ser = serial.Serial(device, baud, timeout=timeout)
+        except serial.SerialException as e:
+            raise SupplyError("Cannot open supply on {:s} ({:s})".format(device, str(e)))
+
+    def write(self, command):
+        self._ser.write(command.encode('ascii') + b'\n')
+
+    def readline(self):
+        line = self._ser.readline()
+        if not line.endswith(b'\n'):
+            raise SupplyError("No reply from supply")
+        return line.decode('ascii').strip()
+
+    def close(self):
+        self._ser.close()
+
+
+class FakeInstrument(object):
+    """Local single output SCPI supply on a TCP port for running without hardware
+
+    Understands *IDN?, *RST, *OPC?, INST:NSEL, OUTP ON|OFF, VOLT <v>,
+    VOLT? and MEAS:VOLT?. The output slews to a new level with time
+    constant tau [s] (0 while off). history holds every level set.
+    """
+    identity = "MemTest,FakeSupply,0,{:s}".format(__version__)
+
+    def __init__(self, host='127.0.0.1', port=0, tau=0.005):
+        self.tau = tau                            # Output slew time constant [s]
+        self.history = []                         # Levels set with VOLT
+        self._level = 0.0
+        self._start = 0.0                         # Output when the level was set
+        self._changed = time.time()
+        self._output = False
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(1)
+        self.address = "tcp:{:s}:{:d}".format(*self._server.getsockname()[:2])
+        self._thread = None
+
+    def start(self):
+        """Serves connections in a background thread and returns the address"""
+        self._thread = threading.Thread(target=self.serve)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        self._server.close()
+        return
+
+    def voltage(self):
+        """Returns the present output voltage [V]"""
+        if not self._output:
+            return 0.0
+        if self.tau <= 0:
+            return self._level
+        fraction = 1.0 - 2.718281828459045**(-(time.time() - self._changed)/self.tau)
+        return self._start + (self._level - self._start)*fraction
+
+    def serve(self):
+        while True:
+            try:
+                conn, peer = self._server.accept()
+            except (OSError, socket.error):
+                return
+            infile = conn.makefile('rb')
+            for line in infile:
+                reply = self.handle(line.decode('ascii').strip())
+                if reply is not None:
+                    conn.sendall(reply.encode('ascii') + b'\n')
+            infile.close()
+            conn.close()
+
+    def handle(self, command):
+        """Returns the reply to one SCPI command (None for no reply)"""
+        header, _, argument = command.partition(' ')
+        header = header.upper()
+        if header == '*IDN?':
+            return self.identity
+        elif header == '*OPC?':
+            return "1"
+        elif header == '*RST':
+            self._output = False
+            self._level = self._start = 0.0
+        elif header in ('VOLT', 'SOUR:VOLT'):
+            self._start = self.voltage()
+            self._level = float(argument)
+            self._changed = time.time()
+            self.history.append(self._level)
+        elif header in ('VOLT?', 'SOUR:VOLT?'):
+            return "{:.4f}".format(self._level)
+        elif header == 'MEAS:VOLT?':
+            return "{:.4f}".format(self.voltage())
+        elif header in ('OUTP', 'OUTP:STAT'):
+            self._start = self.voltage()
+            self._output = argument.upper() in ('ON', '1')
+            self._changed = time.time()
+        return None
+
+
+def makesupply(spec, write=None, read=None):
+    """Returns a voltage source for spec: 'manual', 'fake' or a ScpiSupply address"""
+    if spec in (None, '', 'manual'):
+        return ManualSupply()
+    if spec == 'fake':
+        spec = FakeInstrument().start()
+    if write is None or read is None:
+        raise ValueError("write and read voltages must be given for a programmable supply")
+    return ScpiSupply(spec, write, read)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SCPI supply for MemTest")
+    parser.add_argument('--port', type=int, default=5025, help="TCP port (default 5025)")
+    parser.add_argument('--tau', type=float, default=0.005, help="output slew time constant [s]")
+    args = parser.parse_args()
+
+    instrument = FakeInstrument(port=args.port, tau=args.tau)
+    sys.stdout.write("Fake supply on {:s}\n".format(instrument.start()))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        instrument.stop()
+    return
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+mplcanvas.py
+Matplotlib canvas for the results tab (imported only when plotting is used)
+
+Created by Jeremy Smith
+University of California, Berkeley
+j-smith@eecs.berkeley.edu
+"""
+
+import numpy as np
+from PyQt4 import QtGui
+from PyQt4.QtCore import QTimer
+from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+__author__ = "Jeremy Smith"
+__version__ = "1.1"
+
+
+def decimate(x, y, maxpoints):
+    """Returns x, y reduced to about maxpoints by keeping the min and max of y in each bin"""
+    n = len(y)
+    if n <= maxpoints:
+        return x, y
+    bins = max(1, maxpoints//2)
+    size = n//bins
+    rows = np.asarray(y[:bins*size]).reshape(bins, size)
+    start = np.arange(bins)*size
+    keep = np.sort(np.concatenate((start + rows.argmin(axis=1), start + rows.argmax(axis=1), [n - 1])))
+    return np.asarray(x)[keep], np.asarray(y)[keep]
+
+
+class MpltCanvas(FigureCanvas):
+    """FigureCanvasAgg for Matplotlib figure
+
+    Curves are kept as a pool of Line2D artists that are updated with
+    set_data and hidden when not in use, so adding a curve never clears
+    the axes. At most maxlines curves are shown; beyond that the oldest
+    curve's line is reused, so the pool never holds more than maxlines
+    artists. Curves longer than maxpoints are decimated (min/max per bin)
+    and redraws are coalesced to one draw_idle per interval [ms]. Must only
+    be used from the GUI thread.
+    """
+    def __init__(self, parent=None, width=4, height=4, dpi=100, maxpoints=2000, maxlines=256, interval=50):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvas.__init__(self, fig)
+        self.axes = fig.add_subplot(111)
+        self.setParent(parent)
+
+        self.maxpoints = maxpoints
+        self.maxlines = maxlines
+        self._lines = []                          # Line2D pool
+        self._shown = 0                           # Number of lines in use
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.redraw)
+
+        FigureCanvas.setSizePolicy(self, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Expanding)
+        FigureCanvas.updateGeometry(self)
+
+    def display_plot(self, x, y):
+        """Adds a curve, reusing a hidden line if there is one or the oldest line if maxlines are shown"""
+        x, y = decimate(x, y, self.maxpoints)
+        if self._shown >= self.maxlines:
+            line = self._lines.pop(0)
+            line.set_data(x, y)
+            self._lines.append(line)
+            self._shown -= 1                      # Replaces the oldest curve
+        elif self._shown < len(self._lines):
+            line = self._lines[self._shown]
+            line.set_data(x, y)
+            line.set_visible(True)
+        else:
+            line, = self.axes.plot(x, y)
+            self._lines.append(line)
+        self._shown += 1
+        self.request_draw()
+
+    def clear_plot(self):
+        """Hides all curves (the lines are kept for reuse)"""
+        for line in self._lines:
+            line.set_visible(False)
+        self._shown = 0
+        self.request_draw()
+
+    def request_draw(self):
+        """Schedules a redraw unless one is already pending"""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def redraw(self):
+        """Rescales to the visible curves and draws when the event loop is idle"""
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+        self.draw_idle()
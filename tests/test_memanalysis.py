@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from memanalysis import features, stack, hamming, Calibration, calibrate, distancetable
+from memstore import ResultStore
+
+# Discharge rate [1/us] of a word line with d mismatched cells
+rates = [0.0002*(0.2 + d) for d in range(4)]
+
+
+def curve(distance, samples=400, noise=0.0, rng=None):
+    t = np.arange(samples)*16.0
+    v = 2.0*np.exp(-rates[distance]*t)
+    if rng is not None:
+        v = v + rng.normal(0.0, noise, size=samples)
+    return np.column_stack((t, v))
+
+
+def run(word, rng):
+    """Returns an alternating header/data buffer of CAM reads of every pattern against word (bit line 0 first)"""
+    buf = []
+    for pattern in range(2**len(word)):
+        buf.append(["Program: 1 camread", "Address: WL 1   BL 0", "Data Pattern: {:03b}".format(pattern)])
+        buf.append(curve(int(hamming([pattern], word)[0]), noise=0.005, rng=rng))
+    return buf
+
+
+def test_hamming():
+    assert list(hamming(range(8), '100')) == [1, 0, 2, 1, 2, 1, 3, 2]
+
+
+def test_features():
+    t, v = stack([curve(0), curve(3)[:200]])
+    assert t.shape == (2, 400) and np.isnan(v[1, 200:]).all()
+    f = features(t, v)
+    np.testing.assert_allclose(f['v0'], 2.0)
+    np.testing.assert_allclose(f['tau'], [1.0/rates[0], 1.0/rates[3]], rtol=1e-6)
+    assert np.isnan(f['ttt'][0])              # Never falls to half within the capture
+    assert f['ttt'][1] == pytest.approx(np.log(2)/rates[3], rel=0.01)
+    assert (f['slope'] < 0).all()
+
+
+def test_classify_from_calibration():
+    rng = np.random.RandomState(0)
+    calibration = calibrate(run('000', rng), '000')
+    assert calibration.arraysize == 3
+    np.testing.assert_allclose(calibration.rates, rates, rtol=0.05)
+    table = distancetable(ResultStore.fromrunresult(run('101', rng)), calibration)
+    assert list(table['wordline']) == [1]*8
+    assert list(table['pattern']) == list(range(8))
+    assert list(table['distance']) == list(hamming(range(8), '101'))
+
+
+def test_calibration_fills_missing_distances():
+    calibration = Calibration.fromfeatures([1.0/rates[0], 1.0/rates[2]], [0, 2], 3)
+    np.testing.assert_allclose(calibration.rates, rates)
+    assert list(calibration.classify([1.0/rates[1], np.inf, 1.0/rates[3]])) == [1, 0, 3]
+    with pytest.raises(ValueError):
+        Calibration.fromfeatures([np.nan], [0], 3)
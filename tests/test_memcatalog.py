@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pytest
+from memcatalog import Catalog, scanblocks
+from memcore import writeresults
+
+
+def header(wordline, pattern, ftime=5):
+    return ["Program: 1 camread", "Address: WL {:d}   BL 0".format(wordline), "Data Pattern: {:s}".format(pattern),
+            "Read/write time: 100 ms", "Form/precharge time: {:d} ms".format(ftime), "Number of read/write pulses: 1",
+            "Ground time: 100 ms"]
+
+
+def samples(rows, value):
+    return np.column_stack((np.arange(rows)*0.5, np.full(rows, value)))
+
+
+def run(wordline, ftime=5):
+    buf = []
+    for pattern in range(4):
+        buf.append(header(wordline, "{:02b}".format(pattern), ftime))
+        buf.append(samples(5 + pattern, wordline + 0.25*pattern))
+    return buf
+
+
+def test_scanblocks(tmp_path):
+    filename = writeresults(run(0), "a.txt", str(tmp_path))
+    blocks = scanblocks(filename)
+    assert [b[0] for b in blocks] == [header(0, "{:02b}".format(p)) for p in range(4)]
+    assert [b[3] for b in blocks] == [5, 6, 7, 8]
+
+
+def test_scan_and_select(tmp_path):
+    pathname = str(tmp_path)
+    writeresults(run(0), "a.txt", pathname)
+    writeresults(run(1, ftime=10), "b.txt", pathname)
+    with Catalog(pathname) as catalog:
+        assert catalog.scan() == (2, 0)
+        assert catalog.scan() == (0, 0)
+        rows = catalog.select(wordline=1, pattern='10')
+        assert [(row['name'], row['block']) for row in rows] == [('b.txt', 2)]
+        np.testing.assert_allclose(catalog.load(rows[0]), samples(7, 1.5))
+        assert catalog.select(pattern='010') == []
+        assert len(catalog.select(pattern=2)) == 2
+        assert len(catalog.select(ftime=5)) == 4
+        assert len(catalog.select(filename='a.txt', pattern=3)) == 1
+        buf = catalog.find(wordline=0, pattern='11')
+        assert buf[0] == header(0, '11')
+        np.testing.assert_allclose(buf[1], samples(8, 0.75))
+        with pytest.raises(ValueError):
+            catalog.select(colour=1)
+
+
+def test_scan_changed_and_deleted(tmp_path):
+    pathname = str(tmp_path)
+    writeresults(run(0), "a.txt", pathname)
+    writeresults(run(1), "b.txt", pathname)
+    with Catalog(pathname) as catalog:
+        catalog.scan()
+        writeresults(run(2)[:4], "a.txt", pathname)
+        os.remove(os.path.join(pathname, "results", "b.txt"))
+        assert catalog.scan() == (1, 1)
+        assert [row['wordline'] for row in catalog.select()] == [2, 2]
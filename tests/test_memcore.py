@@ -0,0 +1,177 @@
+import pytest
+import memcli
+import memcore
+from memsim import VirtualArduino
+from memserial import SerialSession
+from memsupply import ManualSupply, ScpiSupply
+
+
+class NoWidthArduino(VirtualArduino):
+    """Firmware without the 'W' command (an unknown program: nothing is run or sent)"""
+    def setwidth(self, cols, rows):
+        return
+
+
+def runprogram(program, sim, supply=None):
+    """Runs program on sim and returns (completed, results, messages, errors)"""
+    results, messages, errors = [], [], []
+    program.port = sim.start()
+    program.supply = supply or ManualSupply(confirm=False)
+    program.linkrates = ()
+    program.result.connect(lambda data, header: results.append(data))
+    program.message.connect(messages.append)
+    program.errormesg.connect(errors.append)
+    try:
+        completed = program.run()
+    finally:
+        sim.stop()
+    return completed, results, messages, errors
+
+
+def test_checkwordline():
+    assert memcore.checkwordline(2, 3) is None
+    assert memcore.checkwordline(3, 3) == "Word line must be from 0 to 2 for a 3x3 array"
+    assert memcore.checkwordline(7, '8x2') is None
+    assert memcore.checkreadonly(5, 3, 5, 100) is not None
+    assert memcore.checkwriteread(0, 3, '101101101', 10, 5, 100) is None
+
+
+def test_address_error_gives_no_result():
+    sim = VirtualArduino(arraysize=3, timescale=0.01, seed=1)
+    session = SerialSession(sim.start())
+    errors = []
+    try:
+        test = memcore.MemTest(None, 'camread', wordline=5, width=3, binary=True)
+        test.errormesg.connect(errors.append)
+        test.runprogram(session)
+    finally:
+        session.close()
+        sim.stop()
+    assert errors == ["WL 5 BL 0 is outside the Arduino pin map (not run)"]
+    assert test.output() is None
+
+
+def test_readonly_pin_map_mismatch():
+    completed, results, messages, errors = runprogram(memcore.ReadOnly(0, 4, 5, 10), VirtualArduino(arraysize=3, timescale=0.01, seed=1))
+    assert not completed
+    assert results == []
+    assert any("cannot address a 4x4 array" in e for e in errors)
+    assert "MEMORY TEST COMPLETE" not in messages
+
+
+def test_readonly_old_firmware():
+    completed, results, messages, errors = runprogram(memcore.ReadOnly(0, 3, 5, 10), NoWidthArduino(arraysize=3, timescale=0.01, seed=1))
+    assert not completed
+    assert results == []
+    assert any("no 'W' command" in e for e in errors)
+
+
+def test_readonly_reads_every_pattern():
+    completed, results, messages, errors = runprogram(memcore.ReadOnly(1, 3, 5, 10), VirtualArduino(arraysize=3, timescale=0.01, seed=1))
+    assert completed
+    assert "MEMORY TEST COMPLETE" in messages
+    assert errors == []
+    assert len(results) == 8
+    assert all(len(data) > 0 for data in results)
+
+
+def test_supply_error():
+    supply = ScpiSupply('tcp:127.0.0.1:1', 3.0, 1.0)
+    completed, results, messages, errors = runprogram(memcore.ReadOnly(0, 3, 5, 10), VirtualArduino(arraysize=3, timescale=0.01, seed=1), supply)
+    assert not completed
+    assert any(e.strip().startswith("Voltage source error") for e in errors)
+    assert not any("Please Connect Arduino" in e for e in errors)
+    assert "MEMORY TEST COMPLETE" not in messages
+
+
+def test_cli_exit_status(tmp_path):
+    args = ['readonly', '--arraysize', '3', '--pre-pw', '1', '--gnd-pw', '1', '--supply', 'fake', '--write-v', '3', '--read-v', '1',
+            '--no-negotiate', '--yes', '--path', str(tmp_path)]
+    assert memcli.main(args + ['--port', str(tmp_path / 'nonexistent')]) == 1
+    assert memcli.main(args + ['--wline', '3', '--port', str(tmp_path / 'nonexistent')]) == 2
+    sim = VirtualArduino(arraysize=3, timescale=0.01, seed=1)
+    try:
+        assert memcli.main(args + ['--port', sim.start()]) == 0
+    finally:
+        sim.stop()
+
+
+def test_checkpattern():
+    assert memcore.checkpattern(3, '101101101') is None
+    assert memcore.checkpattern(3, '0b1101101') == "Pattern must be a binary number"
+    assert memcore.checkpattern(3, '1_1101101') == "Pattern must be a binary number"
+    assert memcore.checkpattern(3, '1011') == "Array size and write pattern do not match"
+
+
+def test_writelist_lines_up_with_cells():
+    program = memcore.ReadOnly(0, 3, 5, 10)
+    errors = []
+    program.errormesg.connect(errors.append)
+    cells, writelist = program.writelist([(0, 0, '1'), (0, 1, 'x'), (0, 2, '0')], 10, 5, 1)
+    assert cells == [(0, 0, '1'), (0, 2, '0')]
+    assert [test._program for test in writelist] == ['writeone', 'writezero']
+    assert [test._bitline for test in writelist] == [0, 2]
+    assert errors == ["Write pattern error - use 0 or 1"]
+
+
+def test_batch_routes_output_by_marker():
+    tests = [memcore.MemTest(None, 'writeone', wordline=0, bitline=k) for k in range(2)]
+    batch = memcore.MemBatch(tests)
+    messages = []
+    batch.message.connect(messages.append)
+    batch.reset()
+    batch._receive(["BATCH", "OP 0", "first", "ST 0 0", "between", "OP 1", "second", "ST 1 3", "OP 7"])
+    assert tests[0]._lines == ["first"]
+    assert tests[1]._lines == ["second"]
+    assert messages == ["BATCH", "between", "OP 7"]
+    assert batch.status == [0, 3]
+
+
+def test_batch_opens_its_programs_port():
+    sim = VirtualArduino(arraysize=3, timescale=0.01, seed=1)
+    port = sim.start()
+    errors = []
+    try:
+        tests = [memcore.MemTest(port, 'writeone', wordline=w, bitline=0) for w in (0, 5)]
+        batch = memcore.MemBatch(tests)
+        batch.errormesg.connect(errors.append)
+        batch.runprogram()
+    finally:
+        sim.stop()
+    assert batch.status == [0, 3]
+    assert errors == ["Batch program 1 failed: address outside the pin map"]
+
+
+def test_cellcache_pending():
+    cache = memcore.CellCache()
+    assert cache.pending(2, '1001') == [(0, 0, '1'), (0, 1, '0'), (1, 0, '0'), (1, 1, '1')]
+    cache.written(0, 0, '1')
+    cache.written(1, 0, '1')
+    assert cache.pending(2, '1001') == [(0, 1, '0'), (1, 0, '0'), (1, 1, '1')]
+    assert cache.skipped == 1
+    assert cache.word(0, 2) is None
+    cache.written(0, 1, '0')
+    assert cache.word(0, 2) == '10'
+    cache.invalidate(0)
+    assert cache.word(0, 2) is None
+    assert cache.pending(2, '1011') == [(0, 0, '1'), (0, 1, '0'), (1, 1, '1')]
+
+
+def test_writecells_skips_written_cells():
+    sim = VirtualArduino(arraysize=3, timescale=0.01, seed=1)
+    session = SerialSession(sim.start())
+    program = memcore.ReadOnly(0, 3, 5, 10)
+    program.supply = ManualSupply(confirm=False)
+    program.cells = memcore.CellCache()
+    try:
+        program.writecells(session, 3, '101101101', 10, 5, 1)
+        assert program.cells.sent == 9
+        assert program.cells.word(2, 3) == '101'
+        program.writecells(session, 3, '101101100', 10, 5, 1)
+        assert program.cells.sent == 10
+        assert program.cells.skipped == 8
+        program.writecells(session, 3, '101101100', 10, 5, 1)
+        assert program.cells.sent == 10
+    finally:
+        session.close()
+        sim.stop()
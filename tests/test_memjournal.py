@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pytest
+from memjournal import Journal, readjournal, magic
+
+
+def samples(n, start=0.0):
+    return np.column_stack((np.arange(n, dtype=float), np.arange(n, dtype=float) + start))
+
+
+def writejournal(filename, count):
+    with Journal(filename) as journal:
+        for k in range(count):
+            journal.append(["Run {:d}".format(k), "WL 0"], samples(10, k))
+    return os.path.getsize(filename)
+
+
+def test_roundtrip(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    writejournal(filename, 3)
+    buf = readjournal(filename)
+    assert len(buf) == 6
+    assert buf[0] == ["Run 0", "WL 0"]
+    np.testing.assert_array_equal(buf[5], samples(10, 2))
+
+
+def test_partial_record_ignored(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    full = writejournal(filename, 3)
+    with open(filename, 'r+b') as outfile:
+        outfile.truncate(full - 20)             # Record cut short by a crash
+    buf = readjournal(filename)
+    assert len(buf) == 4
+    np.testing.assert_array_equal(buf[3], samples(10, 1))
+
+
+def test_corrupt_record_ignored(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    full = writejournal(filename, 2)
+    with open(filename, 'r+b') as outfile:
+        outfile.seek(full - 12)
+        outfile.write(b'\xff\xff\xff\xff')
+    assert len(readjournal(filename)) == 2
+
+
+def test_read_does_not_truncate(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    full = writejournal(filename, 2)
+    with open(filename, 'ab') as outfile:
+        outfile.write(b'R\x05\x00')             # Record still being written by another run
+    readjournal(filename)
+    assert os.path.getsize(filename) == full + 3
+    with Journal(filename, readonly=True) as journal:
+        assert len(journal) == 2
+        with pytest.raises(IOError):
+            journal.append(["Run"], samples(2))
+    assert os.path.getsize(filename) == full + 3
+
+
+def test_reopen_truncates_and_appends(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    full = writejournal(filename, 2)
+    with open(filename, 'ab') as outfile:
+        outfile.write(b'R\x05\x00')
+    with Journal(filename) as journal:
+        assert len(journal) == 2
+        assert os.path.getsize(filename) == full
+        journal.append(["Run 2", "WL 0"], samples(10, 2))
+    buf = readjournal(filename)
+    assert len(buf) == 6
+    np.testing.assert_array_equal(buf[5], samples(10, 2))
+
+
+def test_not_a_journal(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    with open(filename, 'wb') as outfile:
+        outfile.write(b'XXXX' + magic)
+    with pytest.raises(IOError):
+        readjournal(filename)
+
+
+def test_bounded_cache_reads_back(tmp_path):
+    filename = str(tmp_path / "run.mtj")
+    with Journal(filename, cachesize=4) as journal:
+        for k in range(50):
+            journal.append(["Run {:d}".format(k)], samples(10, k))
+        buf = journal.runresult()
+        assert len(buf) == 100
+        for k in range(50):
+            assert buf[2*k] == ["Run {:d}".format(k)]
+            np.testing.assert_array_equal(buf[2*k + 1], samples(10, k))
+        journal.append(["Run 50"], samples(3, 50))
+        np.testing.assert_array_equal(journal[0][1], samples(10, 0))
+        np.testing.assert_array_equal(journal[-1][1], samples(3, 50))
@@ -0,0 +1,33 @@
+from memplan import graycode, bitlinechanges, orderwrites, planwriteread, planreadonly
+
+
+def test_graycode_changes_one_bit_line():
+    for cols in range(1, 6):
+        patterns = graycode(cols)
+        assert sorted(patterns) == list(range(2**cols))
+        assert bitlinechanges(patterns) == 2**cols - 1
+        assert all(bin(a ^ b).count('1') == 1 for a, b in zip(patterns, patterns[1:]))
+    assert graycode(3) == [0, 1, 3, 2, 6, 7, 5, 4]
+
+
+def test_orderwrites():
+    cells = [(1, 0, '1'), (0, 2, '1'), (1, 1, '0'), (0, 0, '0'), (0, 1, '1')]
+    assert orderwrites(cells) == [(0, 0, '0'), (0, 1, '1'), (0, 2, '1'), (1, 1, '0'), (1, 0, '1')]
+
+
+def test_planwriteread_savings():
+    plan, baseline = planwriteread((3, 3), '101010101')
+    assert plan.patterns == graycode(3)
+    assert baseline.patterns == list(range(8))
+    cost, base = plan.cost(), baseline.cost()
+    assert cost['writes'] == 9 and base['writes'] == 72
+    assert cost['voltage changes'] == 2 and base['voltage changes'] == 16
+    assert cost['bit line changes'] == 7 and base['bit line changes'] == bitlinechanges(range(8))
+    plan, baseline = planwriteread((3, 3), '101010101', optimize=False, cache=False)
+    assert plan.cost() == base
+
+
+def test_planreadonly_asks_before_every_read():
+    plan, baseline = planreadonly(2)
+    assert plan.patterns == [0, 1, 3, 2]
+    assert plan.cost()['voltage changes'] == 4
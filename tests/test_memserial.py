@@ -0,0 +1,150 @@
+import time
+import struct
+import pytest
+from memsim import VirtualArduino
+from memserial import SerialSession, StreamParser, FrameError
+
+
+def frame(payload):
+    return b'#' + struct.pack('<H', len(payload)) + payload + struct.pack('<H', sum(bytearray(payload)) & 0xFFFF)
+
+
+class Collector(object):
+    def __init__(self):
+        self.lines = []
+        self.frames = []
+        self.parser = StreamParser(self.lines.extend, self.frames.append)
+
+
+def feedall(collector, data, size):
+    """Feeds data in chunks of size bytes and returns the done flags"""
+    return [collector.parser.feed(data[i:i + size]) for i in range(0, len(data), size)]
+
+
+# Reply with a payload that contains 'Z', '#' and newline bytes
+reply = b'START\r\nWL 1\n' + frame(b'Z#\n\x00\x01Z') + b'Pattern 3\n' + frame(b'') + b'Z'
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, len(reply)])
+def test_split_chunks(size):
+    collector = Collector()
+    done = feedall(collector, reply, size)
+    assert done[-1] and not any(done[:-1])
+    assert collector.lines == ["START", "WL 1", "Pattern 3"]
+    assert collector.frames == [b'Z#\n\x00\x01Z', b'']
+
+
+def test_partial_line_waits():
+    collector = Collector()
+    assert not collector.parser.feed(b'WID')
+    assert collector.lines == []
+    assert not collector.parser.feed(b'TH 3 3\n')
+    assert collector.lines == ["WIDTH 3 3"]
+
+
+def test_reply_starting_with_contact_byte():
+    collector = Collector()
+    assert feedall(collector, b'ADDRESS ERROR\r\nZ', 1)[-1]
+    assert collector.lines == ["ADDRESS ERROR"]
+
+
+def test_empty_reply():
+    collector = Collector()
+    assert collector.parser.feed(b'ZZ')
+    assert collector.lines == []
+    assert collector.parser.buffered == 1
+
+
+def test_checksum_error():
+    collector = Collector()
+    bad = bytearray(frame(b'\x01\x02'))
+    bad[-1] ^= 0xFF
+    with pytest.raises(FrameError):
+        collector.parser.feed(b'X\n' + bytes(bad))
+
+
+def test_reset():
+    collector = Collector()
+    collector.parser.feed(b'OK\n#\x05')
+    collector.parser.reset()
+    assert collector.parser.feed(b'DONE\nZ')
+    assert collector.lines == ["OK", "DONE"]
+
+
+@pytest.fixture
+def session():
+    sim = VirtualArduino(arraysize=3, timescale=0.01, seed=1)
+    port = sim.start()
+    session = SerialSession(port, idletime=2.0)
+    session.open()
+    yield session
+    session.close()
+    sim.stop()
+
+
+def test_address_error_reply(session):
+    lines = []
+    session.transact([ord('3'), 5, 0, 0, 1, 0, 1, 1], lines.extend)
+    assert lines == ["ADDRESS ERROR"]
+
+
+def test_command_without_reply_completes(session):
+    lines = []
+    start = time.time()
+    session.transact([ord('Q'), 0, 0, 0, 0, 0, 0, 0], lines.extend)
+    assert lines == []
+    assert time.time() - start < 1.0
+    session.transact([ord('W'), 3, 3, 0, 0, 0, 0, 0], lines.extend)
+    assert lines == ["WIDTH 3 3"]
+
+
+def test_command_after_pause(session):
+    lines = []
+    session.transact([ord('W'), 2, 2, 0, 0, 0, 0, 0], lines.extend)
+    time.sleep(0.2)                             # Contact bytes arrive while the host is busy
+    session.transact([ord('W'), 3, 3, 0, 0, 0, 0, 0], lines.extend)
+    assert lines == ["WIDTH 2 2", "WIDTH 3 3"]
+
+
+class OldArduino(VirtualArduino):
+    """Firmware without the 'S' command (an unknown program: nothing is run or sent)"""
+    def setbaud(self, index):
+        return
+
+
+def negotiated(sim, rates=(250000, 500000, 1000000, 2000000)):
+    """Returns (throughput, baud, seconds) of negotiating with sim"""
+    port = sim.start()
+    session = SerialSession(port)
+    try:
+        session.open()
+        start = time.time()
+        speed = session.negotiate(rates)
+        elapsed = time.time() - start
+        lines = []
+        session.transact([ord('W'), 3, 3, 0, 0, 0, 0, 0], lines.extend)
+        assert lines == ["WIDTH 3 3"]
+        return speed, session.baud, elapsed
+    finally:
+        session.close()
+        sim.stop()
+
+
+def test_negotiate_real_timing():
+    # Contact bytes 1 s apart as on the board, so 'S' is read 1 s after it is sent
+    speed, baud, elapsed = negotiated(VirtualArduino(arraysize=3, timescale=1.0, seed=1))
+    assert speed is not None
+    assert baud == 2000000
+    assert elapsed < 4.0
+
+
+def test_negotiate_falls_back():
+    speed, baud, elapsed = negotiated(VirtualArduino(arraysize=3, timescale=0.01, seed=1, maxbaud=500000))
+    assert speed is not None
+    assert baud == 500000
+
+
+def test_negotiate_old_firmware():
+    speed, baud, elapsed = negotiated(OldArduino(arraysize=3, timescale=0.01, seed=1))
+    assert speed is None
+    assert baud == 115200
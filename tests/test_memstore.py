@@ -0,0 +1,56 @@
+import numpy as np
+from memstore import ResultStore, parseheader
+
+
+def header(wordline, pattern):
+    return ["Program: 1 camread", "Address: WL {:d}   BL 0".format(wordline), "Data Pattern: {:03b}".format(pattern)]
+
+
+def samples(rows, value):
+    return np.column_stack((np.arange(rows)*0.5, np.full(rows, float(value))))
+
+
+def filled(keepruns=None):
+    """Returns a store of two runs reading patterns 0-3 on word lines 0 and 1 (small buffers, so they grow)"""
+    store = ResultStore(capacity=2, rows=4, keepruns=keepruns)
+    for run in range(2):
+        store.newrun()
+        for wordline in range(2):
+            for pattern in range(4):
+                store.append(header(wordline, pattern), samples(3, 100*run + 10*wordline + pattern))
+    return store
+
+
+def test_parseheader():
+    assert parseheader(header(2, 5)) == {'program': 1, 'wordline': 2, 'bitline': 0, 'pattern': 5}
+
+
+def test_select():
+    store = filled()
+    assert len(store) == 16
+    assert list(store.select()) == list(range(16))
+    assert list(store.select(wordline=1, pattern=2)) == [6, 14]
+    assert list(store.select(wordline=1, pattern=2, run=1)) == [14]
+    assert list(store.select(pattern=7)) == []
+    np.testing.assert_array_equal(store[14], samples(3, 112))
+    buf = store.runresult(store.select(run=0, wordline=0))
+    assert buf[0::2] == [header(0, p) for p in range(4)]
+
+
+def test_dropruns():
+    store = filled()
+    store.dropruns(1)
+    assert len(store) == 8
+    assert set(store.records['run']) == set([1])
+    assert list(store.select(run=0)) == []
+    assert list(store.select(wordline=1, pattern=2)) == [6]
+    np.testing.assert_array_equal(store[6], samples(3, 112))
+    assert store.newrun() == 2
+
+
+def test_keepruns():
+    store = filled(keepruns=1)
+    assert len(store) == 8
+    assert set(store.records['run']) == set([1])
+    store.newrun()
+    assert len(store) == 0